@@ -5,6 +5,9 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+The live alert stream (police:alerts_stream) keeps its connection open, so serve the
+project through this module, e.g. ``uvicorn Reunite.asgi:application``.
 """
 
 import os
@@ -111,15 +111,93 @@ AUTHENTICATION_BACKENDS = [
 ]
 
 
+# --- REDIS ---
+# Web workers, Celery workers and management commands run in separate processes, so the
+# cache and the counters they share live in one Redis server: Celery on db 0, the Django
+# cache on db 1 (public list pages, status lookups), and the atomic evidence windows,
+# send-rate buckets and status-cache hit counters of cases/shared_state.py on db 2.
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': f'{REDIS_URL}/1',
+        'KEY_PREFIX': 'reunite',
+    }
+}
+REDIS_STATE_URL = f'{REDIS_URL}/2'
+
 # --- CELERY CONFIGURATION ---
-# Replace with your actual broker URL (e.g., if using Redis on localhost)
-CELERY_BROKER_URL = 'redis://localhost:6379/0' 
-CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
+CELERY_BROKER_URL = f'{REDIS_URL}/0'
+CELERY_RESULT_BACKEND = f'{REDIS_URL}/0'
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'Asia/Kolkata'
 
+# --- FACE DETECTION ---
+# Embedding model versions: a version pins the model pack and detector size. Vectors are
+# stored per version; `manage.py rebuild_embeddings --model-version <name>` fills a new
+# version and switches live matching over once the whole gallery is rebuilt.
+FACE_MODEL_VERSIONS = {
+    'buffalo_l-det640': {'pack': 'buffalo_l', 'det_size': (640, 640)},
+}
+FACE_MODEL_DEFAULT_VERSION = 'buffalo_l-det640'
+
+# Frames at least this large (longer side, px) get extra native-resolution tile passes
+FACE_MULTISCALE_MIN_SIDE = 1600
+FACE_MULTISCALE_MAX_TILES = 8
+# Per-camera regions of interest as (x, y, w, h) fractions of the frame, e.g.
+# {'gate-cam-1': [(0.30, 0.05, 0.40, 0.35)]}. Cameras without ROIs fall back to motion regions.
+CAMERA_DETECTION_ROIS = {}
+
+# --- SIGHTINGS (retroactive matching) ---
+# Unmatched faces from live cameras are kept this many days so newly registered cases
+# can be checked against them. Only faces at least this confident and this large
+# (full-resolution px) are stored; a camera re-seeing the same face within the dedup
+# window is stored once.
+SIGHTING_RETENTION_DAYS = 30
+SIGHTING_MIN_DET_SCORE = 0.75
+SIGHTING_MIN_FACE_SIDE = 64
+SIGHTING_DEDUP_SECONDS = 30
+SIGHTING_MAX_EVIDENCE = 20  # evidence photos logged per retroactive match
+
+# Live matches are confirmed over a sliding window before evidence/alerts are written:
+# >= EVIDENCE_MIN_HITS frames within EVIDENCE_WINDOW_SECONDS averaging >= EVIDENCE_CONFIRM_SCORE,
+# or one frame >= EVIDENCE_INSTANT_SCORE.
+EVIDENCE_WINDOW_SECONDS = 10
+EVIDENCE_MIN_HITS = 3
+EVIDENCE_CONFIRM_SCORE = 0.72
+EVIDENCE_INSTANT_SCORE = 0.90
+
+# Enrollment vectors of two cases at least this similar are flagged as possible duplicates
+DUPLICATE_CASE_THRESHOLD = 0.65
+DUPLICATE_CASE_TOP_K = 5
+
+CELERY_BEAT_SCHEDULE = {
+    'purge-expired-sightings': {
+        'task': 'cases.tasks.purge_expired_sightings',
+        'schedule': 60 * 60 * 6,
+    },
+    'flush-due-alert-digests': {
+        'task': 'cases.tasks.flush_due_alert_digests',
+        'schedule': 30,
+    },
+    'dispatch-outbox': {
+        'task': 'cases.tasks.dispatch_outbox',
+        'schedule': 15,  # picks up retries and deferred messages
+    },
+    'generate-missing-derivatives': {
+        'task': 'cases.tasks.generate_missing_derivatives',
+        'schedule': 60 * 5,
+    },
+}
+
+# Thumbnail widths (px) built for every photo, in WebP and JPEG (cases/thumbnails.py)
+PHOTO_DERIVATIVE_WIDTHS = (160, 320, 640, 1280)
+PHOTO_DERIVATIVE_QUALITY = 80
+PHOTO_DERIVATIVE_MAX_ATTEMPTS = 3   # the periodic sweep stops retrying a photo that failed this often
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -157,3 +235,37 @@ EMAIL_HOST_USER =  "chetan.contact999@gmail.com"# Replace with your Gmail email
 EMAIL_HOST_PASSWORD = "ukes jszb fupr agwa"       # 16-character App Password
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
+
+# Alert mail goes over one long-lived SMTP connection per Celery worker (cases/mailer.py)
+MAIL_CONNECTION_MAX_IDLE = 240  # seconds before an idle connection is reopened
+MAIL_BATCH_SIZE = 50            # outbox messages sent per batch over that connection (cases/outbox.py)
+
+# Detections of a case are coalesced into one digest email (cases/digest.py)
+ALERT_MAX_FIRST_LATENCY_SECONDS = 15  # the first detection of a burst is mailed within this
+ALERT_COALESCE_WINDOW_SECONDS = 60    # follow-up detections are mailed at most this often
+# Alerts CC the 2 police stations nearest to the detection. Set a distance in km to CC only
+# stations within it, or the nearest one if none is that close (police/spatial.py)
+ALERT_STATION_RADIUS_KM = None
+
+# Notification outbox (cases/outbox.py): retries with exponential backoff, per-recipient rate limit
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_BACKOFF_BASE_SECONDS = 30      # 30s, 1m, 2m, 4m, ... capped below
+OUTBOX_BACKOFF_MAX_SECONDS = 60 * 60
+OUTBOX_RECIPIENT_BURST = 10           # token bucket size per recipient address
+OUTBOX_RECIPIENT_RATE_PER_HOUR = 60   # refill rate
+
+# The dashboard's "last viewed" time (new-alert KPI) is written at most this often (police/counters.py)
+DASHBOARD_VIEW_DEBOUNCE_SECONDS = 60
+
+# Public missing-persons list (cases/public_list.py): cards per page, lifetime of a cached page,
+# and the max-age sent to browsers / proxies (0 = revalidate every time, answered with a 304)
+PUBLIC_LIST_PAGE_SIZE = 24
+PUBLIC_LIST_CACHE_SECONDS = 60 * 60
+PUBLIC_LIST_MAX_AGE_SECONDS = 0
+
+# Public status lookups by complaint ID (cases/status_cache.py): known and unknown IDs
+STATUS_CACHE_SECONDS = 5 * 60
+STATUS_NEGATIVE_CACHE_SECONDS = 60
+
+# How often the live alert stream checks for alerts written by other processes (police/live.py)
+LIVE_ALERTS_POLL_SECONDS = 2
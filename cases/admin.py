@@ -1,7 +1,9 @@
 # cases/admin.py
 
 from django.contrib import admin
+from django.db.models import Q
 from .models import Case, CasePhoto # Crucial: Ensure Case and CasePhoto are imported
+from .search import case_filter
 
 # Define the Inline for CasePhoto
 class CasePhotoInline(admin.TabularInline):
@@ -26,6 +28,14 @@ class CaseAdmin(admin.ModelAdmin):
     list_filter = ('status', 'urgency', 'created_at')
     
     search_fields = ('complaint_id', 'missing_name', 'guardian_name', 'guardian_phone')
+
+    def get_search_results(self, request, queryset, search_term):
+        # Full-text index instead of one LIKE scan per search field (cases/search.py);
+        # search_fields above only keeps the search box on the page
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        return queryset.filter(case_filter(search_term) | Q(guardian_phone=search_term)), False
     
     # E127 FIX: This field must exist on the Case model and be a DateTimeField or DateField.
     date_hierarchy = 'created_at'
@@ -38,9 +48,39 @@ class CasePhotoAdmin(admin.ModelAdmin):
     
     
 from django.contrib import admin
-from .models import FaceEmbedding
+from .models import FaceEmbedding, EmbeddingModelVersion, ImageEmbeddingCache, Sighting, DuplicateCaseCandidate, OutboxMessage
 
 @admin.register(FaceEmbedding)
 class FaceEmbeddingAdmin(admin.ModelAdmin):
-    list_display = ("case", "created_at")
-    search_fields = ("case__complaint_id",)
\ No newline at end of file
+    list_display = ("case", "model_version", "created_at")
+    list_filter = ("model_version",)
+    search_fields = ("case__complaint_id",)
+
+@admin.register(EmbeddingModelVersion)
+class EmbeddingModelVersionAdmin(admin.ModelAdmin):
+    list_display = ("name", "is_active", "created_at", "activated_at")
+    # Switching versions goes through EmbeddingModelVersion.activate() so it stays atomic
+    readonly_fields = ("is_active", "activated_at")
+
+@admin.register(ImageEmbeddingCache)
+class ImageEmbeddingCacheAdmin(admin.ModelAdmin):
+    list_display = ("content_hash", "model_version", "quality_score", "created_at")
+    list_filter = ("model_version",)
+    search_fields = ("content_hash",)
+
+@admin.register(Sighting)
+class SightingAdmin(admin.ModelAdmin):
+    list_display = ("camera_id", "seen_at", "det_score", "model_version", "matched_case")
+    list_filter = ("model_version", "seen_on")
+    exclude = ("embedding",)
+
+@admin.register(DuplicateCaseCandidate)
+class DuplicateCaseCandidateAdmin(admin.ModelAdmin):
+    list_display = ("case", "duplicate_of", "similarity", "model_version", "detected_at")
+    search_fields = ("case__complaint_id", "duplicate_of__complaint_id")
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ("kind", "status", "attempts", "next_attempt_at", "created_at", "sent_at")
+    list_filter = ("status", "kind")
+    readonly_fields = ("last_error",)
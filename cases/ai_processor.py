@@ -1,6 +1,8 @@
 # cases/ai_processor.py
 
 import os
+import hashlib
+import threading
 import cv2
 import numpy as np
 
@@ -8,76 +10,174 @@ from django.conf import settings
 from sklearn.metrics.pairwise import cosine_similarity
 from django.db.models import ObjectDoesNotExist
 
-from .models import FaceEmbedding  # Import the model to fetch vectors
+from .models import FaceEmbedding, EmbeddingModelVersion, ImageEmbeddingCache  # Import the models to fetch vectors
+from .multiscale import MotionRoiFinder, detect_faces_multiscale
+from .image_decode import REDUCED_FLAGS, decode_image, decode_regions
+from .gallery import get_gallery
 
 # InsightFace (RetinaFace + ArcFace)
 from insightface.app import FaceAnalysis
+from insightface.utils import face_align
 
 # --- AI Model Initialization ---
 
-RETINAFACE_MODEL = None  # Holds the FaceAnalysis instance
+RETINAFACE_MODEL = None  # Holds the FaceAnalysis instance of the default model version
 ARCFACE_MODEL = None     # Alias for RETINAFACE_MODEL
 
+# Embedding model versions. A version pins the model pack AND the detector settings,
+# because vectors produced by different versions must never be compared.
+FACE_MODEL_VERSIONS = getattr(settings, 'FACE_MODEL_VERSIONS', {
+    'buffalo_l-det640': {'pack': 'buffalo_l', 'det_size': (640, 640)},
+})
+DEFAULT_MODEL_VERSION = getattr(settings, 'FACE_MODEL_DEFAULT_VERSION', 'buffalo_l-det640')
+
+_loaded_models = {}  # model_version -> FaceAnalysis
+
 # Realistic threshold for cosine similarity of face embeddings.
 MATCH_THRESHOLD = 0.70  # IMPORTANT: Using a realistic value now
 VECTOR_DIMENSION = 512
+DET_SIZE = tuple(FACE_MODEL_VERSIONS[DEFAULT_MODEL_VERSION]['det_size'])
+
+# Faces narrower than this in a reduced-resolution decode are re-embedded from the
+# full-resolution image (ArcFace aligns faces to 112x112).
+MIN_EMBED_FACE_SIDE = 112
+
+# Multi-scale detection: frames whose longer side reaches this size get native-resolution
+# tile passes over their regions of interest on top of the normal 640px pass.
+MULTISCALE_MIN_SIDE = getattr(settings, 'FACE_MULTISCALE_MIN_SIDE', 1600)
+MULTISCALE_MAX_TILES = getattr(settings, 'FACE_MULTISCALE_MAX_TILES', 8)
+# {camera_id: [(x, y, w, h), ...]} with coordinates as fractions of the frame size
+CAMERA_DETECTION_ROIS = getattr(settings, 'CAMERA_DETECTION_ROIS', {})
+
+_motion_finders = {}  # camera_id -> MotionRoiFinder (used when no ROIs are configured)
+
+# Unmatched faces worth keeping as sightings for retroactive matching
+SIGHTING_MIN_DET_SCORE = getattr(settings, 'SIGHTING_MIN_DET_SCORE', 0.75)
+SIGHTING_MIN_FACE_SIDE = getattr(settings, 'SIGHTING_MIN_FACE_SIDE', 64)
 
 
-def load_ai_models():
+def load_ai_models(model_version=None):
     """
-    Initializes RetinaFace (detection) + ArcFace (embedding) using InsightFace.
+    Initializes RetinaFace (detection) + ArcFace (embedding) using InsightFace for one
+    model version (default: DEFAULT_MODEL_VERSION). Returns the FaceAnalysis instance.
     """
     global RETINAFACE_MODEL
     global ARCFACE_MODEL
 
+    model_version = model_version or DEFAULT_MODEL_VERSION
+
     # Check if models are already loaded
-    if RETINAFACE_MODEL is not None: 
-        return
+    if model_version in _loaded_models:
+        return _loaded_models[model_version]
+
+    if model_version not in FACE_MODEL_VERSIONS:
+        raise ValueError(f"Unknown face model version '{model_version}'. Add it to FACE_MODEL_VERSIONS.")
+    spec = FACE_MODEL_VERSIONS[model_version]
 
     try:
-        print("AI Processor: Loading RetinaFace + ArcFace (InsightFace FaceAnalysis)...")
+        print(f"AI Processor: Loading RetinaFace + ArcFace (InsightFace FaceAnalysis) for {model_version}...")
 
         # InsightFace will internally handle detection (RetinaFace) and embeddings (ArcFace).
         app = FaceAnalysis(
-            name="buffalo_l",
+            name=spec['pack'],
             # Ensure the provider is correct for your environment (e.g., CUDAExecutionProvider for GPU)
             providers=["CPUExecutionProvider"],
         )
         # Prepare the model with desired detection resolution
-        app.prepare(ctx_id=0, det_size=(640, 640))
+        app.prepare(ctx_id=0, det_size=tuple(spec['det_size']))
 
-        RETINAFACE_MODEL = app
-        ARCFACE_MODEL = app
+        _loaded_models[model_version] = app
+        if model_version == DEFAULT_MODEL_VERSION:
+            RETINAFACE_MODEL = app
+            ARCFACE_MODEL = app
 
         print("AI Processor: Models loaded successfully.")
+        return app
 
     except Exception as e:
-        RETINAFACE_MODEL = None
-        ARCFACE_MODEL = None
+        if model_version == DEFAULT_MODEL_VERSION:
+            RETINAFACE_MODEL = None
+            ARCFACE_MODEL = None
         print(f"AI Processor: FAILED to load models. Make sure 'insightface', 'onnxruntime', 'opencv-python' are installed: {e}")
         # Crash the application/worker if models cannot load
         raise
 
 
+def active_model_version():
+    """The model version live matching serves; switched atomically by EmbeddingModelVersion.activate()."""
+    name = EmbeddingModelVersion.objects.filter(is_active=True).values_list('name', flat=True).first()
+    return name or DEFAULT_MODEL_VERSION
+
+
+# --- Blue/Green Serving ---
+#
+# After EmbeddingModelVersion.activate() flips the active version, each process keeps
+# matching with the version it was serving until the new model and gallery are loaded
+# in a background thread, then switches. Matching never waits on a cold model.
+
+_serving_version = None
+_warming = set()
+_serving_lock = threading.Lock()
+
+
+def _warm_and_switch(model_version):
+    global _serving_version
+    try:
+        load_ai_models(model_version)
+        get_gallery(model_version)
+        _serving_version = model_version
+        print(f"AI Processor: Now serving {model_version}.")
+    except Exception as e:
+        print(f"AI Processor: Could not warm {model_version}, still serving {_serving_version}: {e}")
+    finally:
+        with _serving_lock:
+            _warming.discard(model_version)
+
+
+def serving_model_version():
+    """The version this process matches with: the active one once it's warm, the previous one until then."""
+    global _serving_version
+    active = active_model_version()
+
+    if active == _serving_version:
+        return active
+    if _serving_version is None or active in _loaded_models:
+        # First request in this process (nothing to fall back to), or already warm
+        _serving_version = active
+        return active
+
+    with _serving_lock:
+        if active not in _warming:
+            _warming.add(active)
+            threading.Thread(target=_warm_and_switch, args=(active,), daemon=True).start()
+    return _serving_version
+
+
+def _det_side(model_version):
+    return max(FACE_MODEL_VERSIONS[model_version or DEFAULT_MODEL_VERSION]['det_size'])
+
+
 # Ensure models are loaded when this module is imported
 load_ai_models()
 
 
 # --- Internal Helper for Extraction ---
 
-def _extract_face_data(img_bgr, model):
+def _extract_face_data(img_bgr, model, source=None, scale=1.0):
     """
     Internal helper to detect and extract face data using the shared model.
-    Returns: (embedding_vector, bbox_normalized) or None
+    `source`/`scale` describe where a reduced-resolution `img_bgr` was decoded from, so a
+    small face can be re-embedded from full resolution.
+    Returns: (embedding_vector, bbox_normalized, det_score), all None if no face was found
     """
-    if model is None: return None
+    if model is None: return None, None, None
 
     # InsightFace expects BGR numpy image
     faces = model.get(img_bgr)
 
     if not faces:
         # print("AI Processor: No face detected in image.")
-        return None, None
+        return None, None, None
 
     # Strategy: pick the largest face (by area)
     largest_face = max(
@@ -87,6 +187,8 @@ def _extract_face_data(img_bgr, model):
 
     # ArcFace embedding (already L2-normalized)
     embedding_vector = largest_face.normed_embedding
+    if source is not None:
+        embedding_vector = _refine_small_face_embeddings([largest_face], source, scale, model)[0]
 
     # Bounding box in pixel coordinates [x1, y1, x2, y2]
     bbox = largest_face.bbox.astype(int) 
@@ -101,55 +203,215 @@ def _extract_face_data(img_bgr, model):
         (y2 - y1) / h,  # height
     ]
 
-    return embedding_vector, box_normalized
+    return embedding_vector, box_normalized, float(largest_face.det_score)
 
 
-# --- 1. NON-BLOCKING TASK FUNCTION (Case Registration) ---
+def _face_side(face):
+    return min(face.bbox[2] - face.bbox[0], face.bbox[3] - face.bbox[1])
+
 
-def generate_embedding_from_image(image_relative_path):
+def _needs_refinement(face, scale):
+    return scale > 1.0 and face.kps is not None and _face_side(face) < MIN_EMBED_FACE_SIDE
+
+
+def _refine_small_face_embeddings(faces, source, scale, model):
     """
-    Called asynchronously by Celery. Generates 512D ArcFace embedding.
+    Detection ran on a reduced decode (1 decoded px = `scale` full-res px). Faces too small
+    there for a faithful 112px alignment are embedded again from a finer decode: the source
+    is decoded once per frame, at the coarsest DCT scale that still gives every such face
+    MIN_EMBED_FACE_SIDE pixels (full resolution only when a face needs it), and only the
+    padded region around each face is kept. Each face is aligned from its crop and they go
+    through ArcFace as one batch. Returns the (normalized) embedding of every face, in order.
     """
-    if RETINAFACE_MODEL is None:
-        print("AI Processor: Models not loaded. Cannot generate embedding.")
+    embeddings = [face.normed_embedding for face in faces]
+    small = [i for i, face in enumerate(faces) if _needs_refinement(face, scale)]
+    if not small:
+        return embeddings
+
+    smallest = min(_face_side(faces[i]) for i in small) * scale  # in full-resolution pixels
+    factor = next((f for f, _ in REDUCED_FLAGS if f < scale and smallest / f >= MIN_EMBED_FACE_SIDE), 1)
+    regions = decode_regions(source, [faces[i].bbox * scale for i in small], factor=factor)
+    if not regions:
+        return embeddings
+
+    recognition = model.models['recognition']
+    aligned = [
+        face_align.norm_crop(crop, landmark=faces[i].kps * (scale / crop_scale) - origin,
+                             image_size=recognition.input_size[0])
+        for i, (crop, origin, crop_scale) in zip(small, regions)
+    ]
+    for i, feature in zip(small, recognition.get_feat(aligned)):
+        embeddings[i] = feature / np.linalg.norm(feature)
+    return embeddings
+
+
+def _detect_faces(img_bgr, model, camera_id=None):
+    """
+    Runs detection + embedding on a frame. Small frames use the plain 640px pass; large
+    frames add tile passes over the camera's configured ROIs, or over moving regions.
+    """
+    h, w = img_bgr.shape[:2]
+    if max(h, w) < MULTISCALE_MIN_SIDE:
+        return model.get(img_bgr)
+
+    rois = [
+        (x * w, y * h, rw * w, rh * h)
+        for x, y, rw, rh in CAMERA_DETECTION_ROIS.get(camera_id, [])
+    ]
+    if not rois and camera_id is not None:
+        finder = _motion_finders.setdefault(camera_id, MotionRoiFinder())
+        rois = finder.find(img_bgr)
+
+    return detect_faces_multiscale(model, img_bgr, rois, max_tiles=MULTISCALE_MAX_TILES)
+
+
+def _sighting_candidate(img_bgr, face, embedding, scale):
+    """A face crop + vector for the sightings store, or None if the face is too small or uncertain."""
+    x1, y1, x2, y2 = face.bbox
+    if face.det_score < SIGHTING_MIN_DET_SCORE or min(x2 - x1, y2 - y1) * scale < SIGHTING_MIN_FACE_SIDE:
         return None
 
+    h, w = img_bgr.shape[:2]
+    pad_w, pad_h = (x2 - x1) * 0.3, (y2 - y1) * 0.3
+    crop = img_bgr[max(0, int(y1 - pad_h)):min(h, int(y2 + pad_h)), max(0, int(x1 - pad_w)):min(w, int(x2 + pad_w))]
+    ok, jpg = cv2.imencode('.jpg', crop, [cv2.IMWRITE_JPEG_QUALITY, 85]) if crop.size else (False, None)
+    return {
+        "embedding": np.asarray(embedding, dtype=np.float32),
+        "det_score": float(face.det_score),
+        "face_jpeg": jpg.tobytes() if ok else None,
+    }
+
+
+# --- 1. NON-BLOCKING TASK FUNCTION (Case Registration) ---
+
+def generate_embedding_from_image(image_relative_path, model_version=None):
+    """
+    Called asynchronously by Celery. Generates 512D ArcFace embedding with the given
+    model version (default: DEFAULT_MODEL_VERSION).
+    Results are cached by image content, so an unchanged photo is never run through the model twice.
+    """
     try:
+        model_version = model_version or DEFAULT_MODEL_VERSION
         image_path = os.path.join(settings.MEDIA_ROOT, image_relative_path)
-        image = cv2.imread(image_path)
+        with open(image_path, 'rb') as f:
+            image_bytes = f.read()
+
+        # 1. Content-hash cache: same bytes + same model version -> same result
+        content_hash = hashlib.sha256(image_bytes).hexdigest()
+        cached = ImageEmbeddingCache.objects.filter(content_hash=content_hash, model_version=model_version).first()
+        if cached is not None:
+            if cached.embedding_vector is None:
+                print("AI Processor: Cached result for this image: no face found.")
+            return cached.embedding_vector
+
+        # 2. Cache miss: run inference on the bytes already in memory
+        model = load_ai_models(model_version)
+        # Decode at reduced resolution (DCT scaling) just large enough for the detector
+        image, scale = decode_image(image_bytes, target_side=_det_side(model_version))
         if image is None:
             print(f"AI Processor: Failed to read image at {image_path}")
             return None
 
-        # Extract the vector (box is ignored for storage)
-        embedding_vector, _ = _extract_face_data(image, RETINAFACE_MODEL)
-        
-        if embedding_vector is None:
+        embedding_vector, box_normalized, det_score = _extract_face_data(image, model, source=image_bytes, scale=scale)
+        vector_list = embedding_vector.tolist() if embedding_vector is not None else None
+
+        # "No face" is cached as well; a photo that failed once would fail again
+        ImageEmbeddingCache.objects.update_or_create(
+            content_hash=content_hash,
+            model_version=model_version,
+            defaults={'embedding_vector': vector_list, 'bbox': box_normalized, 'quality_score': det_score},
+        )
+
+        if vector_list is None:
             print("AI Processor: Failed to extract embedding (No face found).")
             return None
 
         print(f"AI Processor: Generated {embedding_vector.shape[0]}D embedding for storage.")
-        return embedding_vector.tolist()
+        return vector_list
 
     except Exception as e:
         print(f"AI Processing error during case registration: {e}")
         return None
 
 
-# --- 2. SYNCHRONOUS MATCHING FUNCTION (Called by Surveillance API) ---
+def generate_case_embedding(image_paths, model_version=None):
+    """
+    Aggregated (mean) embedding over a case's enrollment photos.
+    Returns (vector_list, photos_used), or (None, 0) if no photo produced a vector.
+    """
+    all_vectors = []
+    for image_path in image_paths:
+        vector_list = generate_embedding_from_image(image_path, model_version)
+        if vector_list:
+            all_vectors.append(np.array(vector_list))
 
-def match_live_face_to_db(live_image_bytes):
-    if RETINAFACE_MODEL is None:
-        print("AI Processor: Models not loaded. Cannot perform live match.")
+    if not all_vectors:
+        return None, 0
+    return np.mean(np.stack(all_vectors), axis=0).tolist(), len(all_vectors)
+
+
+def cached_case_embedding(image_paths, model_version=None):
+    """
+    generate_case_embedding() answered purely from ImageEmbeddingCache, without loading a model.
+    Returns (vector_list, photos_used), or None if any photo still needs inference.
+    """
+    model_version = model_version or DEFAULT_MODEL_VERSION
+    hashes = []
+    for image_path in image_paths:
+        try:
+            with open(os.path.join(settings.MEDIA_ROOT, image_path), 'rb') as f:
+                hashes.append(hashlib.sha256(f.read()).hexdigest())
+        except OSError:
+            return None
+
+    cached = dict(ImageEmbeddingCache.objects
+                  .filter(content_hash__in=hashes, model_version=model_version)
+                  .values_list('content_hash', 'embedding_vector'))
+    if any(h not in cached for h in hashes):
         return None
 
+    all_vectors = [np.array(cached[h]) for h in hashes if cached[h]]
+    if not all_vectors:
+        return None, 0
+    return np.mean(np.stack(all_vectors), axis=0).tolist(), len(all_vectors)
+
+
+# --- 2. SYNCHRONOUS MATCHING FUNCTION (Called by Surveillance API) ---
+
+def match_live_face_to_db(live_image_bytes, camera_id=None, unmatched=None):
+    model_version = serving_model_version()
+
     try:
-        np_arr = np.frombuffer(live_image_bytes, np.uint8)
-        live_img = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+        # Frames big enough for tiled detection keep full resolution; the rest are reduced on decode
+        live_img, scale = decode_image(live_image_bytes, target_side=_det_side(model_version),
+                                       full_resolution_from=MULTISCALE_MIN_SIDE)
         if live_img is None:
             return None
 
-        faces = RETINAFACE_MODEL.get(live_img)
+    except Exception as e:
+        print(f"Live image processing failed: {e}")
+        return None
+
+    return match_faces_in_image(live_img, camera_id=camera_id, source=live_image_bytes, scale=scale,
+                                model_version=model_version, unmatched=unmatched)
+
+
+def match_faces_in_image(live_img, camera_id=None, source=None, scale=1.0, model_version=None, unmatched=None):
+    """
+    Detects every face in a decoded BGR frame and matches each against the stored embeddings.
+    Shared by the live surveillance API and offline video scanning. `camera_id` selects the
+    per-camera ROIs / motion history used for multi-scale detection of large frames.
+    `source`/`scale` are given when `live_img` is a reduced decode (see _refine_small_face_embeddings).
+    Only gallery vectors of `model_version` (default: the serving version) are compared.
+    If `unmatched` is a list, good-quality faces that matched nothing are appended to it as
+    {"embedding", "det_score", "face_jpeg", "model_version"} for the sightings store.
+    Returns a list of {"case_id", "similarity", "box"} dicts, or None if nothing matched.
+    """
+    model_version = model_version or serving_model_version()
+
+    try:
+        model = load_ai_models(model_version)
+        faces = _detect_faces(live_img, model, camera_id)
         if not faces:
             return None
 
@@ -157,47 +419,48 @@ def match_live_face_to_db(live_image_bytes):
         print(f"Live image processing failed: {e}")
         return None
 
-    # DB embeddings
-    database = FaceEmbedding.objects.all()
-    if not database:
+    # In-memory gallery of the same model version only
+    gallery = get_gallery(model_version)
+    if not len(gallery) and unmatched is None:
         return None
 
-    matches_found = []
+    if source is not None:
+        embeddings = _refine_small_face_embeddings(faces, source, scale, model)
+    else:
+        embeddings = [face.normed_embedding for face in faces]
+
+    # One matrix product for all faces in the frame against all cases
+    if len(gallery):
+        best_rows, best_sims = gallery.search(np.stack(embeddings))
+    else:
+        best_rows, best_sims = np.zeros((len(faces), 1), dtype=int), np.full((len(faces), 1), -1.0)
 
-    for face in faces:
-        embedding = face.normed_embedding.reshape(1, -1)
+    matches_found = []
+    h, w, _ = live_img.shape
+
+    for face, embedding, row, similarity in zip(faces, embeddings, best_rows[:, 0], best_sims[:, 0]):
+        if similarity < MATCH_THRESHOLD:
+            if unmatched is not None:
+                sighting = _sighting_candidate(live_img, face, embedding, scale)
+                if sighting is not None:
+                    sighting['model_version'] = model_version
+                    unmatched.append(sighting)
+            continue
 
         bbox = face.bbox.astype(int).tolist()
-        h, w, _ = live_img.shape
         normalized_box = [
             bbox[0] / w,
             bbox[1] / h,
             (bbox[2] - bbox[0]) / w,
             (bbox[3] - bbox[1]) / h,
         ]
-
-        best_match = None
-        max_similarity = -1
-
-        for db_embed in database:
-            try:
-                db_vector = np.array(db_embed.embedding_vector, dtype=np.float32).reshape(1, -1)
-                similarity = cosine_similarity(embedding, db_vector)[0][0]
-
-                if similarity > max_similarity:
-                    max_similarity = similarity
-                    best_match = {
-                        "case_id": db_embed.case.complaint_id,
-                        "similarity": float(similarity),
-                        "box": normalized_box,
-                    }
-
-            except Exception:
-                continue
-
-        if best_match and max_similarity >= MATCH_THRESHOLD:
-            print(f"MATCH: {best_match['case_id']} similarity={max_similarity:.4f}")
-            matches_found.append(best_match)
+        best_match = {
+            "case_id": gallery.complaint_ids[row],
+            "similarity": float(similarity),
+            "box": normalized_box,
+        }
+        print(f"MATCH: {best_match['case_id']} similarity={similarity:.4f}")
+        matches_found.append(best_match)
 
     return matches_found if matches_found else None
 
@@ -217,7 +480,7 @@ def match_live_face_to_db(live_image_bytes):
             return None
 
         # 2. Extract live embedding and box
-        live_embedding_vec, box_normalized = _extract_face_data(live_img, RETINAFACE_MODEL)
+        live_embedding_vec, box_normalized, _ = _extract_face_data(live_img, RETINAFACE_MODEL)
         
         if live_embedding_vec is None:
             return None
@@ -2,4 +2,24 @@ from django.apps import AppConfig
 
 class CasesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'cases'
\ No newline at end of file
+    name = 'cases'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+        from .models import Case, CasePhoto
+        from .public_list import enrollment_photo_changed, invalidate
+        from .thumbnails import photo_created
+
+        # New uploads get their resized copies from a background task (cases/thumbnails.py)
+        post_save.connect(photo_created, sender=CasePhoto, dispatch_uid='photo_derivatives')
+
+        # Cached public list pages are rebuilt after any change they could show (cases/public_list.py)
+        post_save.connect(invalidate, sender=Case, dispatch_uid='public_list_case_save')
+        post_delete.connect(invalidate, sender=Case, dispatch_uid='public_list_case_delete')
+        post_save.connect(enrollment_photo_changed, sender=CasePhoto, dispatch_uid='public_list_photo_save')
+        post_delete.connect(enrollment_photo_changed, sender=CasePhoto, dispatch_uid='public_list_photo_delete')
+
+        # Cached public status lookups are dropped when their case changes (cases/status_cache.py)
+        from .status_cache import invalidate_case
+        post_save.connect(invalidate_case, sender=Case, dispatch_uid='status_view_case_save')
+        post_delete.connect(invalidate_case, sender=Case, dispatch_uid='status_view_case_delete')
@@ -0,0 +1,185 @@
+# cases/digest.py
+
+import io
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.db import IntegrityError, transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from email.mime.image import MIMEImage
+from PIL import Image
+
+from .models import AlertDigest, CasePhoto
+
+# --- Alert Coalescing ---
+#
+# Someone walking past several cameras in a minute used to produce one full HTML alert
+# (with a full-size inline photo) per detection, to every CC'd station. Detections of a
+# case are now collected into an AlertDigest and mailed together when it closes:
+#   * the first detection of a burst is mailed within ALERT_MAX_FIRST_LATENCY_SECONDS,
+#   * follow-up detections are mailed at most once per ALERT_COALESCE_WINDOW_SECONDS.
+# A digest with a single detection is sent as the usual alert email. Otherwise each
+# recipient gets one email listing exactly the sightings they were alerted for (a station
+# is only CC'd on sightings it is nearest to), with small thumbnails. Closing a digest
+# writes one outbox message per email (cases/outbox.py), which delivers and retries them.
+
+COALESCE_WINDOW = getattr(settings, 'ALERT_COALESCE_WINDOW_SECONDS', 60)
+MAX_FIRST_LATENCY = getattr(settings, 'ALERT_MAX_FIRST_LATENCY_SECONDS', 15)
+THUMBNAIL_SIDE = 320
+
+
+def add_to_digest(case_id, photo_pk, similarity, latitude, longitude):
+    """
+    Adds one detection to the case's open digest, opening one if needed.
+    Returns (digest, opened); when opened is True the caller schedules its flush at digest.flush_at.
+    """
+    item = {
+        'photo_pk': photo_pk,
+        'similarity': similarity,
+        'latitude': latitude,
+        'longitude': longitude,
+        'seen_at': timezone.now().isoformat(),
+    }
+
+    for attempt in (1, 2):
+        try:
+            with transaction.atomic():
+                digest = AlertDigest.objects.select_for_update().filter(case_id=case_id, sent_at__isnull=True).first()
+                opened = digest is None
+                if opened:
+                    digest = AlertDigest(case_id=case_id, flush_at=_next_flush_at(case_id), items=[])
+                digest.items.append(item)
+                digest.save()
+            return digest, opened
+        except IntegrityError:
+            # Another worker opened the digest at the same moment: append to theirs
+            if attempt == 2:
+                raise
+
+
+def _next_flush_at(case_id):
+    now = timezone.now()
+    flush_at = now + timedelta(seconds=MAX_FIRST_LATENCY)
+
+    last_sent = (AlertDigest.objects.filter(case_id=case_id, sent_at__isnull=False)
+                 .order_by('-sent_at').values_list('sent_at', flat=True).first())
+    if last_sent and last_sent + timedelta(seconds=COALESCE_WINDOW) > flush_at:
+        flush_at = last_sent + timedelta(seconds=COALESCE_WINDOW)
+    return flush_at
+
+
+def claim_digest(digest_id):
+    """Marks the digest sent and returns it, or None if it was already claimed by another flush."""
+    claimed = AlertDigest.objects.filter(pk=digest_id, sent_at__isnull=True).update(sent_at=timezone.now())
+    if not claimed:
+        return None
+    return AlertDigest.objects.select_related('case', 'case__police_officer').get(pk=digest_id)
+
+
+def plan_digest_emails(digest, recipients_for):
+    """
+    Outbox payloads for a claimed digest, one per email. `recipients_for(case, lat, lon)`
+    returns (to, cc) for one detection. A single-detection digest has no to/cc in its payload:
+    it is sent as the regular alert email.
+    """
+    items = digest.items
+    if len(items) == 1:
+        return [{'digest_id': digest.pk, 'items': [0]}]
+
+    # Which sightings each recipient should hear about, then one email per distinct sighting set
+    primary = set()
+    sightings_by_recipient = {}
+    for index, item in enumerate(items):
+        to, cc = recipients_for(digest.case, item['latitude'], item['longitude'])
+        primary.update(to)
+        for address in to + cc:
+            sightings_by_recipient.setdefault(address, []).append(index)
+
+    recipients_by_sightings = {}
+    for address, indices in sightings_by_recipient.items():
+        recipients_by_sightings.setdefault(tuple(indices), []).append(address)
+
+    payloads = []
+    for indices, addresses in recipients_by_sightings.items():
+        to = [a for a in addresses if a in primary] or addresses[:1]
+        cc = [a for a in addresses if a not in to]
+        payloads.append({'digest_id': digest.pk, 'items': list(indices), 'to': to, 'cc': cc})
+    return payloads
+
+
+def build_digest_email(payload, build_single):
+    """The email for one plan_digest_emails() payload. `build_single(*item_args)` builds the regular alert."""
+    digest = AlertDigest.objects.select_related('case', 'case__police_officer').get(pk=payload['digest_id'])
+    case = digest.case
+    items = [digest.items[i] for i in payload['items']]
+    if 'to' not in payload:
+        item = items[0]
+        return build_single(case.pk, item['photo_pk'], item['similarity'], item['latitude'], item['longitude'])
+
+    photos = CasePhoto.objects.in_bulk([item['photo_pk'] for item in items])
+    return _digest_email(case, items, photos, payload['to'], payload['cc'])
+
+
+def _digest_email(case, items, photos, to, cc):
+    sightings = []
+    thumbnails = []
+    for item in items:
+        photo = photos.get(item['photo_pk'])
+        cid = f"sighting_{item['photo_pk']}"
+        lat, lon = item['latitude'], item['longitude']
+        sightings.append({
+            'seen_at': parse_datetime(item['seen_at']),
+            'similarity': f"{item['similarity'] * 100:.1f}%",
+            'location_coords': f"{lat}, {lon}" if lat and lon else "Location Data Unavailable",
+            'location_link': f"https://www.google.com/maps/search/?api=1&query={lat},{lon}" if lat and lon else None,
+            'image_cid': cid if photo else None,
+        })
+        if photo:
+            thumbnails.append((cid, photo.image.name))
+
+    email = EmailMultiAlternatives(
+        subject=f"🚨 ALERT DIGEST: {len(items)} detection(s) for Case ID {case.complaint_id}",
+        body=(
+            f"URGENT: AI detected {case.missing_name} (Case ID: {case.complaint_id}) {len(items)} times.\n"
+            + "\n".join(f"- {s['seen_at']:%H:%M:%S} | {s['similarity']} | {s['location_coords']}" for s in sightings)
+            + "\nAction Required: Check the case dashboard immediately."
+        ),
+        to=to,
+        cc=cc,
+    )
+    for cid, image_name in thumbnails:
+        data = _thumbnail_jpeg(os.path.join(settings.MEDIA_ROOT, image_name))
+        if data:
+            img = MIMEImage(data)
+            img.add_header('Content-ID', f'<{cid}>')
+            email.attach(img)
+
+    email.attach_alternative(render_to_string('emails/detection_digest.html', {
+        'case': case,
+        'sightings': sightings,
+        'officer_email': case.police_officer.email if case.police_officer else 'N/A',
+    }), "text/html")
+    return email
+
+
+def _thumbnail_jpeg(path):
+    try:
+        with Image.open(path) as img:
+            img = img.convert('RGB')
+            img.thumbnail((THUMBNAIL_SIDE, THUMBNAIL_SIDE))
+            buffer = io.BytesIO()
+            img.save(buffer, 'JPEG', quality=80)
+            return buffer.getvalue()
+    except (OSError, ValueError):
+        print(f"ERROR: Could not read evidence image {path} for the digest thumbnail.")
+        return None
+
+
+def due_digest_ids():
+    """Open digests whose window has closed (safety net for lost scheduled flushes)."""
+    return list(AlertDigest.objects.filter(sent_at__isnull=True, flush_at__lte=timezone.now())
+                .values_list('pk', flat=True))
@@ -0,0 +1,89 @@
+# cases/duplicates.py
+
+import numpy as np
+from django.conf import settings
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+from .gallery import get_gallery
+from .models import DuplicateCaseCandidate
+
+# --- Duplicate Case Detection ---
+#
+# The same person registered at two stations produces two enrollment vectors that are far
+# closer to each other than to anyone else. New cases are checked against the in-memory
+# gallery right after enrollment; the whole database can be audited with a blocked
+# matrix self-join (`manage.py find_duplicate_cases`).
+
+DUPLICATE_CASE_THRESHOLD = getattr(settings, 'DUPLICATE_CASE_THRESHOLD', 0.65)
+DUPLICATE_CASE_TOP_K = getattr(settings, 'DUPLICATE_CASE_TOP_K', 5)
+
+
+def canonical_pair(case_id, other_id):
+    """A pair of case pks in stored order, lower pk first, so each pair has exactly one row."""
+    return (case_id, other_id) if case_id < other_id else (other_id, case_id)
+
+
+def flag_duplicates_for_case(case_id, vector, model_version, threshold=None):
+    """
+    Nearest neighbours of one case's enrollment vector among the other cases of the same
+    model version. Pairs at or above `threshold` are saved as DuplicateCaseCandidate rows.
+    Returns the number of candidates flagged.
+    """
+    threshold = DUPLICATE_CASE_THRESHOLD if threshold is None else threshold
+    gallery = get_gallery(model_version)
+    if len(gallery) < 2:
+        return 0
+
+    rows, sims = gallery.search(vector, k=DUPLICATE_CASE_TOP_K + 1)
+    flagged = 0
+    for row, similarity in zip(rows[0], sims[0]):
+        other_id = gallery.case_ids[row]
+        if other_id == case_id or similarity < threshold:
+            continue
+        low, high = canonical_pair(case_id, other_id)
+        DuplicateCaseCandidate.objects.update_or_create(
+            case_id=low,
+            duplicate_of_id=high,
+            defaults={'similarity': float(similarity), 'model_version': model_version},
+        )
+        flagged += 1
+    return flagged
+
+
+def find_duplicate_pairs(matrix, threshold, block_size=2048):
+    """
+    All index pairs (i < j) of L2-normalized `matrix` rows with cosine similarity >= threshold.
+    Computed block by block over the upper triangle, so memory stays at block_size x N, never N x N.
+    Returns (i, j, similarity) arrays.
+    """
+    n = matrix.shape[0]
+    all_i, all_j, all_s = [], [], []
+
+    for start in range(0, n, block_size):
+        # Upper triangle only (rows `start..` against columns `start..`): each pair once
+        block = matrix[start:start + block_size] @ matrix[start:].T
+        i, j = np.nonzero(block >= threshold)
+        keep = j > i  # drops self-pairs and the lower half of the diagonal square
+        i, j = i[keep], j[keep]
+
+        all_i.append(i + start)
+        all_j.append(j + start)
+        all_s.append(block[i, j])
+
+    if not all_i:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0, dtype=np.float32)
+    return np.concatenate(all_i), np.concatenate(all_j), np.concatenate(all_s)
+
+
+def duplicate_clusters(n, pair_i, pair_j):
+    """Groups of 2+ row indices connected through duplicate pairs (connected components)."""
+    graph = coo_matrix((np.ones(len(pair_i), dtype=np.int8), (pair_i, pair_j)), shape=(n, n))
+    _, labels = connected_components(graph, directed=False)
+
+    sizes = np.bincount(labels)
+    clusters = {}
+    for row in np.flatnonzero(sizes[labels] > 1):
+        clusters.setdefault(labels[row], []).append(int(row))
+    return list(clusters.values())
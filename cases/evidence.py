@@ -0,0 +1,88 @@
+# cases/evidence.py
+
+import time
+import uuid
+
+from django.conf import settings
+
+from .shared_state import get_redis
+
+# --- Temporal Evidence Accumulation ---
+#
+# A single frame just above MATCH_THRESHOLD is weak evidence. Each camera/case pair
+# keeps its recent hits in a sliding time window; a detection is only CONFIRMED (and only
+# then logged as CasePhoto / DetectionAlert) once the window holds at least
+# EVIDENCE_MIN_HITS frames whose mean similarity reaches EVIDENCE_CONFIRM_SCORE. A single
+# frame at EVIDENCE_INSTANT_SCORE or above confirms on its own. After a confirmation the
+# window starts over, so a person standing in view is logged once per MIN_HITS frames,
+# not on every frame.
+#
+# Each window is a Redis sorted set (shared_state.py) of "similarity|nonce" members scored by
+# frame time. One Lua script adds the frame, drops expired hits and decides, atomically, so
+# frames of one camera handled by different workers at the same moment all count, and a
+# confirmation clears the window exactly once.
+
+WINDOW_SECONDS = getattr(settings, 'EVIDENCE_WINDOW_SECONDS', 10)
+MIN_HITS = getattr(settings, 'EVIDENCE_MIN_HITS', 3)
+CONFIRM_SCORE = getattr(settings, 'EVIDENCE_CONFIRM_SCORE', 0.72)
+INSTANT_SCORE = getattr(settings, 'EVIDENCE_INSTANT_SCORE', 0.90)
+
+PENDING = 'pending'
+CONFIRMED = 'confirmed'
+
+
+_OBSERVE = """
+local key = KEYS[1]
+local now, similarity = tonumber(ARGV[1]), tonumber(ARGV[2])
+local window, min_hits = tonumber(ARGV[3]), tonumber(ARGV[4])
+local confirm_score, instant_score = tonumber(ARGV[5]), tonumber(ARGV[6])
+
+redis.call('ZREMRANGEBYSCORE', key, '-inf', '(' .. (now - window))
+redis.call('ZADD', key, now, ARGV[7])
+redis.call('ZREMRANGEBYRANK', key, 0, -(min_hits * 4) - 1)
+
+local total, hits = 0, 0
+for _, member in ipairs(redis.call('ZRANGE', key, 0, -1)) do
+    total = total + tonumber(string.match(member, '^([^|]+)'))
+    hits = hits + 1
+end
+local score = total / hits
+
+local confirmed = similarity >= instant_score or (hits >= min_hits and score >= confirm_score)
+if confirmed then
+    redis.call('DEL', key)
+else
+    redis.call('PEXPIRE', key, math.ceil(window * 1000))
+end
+return {confirmed and 1 or 0, hits, tostring(score)}
+"""
+_observe_script = None
+
+
+def _key(camera_id, case_id):
+    return f"evidence:{camera_id}:{case_id}"
+
+
+def observe(camera_id, case_id, similarity, now=None):
+    """
+    Adds one matched frame to the camera/case window and returns its state:
+    {"state": "pending"|"confirmed", "hits", "required", "score"} where score is the window mean.
+    """
+    global _observe_script
+    if _observe_script is None:
+        _observe_script = get_redis().register_script(_OBSERVE)
+
+    now = time.time() if now is None else now
+    similarity = float(similarity)
+    confirmed, hits, score = _observe_script(
+        keys=[_key(camera_id, case_id)],
+        args=[now, similarity, WINDOW_SECONDS, MIN_HITS, CONFIRM_SCORE, INSTANT_SCORE,
+              f"{similarity!r}|{uuid.uuid4().hex[:8]}"],
+    )
+    return {
+        'state': CONFIRMED if confirmed else PENDING,
+        'hits': int(hits),
+        'required': MIN_HITS,
+        'score': float(score),
+    }
+
@@ -0,0 +1,192 @@
+# cases/frame_buffer.py
+
+import time
+import cv2
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+
+# --- Shared-Memory Frame Ring ---
+#
+# Capture writes decoded frames straight into fixed-size slots of one shared
+# memory block; inference workers attach by name and read NumPy views of the
+# same memory, so no frame is ever pickled between processes.
+#
+# Block layout (all header fields are int64/float64, 8 bytes each):
+#   [ slots | height | width | channels | head ]      -> HEADER_FIELDS
+#   [ slot_seq[0..slots-1] ]                          -> seqlock per slot
+#   [ slot_ts[0..slots-1] ]                           -> capture time per slot
+#   [ frames[slots, height, width, channels] uint8 ]  -> pixel data (64B aligned)
+#
+# `head` is the number of the last fully written frame (-1 before the first).
+# Frame n lives in slot n % slots. Its slot_seq is 2n+1 while the writer is
+# copying pixels in and 2n+2 once the frame is complete, so a reader can tell
+# whether the slot still holds the frame it asked for before AND after using it.
+
+HEADER_FIELDS = 5
+FRAME_ALIGN = 64
+
+
+def _frames_offset(slots):
+    meta_bytes = 8 * (HEADER_FIELDS + 2 * slots)
+    return ((meta_bytes + FRAME_ALIGN - 1) // FRAME_ALIGN) * FRAME_ALIGN
+
+
+def _attach(name):
+    """Attach to an existing block without letting this process's resource tracker unlink it on exit."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python >= 3.13
+    except TypeError:
+        pass
+
+    # Older Pythons always register the block, so skip registration while attaching;
+    # only the creating process tracks (and eventually unlinks) it.
+    register = resource_tracker.register
+    resource_tracker.register = lambda *args, **kwargs: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def letterbox(frame, frame_shape):
+    """
+    Scales `frame` to fit `frame_shape` with its aspect ratio kept and pads the rest with
+    black, so a camera that changes resolution mid-stream still fits its ring undistorted.
+    """
+    height, width = frame_shape[:2]
+    scale = min(width / frame.shape[1], height / frame.shape[0])
+    new_w = max(1, min(width, round(frame.shape[1] * scale)))
+    new_h = max(1, min(height, round(frame.shape[0] * scale)))
+
+    out = np.zeros(frame_shape, dtype=np.uint8)
+    top, left = (height - new_h) // 2, (width - new_w) // 2
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+    out[top:top + new_h, left:left + new_w] = cv2.resize(frame, (new_w, new_h), interpolation=interpolation)
+    return out
+
+
+class FrameRing:
+    """
+    Single-writer / multi-reader ring buffer of fixed-shape uint8 frames in shared memory.
+
+    Writer:  ring = FrameRing.create("reunite-cam-1", slots=8, frame_shape=(1080, 1920, 3))
+             ring.write(frame)
+    Reader:  ring = FrameRing.attach("reunite-cam-1")
+             frame_no = ring.latest()
+             view = ring.view(frame_no)          # zero-copy
+             ... run detection on view ...
+             if ring.is_intact(frame_no): use the result
+    """
+
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        buf = shm.buf
+
+        self._header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=buf, offset=0)
+        self.slots = int(self._header[0])
+        self.frame_shape = tuple(int(x) for x in self._header[1:4])
+
+        self._seq = np.ndarray((self.slots,), dtype=np.int64, buffer=buf, offset=8 * HEADER_FIELDS)
+        self._ts = np.ndarray((self.slots,), dtype=np.float64, buffer=buf,
+                              offset=8 * (HEADER_FIELDS + self.slots))
+        self._frames = np.ndarray((self.slots,) + self.frame_shape, dtype=np.uint8, buffer=buf,
+                                  offset=_frames_offset(self.slots))
+
+    @classmethod
+    def create(cls, name=None, slots=8, frame_shape=(1080, 1920, 3)):
+        frame_shape = tuple(frame_shape)
+        if len(frame_shape) != 3:
+            raise ValueError("frame_shape must be (height, width, channels)")
+
+        size = _frames_offset(slots) + slots * int(np.prod(frame_shape))
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+
+        header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=shm.buf, offset=0)
+        header[:] = (slots, *frame_shape, -1)
+        del header
+        np.ndarray((2 * slots,), dtype=np.int64, buffer=shm.buf, offset=8 * HEADER_FIELDS)[:] = 0
+
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        return cls(_attach(name), owner=False)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    # --- Writer side (exactly one process) ---
+
+    def write(self, frame, timestamp=None):
+        """Copies `frame` into the next slot and returns its frame number."""
+        if frame.shape != self.frame_shape:
+            raise ValueError(f"Frame shape {frame.shape} does not match ring shape {self.frame_shape}")
+
+        frame_no = int(self._header[4]) + 1
+        slot = frame_no % self.slots
+
+        self._seq[slot] = 2 * frame_no + 1           # mark slot as being written
+        np.copyto(self._frames[slot], frame)
+        self._ts[slot] = time.time() if timestamp is None else timestamp
+        self._seq[slot] = 2 * frame_no + 2           # frame complete
+        self._header[4] = frame_no                   # publish
+        return frame_no
+
+    # --- Reader side (any number of processes) ---
+
+    def latest(self):
+        """Number of the newest complete frame, or -1 if nothing has been written yet."""
+        return int(self._header[4])
+
+    def is_intact(self, frame_no):
+        """True if the slot still holds a complete copy of `frame_no`."""
+        return frame_no >= 0 and int(self._seq[frame_no % self.slots]) == 2 * frame_no + 2
+
+    def view(self, frame_no):
+        """
+        Zero-copy view of `frame_no`, or None if it was never written or already overwritten.
+        The writer may reuse the slot at any time; check is_intact(frame_no) after using the view.
+        """
+        if not self.is_intact(frame_no):
+            return None
+        return self._frames[frame_no % self.slots]
+
+    def timestamp(self, frame_no):
+        return float(self._ts[frame_no % self.slots])
+
+    def read_latest(self, out=None, retries=3):
+        """
+        Copies the newest frame into `out` (allocated if None) and returns (frame_no, frame).
+        Returns (-1, None) if no intact frame could be copied within `retries` attempts.
+        """
+        for _ in range(retries):
+            frame_no = self.latest()
+            view = self.view(frame_no)
+            if view is None:
+                continue
+            if out is None:
+                out = np.empty(self.frame_shape, dtype=np.uint8)
+            np.copyto(out, view)
+            if self.is_intact(frame_no):
+                return frame_no, out
+        return -1, None
+
+    # --- Lifecycle ---
+
+    def close(self):
+        # NumPy views must be dropped before the mapping can be closed.
+        self._header = self._seq = self._ts = self._frames = None
+        self.shm.close()
+
+    def unlink(self):
+        if self.owner:
+            self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        self.unlink()
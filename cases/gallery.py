@@ -0,0 +1,99 @@
+# cases/gallery.py
+
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .models import FaceEmbedding
+
+# --- In-Memory Embedding Gallery (one per model version) ---
+#
+# Matching used to load every FaceEmbedding row and compare them one by one in Python.
+# Instead, each process keeps one L2-normalized (N, 512) float32 matrix per model version,
+# so matching a frame is a single matrix product. A gallery is rebuilt when its version's
+# rows change (row count or newest updated_at), checked at most every GALLERY_REFRESH_SECONDS.
+
+GALLERY_REFRESH_SECONDS = getattr(settings, 'FACE_GALLERY_REFRESH_SECONDS', 5)
+
+_galleries = {}  # model_version -> Gallery
+_lock = threading.Lock()
+
+
+class Gallery:
+    """Immutable snapshot of one model version's embeddings."""
+
+    def __init__(self, model_version, case_ids, complaint_ids, matrix, fingerprint):
+        self.model_version = model_version
+        self.case_ids = case_ids            # Case primary keys, row-aligned with matrix
+        self.complaint_ids = complaint_ids  # Case.complaint_id, row-aligned with matrix
+        self.matrix = matrix                # (N, D) float32, rows L2-normalized
+        self.fingerprint = fingerprint
+        self.checked_at = time.monotonic()
+
+    def __len__(self):
+        return len(self.case_ids)
+
+    @classmethod
+    def load(cls, model_version):
+        fingerprint = _fingerprint(model_version)
+        rows = list(FaceEmbedding.objects
+                    .filter(model_version=model_version)
+                    .order_by('case_id')
+                    .values_list('case_id', 'case__complaint_id', 'embedding_vector'))
+        if rows:
+            matrix = np.asarray([vector for _, _, vector in rows], dtype=np.float32)
+            # Case vectors are means of normalized vectors, so they need normalizing again
+            matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+
+        return cls(model_version, [r[0] for r in rows], [r[1] for r in rows], matrix, fingerprint)
+
+    def search(self, embeddings, k=1):
+        """
+        Cosine similarity of each query row against the whole gallery.
+        Returns (indices, similarities), both (Q, k), best first.
+        """
+        queries = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.matrix.shape[1])
+        queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        scores = queries @ self.matrix.T
+
+        k = min(k, scores.shape[1])
+        if k == 1:
+            indices = scores.argmax(axis=1)[:, None]
+        else:
+            indices = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            order = np.take_along_axis(-scores, indices, axis=1).argsort(axis=1)
+            indices = np.take_along_axis(indices, order, axis=1)
+        return indices, np.take_along_axis(scores, indices, axis=1)
+
+
+def _fingerprint(model_version):
+    stats = FaceEmbedding.objects.filter(model_version=model_version).aggregate(n=Count('id'), newest=Max('updated_at'))
+    return stats['n'], stats['newest']
+
+
+def get_gallery(model_version):
+    """The current gallery of `model_version`, reloaded only if its rows changed."""
+    gallery = _galleries.get(model_version)
+
+    if gallery is not None and time.monotonic() - gallery.checked_at < GALLERY_REFRESH_SECONDS:
+        return gallery
+
+    with _lock:
+        gallery = _galleries.get(model_version)
+        if gallery is not None and gallery.fingerprint == _fingerprint(model_version):
+            gallery.checked_at = time.monotonic()
+            return gallery
+
+        gallery = Gallery.load(model_version)
+        _galleries[model_version] = gallery
+        print(f"Gallery: Loaded {len(gallery)} embeddings for {model_version}.")
+        return gallery
+
+
+def drop_gallery(model_version):
+    _galleries.pop(model_version, None)
@@ -0,0 +1,104 @@
+# cases/geo.py
+
+import math
+
+import numpy as np
+
+# --- Vectorized Geo Utilities ---
+#
+# All distances are great-circle (haversine) distances in kilometres on a spherical Earth.
+# Coordinates come from Decimal lat/lon model fields; convert them ONCE into float arrays
+# with coords_from_queryset() and run every distance / radius query on the arrays.
+# Array arguments broadcast like NumPy: scalars, (N,) and (N, 1) x (M,) all work.
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE_LAT = math.pi * EARTH_RADIUS_KM / 180.0  # ~111.2 km
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Element-wise (broadcasting) distance in km between arrays of degrees."""
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = np.radians(np.subtract(lon2, lon1))
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def distances_from(latitude, longitude, coords):
+    """One-to-many: (N,) km from one point to each row of `coords` (N, 2) [lat, lon]."""
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    return haversine(latitude, longitude, coords[:, 0], coords[:, 1])
+
+
+def pairwise_distances(coords_a, coords_b=None):
+    """Many-to-many: (N, M) km between every row of `coords_a` (N, 2) and `coords_b` (M, 2)."""
+    a = np.asarray(coords_a, dtype=np.float64).reshape(-1, 2)
+    b = a if coords_b is None else np.asarray(coords_b, dtype=np.float64).reshape(-1, 2)
+    return haversine(a[:, 0:1], a[:, 1:2], b[None, :, 0], b[None, :, 1])
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """
+    (min_lat, max_lat, min_lon, max_lon) enclosing every point within radius_km.
+    Near the poles, or when the box would cross the antimeridian, longitude is left unbounded
+    (-180, 180) so the prefilter never drops a true match.
+    """
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    min_lat, max_lat = latitude - dlat, latitude + dlat
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90.0), min(max_lat, 90.0), -180.0, 180.0
+
+    dlon = math.degrees(math.asin(min(1.0, math.sin(math.radians(dlat)) / math.cos(math.radians(latitude)))))
+    min_lon, max_lon = longitude - dlon, longitude + dlon
+    if min_lon < -180 or max_lon > 180:
+        return min_lat, max_lat, -180.0, 180.0
+    return min_lat, max_lat, min_lon, max_lon
+
+
+def within_radius(latitude, longitude, coords, radius_km):
+    """
+    Rows of `coords` within radius_km of the point, closest first.
+    A cheap bounding-box test runs first; haversine is only evaluated for rows inside the box.
+    Returns (indices, distances_km).
+    """
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, radius_km)
+    candidates = np.flatnonzero(
+        (coords[:, 0] >= min_lat) & (coords[:, 0] <= max_lat) &
+        (coords[:, 1] >= min_lon) & (coords[:, 1] <= max_lon)
+    )
+
+    dist = distances_from(latitude, longitude, coords[candidates])
+    inside = dist <= radius_km
+    indices, dist = candidates[inside], dist[inside]
+    order = np.argsort(dist, kind='stable')
+    return indices[order], dist[order]
+
+
+def coords_from_queryset(queryset, lat_field='latitude', lon_field='longitude'):
+    """
+    Primary keys and an (N, 2) float64 [lat, lon] array for rows that have both coordinates.
+    The Decimal -> float conversion happens once, here.
+    """
+    rows = list(queryset
+                .exclude(**{f'{lat_field}__isnull': True})
+                .exclude(**{f'{lon_field}__isnull': True})
+                .values_list('pk', lat_field, lon_field))
+    ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+    coords = np.array([(float(r[1]), float(r[2])) for r in rows], dtype=np.float64).reshape(-1, 2)
+    return ids, coords
+
+
+def queryset_within_radius(queryset, latitude, longitude, radius_km, lat_field='latitude', lon_field='longitude'):
+    """
+    [(pk, distance_km)] of rows within radius_km, closest first. The bounding box is applied in
+    SQL first, so only nearby rows are fetched and converted.
+    """
+    min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, radius_km)
+    boxed = queryset.filter(**{
+        f'{lat_field}__gte': min_lat, f'{lat_field}__lte': max_lat,
+        f'{lon_field}__gte': min_lon, f'{lon_field}__lte': max_lon,
+    })
+    ids, coords = coords_from_queryset(boxed, lat_field, lon_field)
+    indices, dist = within_radius(latitude, longitude, coords, radius_km)
+    return [(int(ids[i]), float(d)) for i, d in zip(indices, dist)]
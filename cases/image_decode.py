@@ -0,0 +1,99 @@
+# cases/image_decode.py
+
+import io
+import cv2
+import numpy as np
+from PIL import Image
+
+# --- Decode-Time Downscaling ---
+#
+# The detector resizes every image to det_size (640px) anyway, so decoding a 12MP
+# phone photo at full resolution wastes most of the decode time and memory.
+# libjpeg can decode directly at 1/2, 1/4 or 1/8 scale (DCT scaling), which OpenCV
+# exposes as IMREAD_REDUCED_COLOR_*. We pick the strongest reduction that still
+# leaves the longer side at or above the detector input size. Non-JPEG formats
+# accept the same flags (OpenCV resizes after decoding), so the result is identical,
+# only the savings are smaller.
+
+REDUCED_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+
+def image_size(source):
+    """(width, height) read from the file header only, or None if it can't be parsed."""
+    try:
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            source = io.BytesIO(source)
+        with Image.open(source) as img:
+            return img.size
+    except Exception:
+        return None
+
+
+def pick_reduction(size, target_side):
+    """Returns (factor, imread_flag) for the largest reduction keeping max(size)/factor >= target_side."""
+    if size:
+        longer = max(size)
+        for factor, flag in REDUCED_FLAGS:
+            if longer / factor >= target_side:
+                return factor, flag
+    return 1, cv2.IMREAD_COLOR
+
+
+def decode_image(source, target_side=640, full_resolution_from=None):
+    """
+    Decodes a path or encoded bytes to BGR, reduced as far as `target_side` allows.
+    Images whose longer side is at least `full_resolution_from` are decoded at full size
+    (used when a later stage, like tiled detection, needs the native resolution).
+
+    Returns (image, scale) where scale = full-resolution pixels per decoded pixel,
+    or (None, 1.0) if the data could not be decoded.
+    """
+    size = image_size(source)
+    if full_resolution_from and size and max(size) >= full_resolution_from:
+        flag = cv2.IMREAD_COLOR
+    else:
+        _, flag = pick_reduction(size, target_side)
+
+    img = _imdecode(source, flag)
+    if img is None:
+        return None, 1.0
+
+    # Orientation-independent: EXIF rotation may swap width and height on decode
+    scale = max(size) / max(img.shape[:2]) if size else 1.0
+    return img, scale
+
+
+def decode_regions(source, boxes, factor=1, padding=0.5):
+    """
+    Decodes `source` once at 1/`factor` size (1, 2, 4 or 8; libjpeg DCT scaling) and returns
+    [(crop, (x0, y0), scale)] for the padded region around each box = [x1, y1, x2, y2] in
+    full-resolution pixels. (x0, y0) is the crop origin in decoded pixels and scale is
+    full-resolution pixels per decoded pixel. Only the crops are kept: the decoded frame is
+    dropped as soon as they are copied out. Returns [] if the data could not be decoded.
+    """
+    size = image_size(source)
+    img = _imdecode(source, dict(REDUCED_FLAGS).get(factor, cv2.IMREAD_COLOR))
+    if img is None:
+        return []
+
+    scale = max(size) / max(img.shape[:2]) if size else 1.0
+    h, w = img.shape[:2]
+    regions = []
+    for box in boxes:
+        x1, y1, x2, y2 = (v / scale for v in box)
+        pad_w, pad_h = (x2 - x1) * padding, (y2 - y1) * padding
+        x0, y0 = max(0, int(x1 - pad_w)), max(0, int(y1 - pad_h))
+        crop = img[y0:min(h, int(y2 + pad_h) + 1), x0:min(w, int(x2 + pad_w) + 1)].copy()
+        regions.append((crop, (x0, y0), scale))
+    del img
+    return regions
+
+
+def _imdecode(source, flag):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return cv2.imdecode(np.frombuffer(source, np.uint8), flag)
+    return cv2.imread(source, flag)
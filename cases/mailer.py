@@ -0,0 +1,104 @@
+# cases/mailer.py
+
+import smtplib
+import threading
+import time
+
+from celery.signals import worker_process_shutdown
+from django.conf import settings
+from django.core.mail import get_connection
+
+# --- Pooled Mail Dispatcher ---
+#
+# EmailMessage.send() opens a new SMTP (+TLS, +AUTH) session for every message. During a
+# burst of detections that serializes on handshakes and trips provider rate limits.
+# Each process (Celery worker child) instead keeps one long-lived connection, sends
+# batches of messages over it (the outbox hands over up to MAIL_BATCH_SIZE at a time,
+# cases/outbox.py), and reconnects once when the server has dropped it.
+# Connections idle longer than MAIL_CONNECTION_MAX_IDLE are reopened proactively, since
+# most servers time idle sessions out anyway.
+
+MAIL_CONNECTION_MAX_IDLE = getattr(settings, 'MAIL_CONNECTION_MAX_IDLE', 240)
+
+# Errors meaning "the connection is gone", worth one reconnect. Anything else (e.g. a
+# refused recipient) is a problem with the message itself and is not retried here.
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, TimeoutError)
+
+
+class PooledMailer:
+    def __init__(self, max_idle=MAIL_CONNECTION_MAX_IDLE):
+        self.max_idle = max_idle
+        self.connects = 0  # sessions opened so far (for monitoring / tests)
+        self._connection = None
+        self._last_used = 0.0
+        self._lock = threading.Lock()
+
+    def _get_connection(self):
+        if self._connection is not None and time.monotonic() - self._last_used > self.max_idle:
+            self.close()
+        if self._connection is None:
+            connection = get_connection(fail_silently=False)
+            connection.open()
+            self._connection = connection
+            self.connects += 1
+        return self._connection
+
+    def close(self):
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except Exception:
+                pass
+            self._connection = None
+
+    def _send_one(self, message):
+        for attempt in (1, 2):
+            connection = self._get_connection()
+            try:
+                connection.send_messages([message])
+                self._last_used = time.monotonic()
+                return
+            except CONNECTION_ERRORS:
+                self.close()
+                if attempt == 2:
+                    raise
+                print("Mailer: SMTP connection lost, reconnecting...")
+
+    def send(self, message):
+        """Sends one message over the pooled connection. Raises if it still fails after a reconnect."""
+        with self._lock:
+            self._send_one(message)
+
+    def send_many(self, messages):
+        """
+        Sends a batch of messages, all over the same session; one failing message does not stop the rest.
+        Returns a list aligned with `messages`: None for sent, the exception for failed.
+        """
+        results = []
+        with self._lock:
+            for message in messages:
+                try:
+                    self._send_one(message)
+                    results.append(None)
+                except Exception as e:
+                    results.append(e)
+        return results
+
+
+_mailer = None
+
+
+def get_mailer():
+    """The mailer of this process (created lazily, so each forked worker child gets its own)."""
+    global _mailer
+    if _mailer is None:
+        _mailer = PooledMailer()
+    return _mailer
+
+
+def close_mailer(**kwargs):
+    if _mailer is not None:
+        _mailer.close()
+
+
+worker_process_shutdown.connect(close_mailer, weak=False)
@@ -0,0 +1,244 @@
+import math
+import os
+import resource
+import sqlite3
+import tempfile
+import time
+import multiprocessing as mp
+
+import cv2
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+
+def _peak_rss_kb():
+    """Peak resident set size of this process. VmHWM resets on exec, unlike ru_maxrss."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+# --- decode: full-resolution imread vs. reduced decode_image ---
+
+def _decode_worker(mode, path, repeat, result_queue):
+    """Runs in a fresh process so the peak RSS reflects only this decode mode."""
+    from cases.image_decode import decode_image
+
+    baseline_kb = _peak_rss_kb()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        if mode == 'full':
+            img = cv2.imread(path, cv2.IMREAD_COLOR)
+        else:
+            img, _ = decode_image(path, target_side=640)
+    elapsed = time.perf_counter() - started
+    peak_kb = _peak_rss_kb()
+    result_queue.put((elapsed / repeat, baseline_kb, peak_kb, img.shape))
+
+
+def _synthetic_photo(directory):
+    """12MP (4032x3024) JPEG: smooth blobs plus mild sensor-like noise, like a phone photo."""
+    rng = np.random.default_rng(0)
+    small = rng.integers(0, 256, (24, 32, 3), dtype=np.uint8)
+    img = cv2.resize(small, (4032, 3024), interpolation=cv2.INTER_CUBIC).astype(np.float32)
+    img = (img + rng.normal(0, 6, img.shape)).clip(0, 255).astype(np.uint8)
+    path = os.path.join(directory, 'synthetic_12mp.jpg')
+    cv2.imwrite(path, img, [cv2.IMWRITE_JPEG_QUALITY, 92])
+    return path
+
+
+# --- geo: scalar haversine loop vs. cases.geo (NumPy) ---
+
+def _haversine_scalar(lat1, lon1, lat2, lon2):
+    """The per-pair math.* distance the alert task used to loop over (the baseline)."""
+    from cases.geo import EARTH_RADIUS_KM
+
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _timed(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - started) / repeat, result
+
+
+def _random_coords(n, rng):
+    """Points spread over India's bounding box, like the station table."""
+    return np.column_stack([rng.uniform(8.0, 36.0, n), rng.uniform(68.0, 97.0, n)])
+
+
+# --- fts: LIKE '%...%' scans vs. the FTS5 index (cases.search) ---
+
+_SYLLABLES = ['ra', 'vi', 'pri', 'ya', 'a', 'mit', 'sne', 'ha', 'ru', 'pa', 'ar', 'jun', 'ka', 'vya', 'sha',
+              'ma', 'ni', 'kul', 'kar', 'des', 'mukh', 'i', 'yer', 're', 'ddy', 'jo', 'shi', 'na', 'gu', 'pta',
+              'cha', 'van', 'shin', 'de', 'ver', 'meh', 'ta', 'ro', 'han', 'la', 'kshmi', 'san', 'jay', 'dhi']
+_CLOTHES = ['red shirt', 'blue jeans', 'white kurta', 'black jacket', 'green saree', 'school uniform',
+            'yellow t-shirt', 'grey hoodie', 'brown sandals', 'checked shirt']
+_MARKS = ['mole on left cheek', 'scar on forehead', 'birthmark on neck', 'wears spectacles', 'tattoo on arm', '']
+_PLACES = ['pune station', 'swargate', 'shivajinagar', 'kothrud', 'hadapsar', 'dadar', 'andheri', 'thane',
+           'nashik road', 'nagpur bus stand']
+
+
+def _fts_database(size, rng):
+    """In-memory cases_case with the FTS5 index and triggers of cases.search, filled with `size` cases."""
+    from cases.search import FTS_COLUMNS, FTS_SCHEMA
+
+    db = sqlite3.connect(':memory:')
+    db.execute(f"CREATE TABLE cases_case (id INTEGER PRIMARY KEY, {', '.join(f'{c} TEXT' for c in FTS_COLUMNS)})")
+    for statement in FTS_SCHEMA:
+        db.execute(statement)
+
+    def pick(words):
+        return words[rng.integers(len(words))]
+
+    def name():  # tens of thousands of distinct names, like a real register
+        return ' '.join(''.join(pick(_SYLLABLES) for _ in range(rng.integers(2, 4))) for _ in range(2))
+
+    rows = (
+        (name(), name(),
+         f"{pick(_CLOTHES)}, {pick(_CLOTHES)}", pick(_MARKS), pick(_PLACES))
+        for _ in range(size)
+    )
+    with db:  # the insert trigger indexes every row
+        db.executemany(f"INSERT INTO cases_case ({', '.join(FTS_COLUMNS)}) VALUES (?, ?, ?, ?, ?)", rows)
+    return db
+
+
+class Command(BaseCommand):
+    help = 'Micro-benchmarks for performance-sensitive code paths'
+
+    def add_arguments(self, parser):
+        parser.add_argument('target', choices=['decode', 'geo', 'fts'], help='What to benchmark')
+        parser.add_argument('paths', nargs='*', help='Input files (decode: images; default is a synthetic 12MP JPEG)')
+        parser.add_argument('--size', type=int, default=100000, help='geo: number of points, fts: number of cases (default: 100000)')
+        parser.add_argument('--repeat', type=int, default=10, help='Iterations per measurement (default: 10)')
+
+    def handle(self, *args, **options):
+        getattr(self, f"bench_{options['target']}")(**options)
+
+    def bench_decode(self, paths, repeat, **options):
+        ctx = mp.get_context('spawn')
+
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = paths or [_synthetic_photo(tmp)]
+            for path in paths:
+                if not os.path.isfile(path):
+                    raise CommandError(f"Image not found: {path}")
+
+                self.stdout.write(f"\n{path}")
+                for mode in ('full', 'reduced'):
+                    queue = ctx.Queue()
+                    proc = ctx.Process(target=_decode_worker, args=(mode, path, repeat, queue))
+                    proc.start()
+                    per_decode, baseline_kb, peak_kb, shape = queue.get()
+                    proc.join()
+                    self.stdout.write(
+                        f"  {mode:<8} {per_decode * 1000:8.1f} ms/decode | "
+                        f"peak RSS {peak_kb / 1024:7.1f} MB (+{(peak_kb - baseline_kb) / 1024:.1f} MB) | "
+                        f"decoded {shape[1]}x{shape[0]}"
+                    )
+
+    def bench_geo(self, repeat, size, **options):
+        from cases import geo
+
+        rng = np.random.default_rng(0)
+        coords = _random_coords(size, rng)
+        coord_list = coords.tolist()
+        lat, lon = 18.5204, 73.8567  # Pune
+
+        self.stdout.write(f"\n{size} points, {repeat} repeats")
+
+        # 1. One-to-many: distance to every point, then the 2 nearest
+        def scalar_nearest():
+            dist = [(_haversine_scalar(lat, lon, a, b), i) for i, (a, b) in enumerate(coord_list)]
+            dist.sort()
+            return [i for _, i in dist[:2]]
+
+        def vector_nearest():
+            dist = geo.distances_from(lat, lon, coords)
+            top = np.argpartition(dist, 2)[:2]
+            return top[np.argsort(dist[top])].tolist()
+
+        t_scalar, r_scalar = _timed(scalar_nearest, max(1, repeat // 5))
+        t_vector, r_vector = _timed(vector_nearest, repeat)
+        self._report('one-to-many + top 2', t_scalar, t_vector, r_scalar == r_vector)
+
+        # 2. Radius query (25 km): full scan vs. bounding-box prefilter
+        def scalar_radius():
+            return sorted(i for i, (a, b) in enumerate(coord_list) if _haversine_scalar(lat, lon, a, b) <= 25.0)
+
+        def vector_radius():
+            return sorted(geo.within_radius(lat, lon, coords, 25.0)[0].tolist())
+
+        t_scalar, r_scalar = _timed(scalar_radius, max(1, repeat // 5))
+        t_vector, r_vector = _timed(vector_radius, repeat)
+        self._report(f'radius 25 km ({len(r_vector)} hits)', t_scalar, t_vector, r_scalar == r_vector)
+
+        # 3. Many-to-many: 500 x 2000 distance matrix
+        a, b = coords[:500], coords[500:2500]
+        a_list, b_list = a.tolist(), b.tolist()
+
+        def scalar_matrix():
+            return [[_haversine_scalar(p, q, r, s) for r, s in b_list] for p, q in a_list]
+
+        def vector_matrix():
+            return geo.pairwise_distances(a, b)
+
+        t_scalar, r_scalar = _timed(scalar_matrix, 1)
+        t_vector, r_vector = _timed(vector_matrix, repeat)
+        self._report('many-to-many 500x2000', t_scalar, t_vector, np.allclose(r_scalar, r_vector))
+
+    def bench_fts(self, repeat, size, **options):
+        from cases.search import FTS_COLUMNS, FTS_TABLE, FTS_WEIGHTS, match_query
+
+        rng = np.random.default_rng(0)
+        started = time.perf_counter()
+        db = _fts_database(size, rng)
+        self.stdout.write(f"\n{size} cases, {repeat} repeats (built and indexed in {time.perf_counter() - started:.1f}s)")
+
+        # What _case_filters ran before: one LIKE per column, first page by recency
+        like_where = ' OR '.join(f"{c} LIKE ?" for c in FTS_COLUMNS)
+        like_sql = f"SELECT id FROM cases_case WHERE {like_where} ORDER BY id DESC LIMIT 20"
+        weights = ', '.join(str(w) for w in FTS_WEIGHTS)
+        fts_sql = (f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH ? "
+                   f"ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT 20")
+        count_sql = f"SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH ?"
+
+        # A name typed in full and as a prefix (rare, the usual lookup), common clothing / place
+        # words, and a word no case has
+        full_name = db.execute("SELECT missing_name FROM cases_case WHERE id = ?", [size // 2]).fetchone()[0]
+        terms = (full_name, full_name.split()[0][:4], 'mole cheek', 'swargate', 'zzzz')
+        for term in terms:
+            words = term.split()
+            if len(words) == 1:
+                like = lambda: db.execute(like_sql, [f"%{term}%"] * len(FTS_COLUMNS)).fetchall()
+            else:  # every word in some column, as icontains would need it
+                where = ' AND '.join(f"({like_where})" for _ in words)
+                sql = f"SELECT id FROM cases_case WHERE {where} ORDER BY id DESC LIMIT 20"
+                params = [f"%{w}%" for w in words for _ in FTS_COLUMNS]
+                like = lambda: db.execute(sql, params).fetchall()
+            query = match_query(term)
+            t_like, _ = _timed(like, repeat)
+            t_fts, _ = _timed(lambda: db.execute(fts_sql, [query]).fetchall(), repeat)
+            hits = db.execute(count_sql, [query]).fetchone()[0]
+            self.stdout.write(
+                f"  {term!r:<22} LIKE scan {t_like * 1000:9.2f} ms | fts5+bm25 {t_fts * 1000:8.3f} ms | "
+                f"x{t_like / max(t_fts, 1e-9):7.1f} | {hits} matches"
+            )
+        db.close()
+
+    def _report(self, label, t_scalar, t_vector, same):
+        self.stdout.write(
+            f"  {label:<28} scalar {t_scalar * 1000:9.2f} ms | numpy {t_vector * 1000:8.3f} ms | "
+            f"x{t_scalar / max(t_vector, 1e-9):6.1f} | results {'match' if same else 'DIFFER'}"
+        )
@@ -0,0 +1,70 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from cases.duplicates import DUPLICATE_CASE_THRESHOLD, canonical_pair, duplicate_clusters, find_duplicate_pairs
+from cases.gallery import Gallery
+from cases.models import DuplicateCaseCandidate, EmbeddingModelVersion
+
+
+class Command(BaseCommand):
+    help = 'Find clusters of cases that are probably the same person, across the whole database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model-version', default=None,
+                            help='Gallery to scan (default: the active version)')
+        parser.add_argument('--threshold', type=float, default=DUPLICATE_CASE_THRESHOLD,
+                            help=f'Minimum cosine similarity (default: {DUPLICATE_CASE_THRESHOLD})')
+        parser.add_argument('--block-size', type=int, default=2048,
+                            help='Rows per block of the self-join; bounds memory at block x N (default: 2048)')
+        parser.add_argument('--save', action='store_true',
+                            help='Store every pair found so it shows on the case detail pages')
+
+    def handle(self, *args, **options):
+        # Resolved without importing ai_processor, so the scan doesn't load a face model
+        model_version = (
+            options['model_version']
+            or EmbeddingModelVersion.objects.filter(is_active=True).values_list('name', flat=True).first()
+            or getattr(settings, 'FACE_MODEL_DEFAULT_VERSION', 'buffalo_l-det640')
+        )
+
+        gallery = Gallery.load(model_version)
+        n = len(gallery)
+        self.stdout.write(f"Scanning {n} case embeddings of '{model_version}' "
+                          f"(threshold {options['threshold']:.2f}).")
+        if n < 2:
+            return
+
+        started = time.perf_counter()
+        pair_i, pair_j, sims = find_duplicate_pairs(gallery.matrix, options['threshold'], options['block_size'])
+        clusters = duplicate_clusters(n, pair_i, pair_j)
+        elapsed = time.perf_counter() - started
+
+        best = {}
+        for i, j, s in zip(pair_i, pair_j, sims):
+            best[int(i)] = max(best.get(int(i), 0.0), float(s))
+            best[int(j)] = max(best.get(int(j), 0.0), float(s))
+
+        for number, rows in enumerate(sorted(clusters, key=len, reverse=True), start=1):
+            members = ', '.join(f"{gallery.complaint_ids[r]} ({best[r]:.2f})" for r in rows)
+            self.stdout.write(f"  Cluster {number}: {members}")
+
+        if options['save'] and len(pair_i):
+            # Gallery rows aren't in pk order, so i < j says nothing about which case is older
+            pairs = [(canonical_pair(gallery.case_ids[i], gallery.case_ids[j]), float(s))
+                     for i, j, s in zip(pair_i, pair_j, sims)]
+            DuplicateCaseCandidate.objects.bulk_create(
+                [
+                    DuplicateCaseCandidate(case_id=low, duplicate_of_id=high,
+                                           similarity=s, model_version=model_version)
+                    for (low, high), s in pairs
+                ],
+                update_conflicts=True,
+                unique_fields=['case', 'duplicate_of'],
+                update_fields=['similarity', 'model_version', 'detected_at'],
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(pair_i)} duplicate pair(s) in {len(clusters)} cluster(s), self-join took {elapsed * 1000:.1f} ms."
+        ))
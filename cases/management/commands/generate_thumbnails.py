@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from cases.models import CasePhoto
+from cases.thumbnails import generate_for_photo, record_failure
+
+
+class Command(BaseCommand):
+    help = 'Build the WebP/JPEG thumbnails of photos that have none yet (existing uploads, failed tasks, failed photos)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Rebuild every photo, e.g. after changing PHOTO_DERIVATIVE_WIDTHS')
+
+    def handle(self, *args, **options):
+        photos = CasePhoto.objects.order_by('pk')
+        if not options['all']:
+            # Every photo without thumbnails, including those the periodic sweep gave up on
+            photos = photos.exclude(derivatives__has_key='jpeg')
+
+        total = photos.count()
+        self.stdout.write(f"Building thumbnails for {total} photo(s).")
+        started = time.perf_counter()
+        failed = 0
+        for n, photo in enumerate(photos.iterator(), start=1):
+            try:
+                generate_for_photo(photo)
+            except Exception as e:
+                failed += 1
+                record_failure(photo, e)
+                self.stderr.write(f"  Photo {photo.pk} ({photo.image.name}): {e}")
+            if n % 100 == 0:
+                self.stdout.write(f"  {n}/{total} ({n / (time.perf_counter() - started):.1f} photos/s)")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Done in {time.perf_counter() - started:.1f}s, {failed} photo(s) could not be read."))
@@ -0,0 +1,199 @@
+import json
+import os
+import time
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from cases.models import Case, CasePhoto, FaceEmbedding, EmbeddingModelVersion
+
+
+# --- Worker process (one InsightFace model per process) ---
+
+def _init_worker(model_version):
+    """Runs once in each pool process: set up Django and load the target model version."""
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Reunite.settings')
+    django.setup()
+    from cases.ai_processor import load_ai_models
+    load_ai_models(model_version)
+
+
+def _embed_case(case_id, image_paths, model_version):
+    from cases.ai_processor import generate_case_embedding
+
+    vector, used = generate_case_embedding(image_paths, model_version)
+    return case_id, vector, used
+
+
+# --- Command ---
+
+class Command(BaseCommand):
+    help = ('Re-embed all (or selected) cases into a model-version slot and, once the whole '
+            'gallery is rebuilt, switch live matching over to it atomically')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model-version', default=None,
+                            help='Target version from FACE_MODEL_VERSIONS (default: FACE_MODEL_DEFAULT_VERSION)')
+        parser.add_argument('--cases', nargs='+', metavar='COMPLAINT_ID',
+                            help='Only rebuild these cases (never triggers the switch-over)')
+        parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                            help='Worker processes, each loads its own model (default: half the CPUs)')
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Embeddings per database upsert (default: 100)')
+        parser.add_argument('--checkpoint', default=None,
+                            help='Progress file for resuming (default: rebuild_embeddings.<version>.checkpoint.json)')
+        parser.add_argument('--no-activate', action='store_true',
+                            help='Fill the slot but leave the currently active version serving')
+        parser.add_argument('--force', action='store_true',
+                            help='Switch over even if cases the active version matches are missing from the slot')
+        parser.add_argument('--background', action='store_true',
+                            help='Queue the rebuild as a Celery task that switches over by itself at full coverage')
+
+    def handle(self, *args, **options):
+        from cases.ai_processor import (
+            FACE_MODEL_VERSIONS, DEFAULT_MODEL_VERSION, active_model_version, cached_case_embedding,
+        )
+
+        model_version = options['model_version'] or DEFAULT_MODEL_VERSION
+        if model_version not in FACE_MODEL_VERSIONS:
+            raise CommandError(f"Unknown model version '{model_version}'. Known: {', '.join(FACE_MODEL_VERSIONS)}")
+
+        if options['background']:
+            from cases.tasks import rebuild_embedding_version
+            rebuild_embedding_version.delay(model_version, options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f"Queued background rebuild of '{model_version}'."))
+            return
+
+        checkpoint_path = options['checkpoint'] or f"rebuild_embeddings.{model_version}.checkpoint.json"
+        done = self._load_checkpoint(checkpoint_path, model_version)
+
+        # 1. Select cases and their enrollment photos (one query for all photos)
+        cases = Case.objects.all()
+        if options['cases']:
+            cases = cases.filter(complaint_id__in=options['cases'])
+        case_ids = [pk for pk in cases.values_list('pk', flat=True) if pk not in done]
+
+        photos = {}
+        for case_id, image_name in (CasePhoto.objects
+                                    .filter(case_id__in=case_ids, is_detection_evidence=False)
+                                    .values_list('case_id', 'image')):
+            photos.setdefault(case_id, []).append(os.path.join(settings.MEDIA_ROOT, image_name))
+
+        version, _ = EmbeddingModelVersion.objects.get_or_create(name=model_version)
+        if not version.is_active:
+            # New enrollments are dual-written into the slot while it is being filled
+            EmbeddingModelVersion.objects.filter(pk=version.pk).update(is_building=True)
+        self.stdout.write(f"Rebuilding '{model_version}': {len(case_ids)} case(s) to process "
+                          f"({len(done)} already done), {options['workers']} worker(s).")
+
+        # 2. Cases whose photos are all in the content-hash cache need no model at all
+        pending = []
+        failed = 0
+        started = time.perf_counter()
+
+        to_embed = []
+        for case_id in case_ids:
+            cached = cached_case_embedding(photos.get(case_id, []), model_version)
+            if cached is None:
+                to_embed.append(case_id)
+                continue
+            vector, used = cached
+            if vector is None:
+                failed += 1
+            pending.append((case_id, vector, used))
+            if len(pending) >= options['batch_size']:
+                self._flush(pending, model_version, done, checkpoint_path)
+        self._flush(pending, model_version, done, checkpoint_path)
+        self.stdout.write(f"  {len(case_ids) - len(to_embed)} case(s) served from the embedding cache, "
+                          f"{len(to_embed)} need inference.")
+        case_ids = to_embed
+
+        # 3. Embed the rest in parallel; the parent batches the upserts and advances the checkpoint
+        if case_ids:
+            with ProcessPoolExecutor(max_workers=options['workers'],
+                                     mp_context=mp.get_context('spawn'),
+                                     initializer=_init_worker,
+                                     initargs=(model_version,)) as pool:
+                futures = [
+                    pool.submit(_embed_case, case_id, photos.get(case_id, []), model_version)
+                    for case_id in case_ids
+                ]
+                for n, future in enumerate(as_completed(futures), start=1):
+                    case_id, vector, used = future.result()
+                    if vector is None:
+                        failed += 1
+                    pending.append((case_id, vector, used))
+
+                    if len(pending) >= options['batch_size']:
+                        self._flush(pending, model_version, done, checkpoint_path)
+                        elapsed = time.perf_counter() - started
+                        self.stdout.write(f"  {n}/{len(case_ids)} cases ({n / elapsed:.1f} cases/s)")
+
+            self._flush(pending, model_version, done, checkpoint_path)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuild of '{model_version}' finished in {time.perf_counter() - started:.1f}s "
+            f"({failed} case(s) without a usable face)."
+        ))
+
+        # 4. Atomic switch-over, only after a full-gallery rebuild
+        if options['cases'] or options['no_activate']:
+            self.stdout.write(f"Active version unchanged: '{active_model_version()}'.")
+            return
+
+        # Same rule as the background task: never switch to a gallery missing a matchable case
+        # (unreadable photos, an interrupted run resumed with fewer cases, ...)
+        missing = version.missing_case_ids()
+        if missing and not options['force']:
+            complaint_ids = sorted(Case.objects.filter(pk__in=missing).values_list('complaint_id', flat=True))
+            raise CommandError(
+                f"'{model_version}' misses {len(missing)} case(s) the active version matches; not switching. "
+                f"Cases: {', '.join(complaint_ids[:50])}{' ...' if len(complaint_ids) > 50 else ''}. "
+                f"Fix their photos and rerun (the checkpoint resumes), or pass --force."
+            )
+        if missing:
+            self.stderr.write(f"--force: switching although {len(missing)} case(s) become unmatchable.")
+
+        EmbeddingModelVersion.activate(model_version)
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        self.stdout.write(self.style.SUCCESS(f"Live matching now serves '{model_version}'."))
+
+    # --- Helpers ---
+
+    def _flush(self, pending, model_version, done, checkpoint_path):
+        """Upserts one batch, then records it in the checkpoint (never the other way round)."""
+        rows = [
+            FaceEmbedding(
+                case_id=case_id,
+                model_version=model_version,
+                embedding_vector=vector,
+                source_image_path=f"Aggregated from {used} photos.",
+            )
+            for case_id, vector, used in pending if vector is not None
+        ]
+        if rows:
+            FaceEmbedding.bulk_upsert(rows)
+
+        done.update(case_id for case_id, _, _ in pending)
+        pending.clear()
+        self._save_checkpoint(checkpoint_path, model_version, done)
+
+    def _load_checkpoint(self, path, model_version):
+        if not os.path.exists(path):
+            return set()
+        with open(path) as f:
+            data = json.load(f)
+        if data.get('model_version') != model_version:
+            raise CommandError(f"Checkpoint {path} belongs to '{data.get('model_version')}', not '{model_version}'.")
+        return set(data.get('done', []))
+
+    def _save_checkpoint(self, path, model_version, done):
+        # Write-then-rename so an interrupted rebuild never leaves a half-written checkpoint
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'model_version': model_version, 'done': sorted(done)}, f)
+        os.replace(tmp_path, path)
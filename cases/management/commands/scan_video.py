@@ -0,0 +1,251 @@
+import json
+import os
+import time
+import uuid
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+
+from cases.models import Case, CasePhoto, EmbeddingModelVersion
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mkv', '.mov', '.m4v', '.ts', '.h264', '.mpg', '.mpeg', '.mjpeg')
+
+
+# --- Worker process (one InsightFace model per process) ---
+
+def _init_worker():
+    """Runs once in each pool process: set up Django and load this worker's own model."""
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Reunite.settings')
+    django.setup()
+    from cases import ai_processor  # noqa: F401 -- loads the model on import
+
+
+def _plan_segments(path, segment_seconds):
+    """
+    Splits `path` into [(start_frame, end_frame, fps), ...] of about `segment_seconds` each.
+    Containers that do not report a frame count (.ts, raw .h264, many streams) become one
+    segment read sequentially to the end (end_frame None). Returns None if the file can't be opened.
+    """
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        return None
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    if total <= 0:
+        return [(0, None, fps)]
+    seg_frames = max(1, int(segment_seconds * fps))
+    return [(start, min(start + seg_frames, total), fps) for start in range(0, total, seg_frames)]
+
+
+def _seek(cap, start_frame, fps):
+    """
+    Positions `cap` exactly on `start_frame`. Seeking by time lands on a keyframe in most
+    containers; the landed position is checked and the remaining frames are grabbed. If the
+    backend cannot tell where it landed, the file is read from the start instead.
+    Returns False if the video ends before `start_frame`.
+    """
+    if start_frame == 0:
+        return True
+    cap.set(cv2.CAP_PROP_POS_MSEC, start_frame * 1000.0 / fps)
+    landed = int(round(cap.get(cv2.CAP_PROP_POS_FRAMES)))
+    if not 0 <= landed <= start_frame:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        landed = 0
+    for _ in range(start_frame - landed):
+        if not cap.grab():
+            return False
+    return True
+
+
+def _scan_segment(path, start_frame, end_frame, stride, fps, min_gap, model_version=None):
+    """
+    Decodes frames [start_frame, end_frame) of `path` (to the end if end_frame is None), running
+    detection on every `stride`-th frame against `model_version`'s gallery.
+    Returns (frames_decoded, matches); each match carries the JPEG-encoded frame and its video timestamp.
+    Per case, at most one match is kept every `min_gap` seconds (the best one in that window).
+    """
+    from cases.ai_processor import match_faces_in_image
+
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        return 0, []
+    if not _seek(cap, start_frame, fps):
+        cap.release()
+        return 0, []
+
+    decoded = 0
+    best = {}  # (case_id, window index) -> match
+    frame_idx = start_frame
+
+    while end_frame is None or frame_idx < end_frame:
+        # grab() advances without converting the frame; only stride frames are retrieved.
+        if not cap.grab():
+            break
+        if (frame_idx - start_frame) % stride == 0:
+            ok, frame = cap.retrieve()
+            if ok:
+                decoded += 1
+                timestamp = frame_idx / fps
+                for match in match_faces_in_image(frame, camera_id=path, model_version=model_version) or []:
+                    key = (match['case_id'], int(timestamp // min_gap))
+                    if key not in best or match['similarity'] > best[key]['similarity']:
+                        ok_jpg, jpg = cv2.imencode('.jpg', frame)
+                        if ok_jpg:
+                            best[key] = dict(match, video_timestamp=timestamp, image=jpg.tobytes())
+        frame_idx += 1
+
+    cap.release()
+    return decoded, list(best.values())
+
+
+# --- Command ---
+
+class Command(BaseCommand):
+    help = 'Scan offline CCTV footage against the case gallery and log matches as detection evidence'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Video files and/or directories containing video files')
+        parser.add_argument('--stride', type=int, default=5, help='Run detection on every Nth frame (default: 5)')
+        parser.add_argument('--segment-seconds', type=int, default=300,
+                            help='Length of the time segments each file is split into (default: 300)')
+        parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                            help='Worker processes, each loads its own model (default: half the CPUs)')
+        parser.add_argument('--min-gap', type=float, default=10.0,
+                            help='Seconds between evidence photos for the same case (default: 10)')
+        parser.add_argument('--checkpoint', default='scan_video.checkpoint.json',
+                            help='Checkpoint file used to resume an interrupted scan')
+        parser.add_argument('--lat', type=float, default=None, help='Camera latitude to store on evidence')
+        parser.add_argument('--lon', type=float, default=None, help='Camera longitude to store on evidence')
+
+    def handle(self, *args, **options):
+        if options['stride'] < 1:
+            raise CommandError('--stride must be at least 1')
+
+        videos = self._collect_videos(options['paths'])
+        if not videos:
+            raise CommandError('No video files found.')
+
+        # Segment keys are path|start frame: only valid for the stride and segment length that made them
+        checkpoint_path = options['checkpoint']
+        scan_settings = {'stride': options['stride'], 'segment_seconds': options['segment_seconds']}
+        done = self._load_checkpoint(checkpoint_path, scan_settings)
+
+        # 1. Split every file into time segments
+        segments = []
+        for path in videos:
+            planned = _plan_segments(path, options['segment_seconds'])
+            if planned is None:
+                self.stderr.write(f"Skipping unreadable video: {path}")
+                continue
+            if planned[0][1] is None:
+                self.stdout.write(f"  {path}: frame count unknown, scanned sequentially in one segment")
+            for start, end, fps in planned:
+                key = f"{path}|{start}"
+                if key not in done:
+                    segments.append((key, path, start, end, fps))
+
+        # Every segment matches against the same gallery, even if the active version flips mid-run
+        model_version = (EmbeddingModelVersion.objects.filter(is_active=True).values_list('name', flat=True).first()
+                         or settings.FACE_MODEL_DEFAULT_VERSION)
+
+        self.stdout.write(f"{len(videos)} video(s), {len(segments)} segment(s) to scan "
+                          f"({len(done)} already done), {options['workers']} worker(s), model {model_version}.")
+        if not segments:
+            return
+
+        # 2. Scan segments in parallel; the parent alone writes to the database and checkpoint
+        cases = {}
+        decoded_total = 0
+        evidence_total = 0
+        started = time.perf_counter()
+
+        with ProcessPoolExecutor(max_workers=options['workers'],
+                                 mp_context=mp.get_context('spawn'),
+                                 initializer=_init_worker) as pool:
+            futures = {
+                pool.submit(_scan_segment, path, start, end, options['stride'], fps, options['min_gap'],
+                            model_version): key
+                for key, path, start, end, fps in segments
+            }
+            for future in as_completed(futures):
+                key = futures[future]
+                decoded, matches = future.result()
+
+                for match in matches:
+                    case = cases.get(match['case_id'])
+                    if case is None:
+                        case = cases[match['case_id']] = Case.objects.filter(complaint_id=match['case_id']).first()
+                    if case is None:
+                        continue
+                    self._save_evidence(case, match, key.rsplit('|', 1)[0], options['lat'], options['lon'])
+                    evidence_total += 1
+
+                decoded_total += decoded
+                done[key] = len(matches)
+                self._save_checkpoint(checkpoint_path, done, scan_settings)
+
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f"  {key}: {decoded} frames, {len(matches)} match(es) "
+                                  f"| {decoded_total / elapsed:.1f} fps overall")
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Scan complete: {decoded_total} frames in {elapsed:.1f}s "
+            f"({decoded_total / elapsed:.1f} fps), {evidence_total} evidence photo(s) saved."
+        ))
+
+    # --- Helpers ---
+
+    def _collect_videos(self, paths):
+        videos = []
+        for path in paths:
+            path = os.path.abspath(path)
+            if os.path.isdir(path):
+                for root, _, files in os.walk(path):
+                    videos.extend(os.path.join(root, f) for f in sorted(files)
+                                  if f.lower().endswith(VIDEO_EXTENSIONS))
+            elif os.path.isfile(path):
+                videos.append(path)
+            else:
+                self.stderr.write(f"Path not found: {path}")
+        return videos
+
+    def _load_checkpoint(self, path, scan_settings):
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            checkpoint = json.load(f)
+        # Resuming with another stride or segment length would skip frames that were never scanned
+        saved = {name: checkpoint.get(name) for name in scan_settings}
+        if saved != scan_settings:
+            raise CommandError(
+                f"Checkpoint {path} was written with {saved}, not {scan_settings}. "
+                f"Resume with the same options, or pass a new --checkpoint to start over."
+            )
+        return checkpoint.get('segments_done', {})
+
+    def _save_checkpoint(self, path, done, scan_settings):
+        # Write-then-rename so an interrupted scan never leaves a half-written checkpoint
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(dict(scan_settings, segments_done=done), f)
+        os.replace(tmp_path, path)
+
+    def _save_evidence(self, case, match, video_path, lat, lon):
+        file_name = f"{case.complaint_id}_Video_{uuid.uuid4().hex[:6]}.jpg"
+        CasePhoto.objects.create(
+            case=case,
+            image=ContentFile(match['image'], name=file_name),
+            is_detection_evidence=True,
+            latitude=lat,
+            longitude=lon,
+            source_video=os.path.basename(video_path)[:255],
+            video_timestamp=match['video_timestamp'],
+        )
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from cases.status_cache import stats
+
+
+class Command(BaseCommand):
+    help = 'Report the hit ratio of the public status lookup cache (cases/status_cache.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true',
+                            help='Zero the counters after reporting, to measure the next interval')
+
+    def handle(self, *args, **options):
+        counts = stats(reset=options['reset'])
+        self.stdout.write(
+            f"Status lookups: {counts['lookups']} "
+            f"(hits {counts['hits']}, unknown-ID hits {counts['negative_hits']}, misses {counts['misses']})"
+        )
+        self.stdout.write(self.style.SUCCESS(f"Hit ratio: {counts['hit_ratio']:.1%}"))
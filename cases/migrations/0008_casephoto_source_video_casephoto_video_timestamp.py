@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-19 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cases', '0007_detectionalert'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='casephoto',
+            name='source_video',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='casephoto',
+            name='video_timestamp',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
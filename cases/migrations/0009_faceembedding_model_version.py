@@ -0,0 +1,42 @@
+# Generated by Django 5.2.8 on 2026-10-19 14:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cases', '0008_casephoto_source_video_casephoto_video_timestamp'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmbeddingModelVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('is_active', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('activated_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='faceembedding',
+            name='model_version',
+            field=models.CharField(db_index=True, default='buffalo_l-det640', max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='faceembedding',
+            name='case',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='face_embeddings', to='cases.case'),
+        ),
+        migrations.AddConstraint(
+            model_name='faceembedding',
+            constraint=models.UniqueConstraint(fields=('case', 'model_version'), name='unique_embedding_per_model_version'),
+        ),
+        migrations.AddConstraint(
+            model_name='embeddingmodelversion',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_active', True)), fields=('is_active',), name='single_active_model_version'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-19 14:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cases', '0009_faceembedding_model_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageEmbeddingCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64)),
+                ('model_version', models.CharField(max_length=50)),
+                ('embedding_vector', models.JSONField(blank=True, null=True)),
+                ('bbox', models.JSONField(blank=True, null=True)),
+                ('quality_score', models.FloatField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('content_hash', 'model_version'), name='unique_image_embedding_cache_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-19 14:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cases', '0010_imageembeddingcache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='embeddingmodelversion',
+            name='is_building',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='faceembedding',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-19 14:41
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cases', '0011_blue_green_embedding_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detectionalert',
+            name='is_retroactive',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='Sighting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_version', models.CharField(max_length=50)),
+                ('embedding', models.BinaryField()),
+                ('det_score', models.FloatField()),
+                ('camera_id', models.CharField(blank=True, max_length=100, null=True)),
+                ('latitude', models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True)),
+                ('longitude', models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True)),
+                ('face_image', models.ImageField(blank=True, null=True, upload_to='sightings/%Y/%m/%d/')),
+                ('seen_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('seen_on', models.DateField()),
+                ('matched_case', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sightings', to='cases.case')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['model_version', 'seen_on'], name='sighting_partition_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-19 14:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cases', '0012_sightings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DuplicateCaseCandidate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('similarity', models.FloatField()),
+                ('model_version', models.CharField(max_length=50)),
+                ('detected_at', models.DateTimeField(auto_now=True)),
+                ('case', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='duplicate_candidates', to='cases.case')),
+                ('duplicate_of', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='cases.case')),
+            ],
+            options={
+                'ordering': ['-similarity'],
+                'constraints': [models.UniqueConstraint(fields=('case', 'duplicate_of'), name='unique_duplicate_case_pair')],
+            },
+        ),
+    ]
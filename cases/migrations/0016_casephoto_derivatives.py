@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cases', '0015_outboxmessage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='casephoto',
+            name='derivatives',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cases', '0016_casephoto_derivatives'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='case',
+            index=models.Index(fields=['police_officer', 'status', 'created_at'], name='case_officer_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='case',
+            index=models.Index(fields=['status', 'last_seen_date'], name='case_status_last_seen_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='casephoto',
+            index=models.Index(condition=models.Q(('is_detection_evidence', True)), fields=['case', 'uploaded_at'], name='photo_evidence_uploaded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='casephoto',
+            index=models.Index(condition=models.Q(('is_detection_evidence', False)), fields=['case', 'uploaded_at'], name='photo_enrollment_uploaded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='detectionalert',
+            index=models.Index(condition=models.Q(('is_deleted_by_officer', False)), fields=['case', 'alert_sent_at'], name='alert_visible_sent_idx'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Full-text index over the free-text Case fields (cases/search.py). SQLite only: other
+# backends keep the icontains fallback.
+
+from django.db import migrations
+
+COLUMNS = 'missing_name, guardian_name, clothing_description, special_marks, last_seen_location'
+NEW = ', '.join(f'new.{c.strip()}' for c in COLUMNS.split(','))
+OLD = ', '.join(f'old.{c.strip()}' for c in COLUMNS.split(','))
+
+CREATE = [
+    f"""CREATE VIRTUAL TABLE cases_case_fts USING fts5(
+        {COLUMNS},
+        content='cases_case', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER cases_case_fts_insert AFTER INSERT ON cases_case BEGIN
+        INSERT INTO cases_case_fts(rowid, {COLUMNS}) VALUES (new.id, {NEW});
+    END""",
+    f"""CREATE TRIGGER cases_case_fts_delete AFTER DELETE ON cases_case BEGIN
+        INSERT INTO cases_case_fts(cases_case_fts, rowid, {COLUMNS}) VALUES ('delete', old.id, {OLD});
+    END""",
+    f"""CREATE TRIGGER cases_case_fts_update AFTER UPDATE OF {COLUMNS} ON cases_case BEGIN
+        INSERT INTO cases_case_fts(cases_case_fts, rowid, {COLUMNS}) VALUES ('delete', old.id, {OLD});
+        INSERT INTO cases_case_fts(rowid, {COLUMNS}) VALUES (new.id, {NEW});
+    END""",
+    "INSERT INTO cases_case_fts(cases_case_fts) VALUES ('rebuild')",
+]
+
+DROP = [
+    "DROP TRIGGER IF EXISTS cases_case_fts_update",
+    "DROP TRIGGER IF EXISTS cases_case_fts_delete",
+    "DROP TRIGGER IF EXISTS cases_case_fts_insert",
+    "DROP TABLE IF EXISTS cases_case_fts",
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cases', '0017_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(_run(CREATE), _run(DROP)),
+    ]
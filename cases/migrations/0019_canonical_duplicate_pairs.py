@@ -0,0 +1,33 @@
+# Duplicate pairs are stored once, lower case pk first (cases/duplicates.py canonical_pair).
+
+from django.db import migrations, models
+
+
+def canonicalize_pairs(apps, schema_editor):
+    """Rewrite pairs stored high pk first; drop the row when the low-first twin already exists."""
+    DuplicateCaseCandidate = apps.get_model('cases', 'DuplicateCaseCandidate')
+    for pair in DuplicateCaseCandidate.objects.filter(case__gt=models.F('duplicate_of')):
+        twin = DuplicateCaseCandidate.objects.filter(case_id=pair.duplicate_of_id, duplicate_of_id=pair.case_id).first()
+        if twin is None:
+            pair.case_id, pair.duplicate_of_id = pair.duplicate_of_id, pair.case_id
+            pair.save(update_fields=['case', 'duplicate_of'])
+            continue
+        if pair.similarity > twin.similarity:
+            twin.similarity, twin.model_version = pair.similarity, pair.model_version
+            twin.save(update_fields=['similarity', 'model_version'])
+        pair.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cases', '0018_case_fulltext_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(canonicalize_pairs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='duplicatecasecandidate',
+            constraint=models.CheckConstraint(condition=models.Q(('case__lt', models.F('duplicate_of'))), name='duplicate_case_pair_low_pk_first'),
+        ),
+    ]
@@ -120,6 +120,15 @@ class Case(models.Model):
         # Normal save for existing objects
         super().save(*args, **kwargs)
 
+    class Meta:
+        # Chosen from EXPLAIN QUERY PLAN of the hot lists (guarded by cases.tests.QueryPlanTests)
+        indexes = [
+            # Officer dashboard: cases_api filtered by status, newest first
+            models.Index(fields=['police_officer', 'status', 'created_at'], name='case_officer_status_idx'),
+            # Public list: active statuses by last_seen_date (a full table scan before)
+            models.Index(fields=['status', 'last_seen_date'], name='case_status_last_seen_idx'),
+        ]
+
     def __str__(self):
         return f"{self.complaint_id} - {self.missing_name} ({self.status})"
     
@@ -145,9 +154,26 @@ class CasePhoto(models.Model):
     is_detection_evidence = models.BooleanField(default=False) 
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+
+    # Set when the evidence frame came from offline footage (scan_video) rather than a live camera
+    source_video = models.CharField(max_length=255, blank=True, null=True)
+    video_timestamp = models.FloatField(null=True, blank=True)  # seconds from the start of source_video
+
+    # Resized WebP/JPEG copies, {"webp": [[width, name], ...], "jpeg": [...]} (cases/thumbnails.py)
+    derivatives = models.JSONField(default=dict, blank=True)
     class Meta:
         # Orders photos newest first (descending)
         ordering = ['-uploaded_at']
+        # Enrollment photos / evidence frames of a case in upload order, without a sort step.
+        # Partial rather than (case, is_detection_evidence, uploaded_at): Django writes boolean
+        # filters as a bare column ("WHERE is_detection_evidence" / "NOT ..."), which SQLite
+        # cannot seek on, but it does match them against a partial index's WHERE clause.
+        indexes = [
+            models.Index(fields=['case', 'uploaded_at'], condition=models.Q(is_detection_evidence=True),
+                         name='photo_evidence_uploaded_idx'),
+            models.Index(fields=['case', 'uploaded_at'], condition=models.Q(is_detection_evidence=False),
+                         name='photo_enrollment_uploaded_idx'),
+        ]
     def __str__(self):
         # Updated string representation for clarity in the Admin
         return f"Photo for {self.case.complaint_id} (Detection: {self.is_detection_evidence})"
@@ -161,10 +187,14 @@ from django.db.models.fields.json import JSONField # Use this for PostgreSQL/mod
 # If using older Django/SQLite, you might need a TextField and custom serialization
 
 class FaceEmbedding(models.Model):
-    """Stores the unique vector (embedding) of a missing person's face."""
+    """Stores the vector (embedding) of a missing person's face, one per case and model version."""
     
     # Links directly to the Case model you provided previously
-    case = models.OneToOneField('Case', on_delete=models.CASCADE, related_name='face_embedding')
+    case = models.ForeignKey('Case', on_delete=models.CASCADE, related_name='face_embeddings')
+
+    # Which model pack + detector settings produced this vector (see FACE_MODEL_VERSIONS).
+    # Vectors of different versions are never compared with each other.
+    model_version = models.CharField(max_length=50, default='buffalo_l-det640', db_index=True)
     
     # Store the vector as a JSON array (list of floats). 
     # ArcFace typically uses 128D or 512D.
@@ -175,9 +205,97 @@ class FaceEmbedding(models.Model):
     source_image_path = models.CharField(max_length=255, blank=True, null=True)
     
     created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped on every write; in-memory galleries compare it to decide when to reload
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['case', 'model_version'], name='unique_embedding_per_model_version'),
+        ]
+
+    @classmethod
+    def bulk_upsert(cls, embeddings):
+        """Inserts or replaces many (case, model_version) vectors in one query."""
+        return cls.objects.bulk_create(
+            embeddings,
+            update_conflicts=True,
+            unique_fields=['case', 'model_version'],
+            update_fields=['embedding_vector', 'source_image_path', 'updated_at'],
+        )
     
     def __str__(self):
-        return f"Embedding for Case: {self.case.complaint_id}"
+        return f"Embedding for Case: {self.case.complaint_id} ({self.model_version})"
+
+
+class EmbeddingModelVersion(models.Model):
+    """Registry of embedding model versions; live matching serves the single active one."""
+
+    name = models.CharField(max_length=50, unique=True)
+    is_active = models.BooleanField(default=False)
+    # Being filled in the background; new enrollments are written to it as well (dual-write)
+    is_building = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    activated_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['is_active'], condition=models.Q(is_active=True),
+                                    name='single_active_model_version'),
+        ]
+
+    @classmethod
+    def activate(cls, name):
+        """Atomically makes `name` the version served by live matching."""
+        from django.db import transaction
+
+        with transaction.atomic():
+            version, _ = cls.objects.select_for_update().get_or_create(name=name)
+            cls.objects.filter(is_active=True).exclude(pk=version.pk).update(is_active=False)
+            version.is_active = True
+            version.is_building = False
+            version.activated_at = timezone.now()
+            version.save(update_fields=['is_active', 'is_building', 'activated_at'])
+        return version
+
+    def missing_case_ids(self):
+        """
+        Cases the active version can match but this version can't yet. Cutting over is safe
+        (no case becomes unmatchable) only once this is empty.
+        """
+        active = EmbeddingModelVersion.objects.filter(is_active=True).exclude(pk=self.pk).first()
+        if active is None:
+            return set()
+        required = set(FaceEmbedding.objects.filter(model_version=active.name).values_list('case_id', flat=True))
+        covered = set(FaceEmbedding.objects.filter(model_version=self.name).values_list('case_id', flat=True))
+        return required - covered
+
+    def __str__(self):
+        return f"{self.name}{' (active)' if self.is_active else ''}"
+
+
+class ImageEmbeddingCache(models.Model):
+    """
+    Per-image inference results keyed by SHA-256 of the file bytes + model version, so
+    re-processing an unchanged photo skips detection and recognition entirely.
+    embedding_vector is NULL when no face was found (that result is cached too).
+    """
+
+    content_hash = models.CharField(max_length=64)
+    model_version = models.CharField(max_length=50)
+
+    embedding_vector = JSONField(null=True, blank=True)
+    bbox = JSONField(null=True, blank=True)           # normalized [x, y, w, h] of the embedded face
+    quality_score = models.FloatField(null=True, blank=True)  # detector confidence of that face
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['content_hash', 'model_version'], name='unique_image_embedding_cache_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.content_hash[:12]}… ({self.model_version})"
     
 class DetectionAlert(models.Model):
     """Logs every instance an email/alert was sent for a case, allowing deletion and throttling."""
@@ -192,6 +310,131 @@ class DetectionAlert(models.Model):
     
     # We will use this field to check if the notification has been viewed in the modal:
     is_reviewed = models.BooleanField(default=False) 
+
+    # Raised when a newly registered case matched an earlier, stored sighting
+    is_retroactive = models.BooleanField(default=False)
+
+    class Meta:
+        # A case's visible alerts by time, without a sort step (partial: see CasePhoto.Meta)
+        indexes = [
+            models.Index(fields=['case', 'alert_sent_at'], condition=models.Q(is_deleted_by_officer=False),
+                         name='alert_visible_sent_idx'),
+        ]
     
     def __str__(self):
         return f"Alert for Case {self.case.complaint_id} at {self.alert_sent_at.strftime('%H:%M')}"
+
+
+class Sighting(models.Model):
+    """
+    A good-quality face a live camera saw that matched no case at the time. Kept for
+    SIGHTING_RETENTION_DAYS so cases registered later can be matched retroactively.
+    Rows are partitioned by day (seen_on): searches scan one day at a time and expiry
+    drops whole days.
+    """
+
+    model_version = models.CharField(max_length=50)
+    # L2-normalized float32 vector as raw bytes (np.frombuffer), much cheaper to load in bulk than JSON
+    embedding = models.BinaryField()
+    det_score = models.FloatField()
+
+    camera_id = models.CharField(max_length=100, blank=True, null=True)
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    face_image = models.ImageField(upload_to='sightings/%Y/%m/%d/', blank=True, null=True)
+
+    seen_at = models.DateTimeField(default=timezone.now)
+    seen_on = models.DateField()
+
+    # Set once a case matched this sighting, so re-runs don't alert twice
+    matched_case = models.ForeignKey('Case', on_delete=models.SET_NULL, null=True, blank=True,
+                                     related_name='sightings')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['model_version', 'seen_on'], name='sighting_partition_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.seen_on is None:
+            self.seen_on = timezone.localdate(self.seen_at)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"Sighting on {self.camera_id or 'unknown camera'} at {self.seen_at:%Y-%m-%d %H:%M}"
+
+
+class DuplicateCaseCandidate(models.Model):
+    """
+    Two cases whose enrollment faces are similar enough that they may be the same person.
+    Stored once per pair, lower pk in `case` (see duplicates.canonical_pair).
+    """
+
+    case = models.ForeignKey('Case', on_delete=models.CASCADE, related_name='duplicate_candidates')
+    duplicate_of = models.ForeignKey('Case', on_delete=models.CASCADE, related_name='+')
+    similarity = models.FloatField()
+    model_version = models.CharField(max_length=50)
+    detected_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-similarity']
+        constraints = [
+            models.UniqueConstraint(fields=['case', 'duplicate_of'], name='unique_duplicate_case_pair'),
+            models.CheckConstraint(condition=models.Q(case__lt=models.F('duplicate_of')),
+                                   name='duplicate_case_pair_low_pk_first'),
+        ]
+
+    def __str__(self):
+        return f"{self.case.complaint_id} ~ {self.duplicate_of.complaint_id} ({self.similarity:.2f})"
+
+
+class AlertDigest(models.Model):
+    """
+    Detections of one case collected over a short window and emailed together when the
+    window closes (flush_at), instead of one full alert email per detection.
+    items: [{"photo_pk", "similarity", "latitude", "longitude", "seen_at"}, ...]
+    """
+
+    case = models.ForeignKey('Case', on_delete=models.CASCADE, related_name='alert_digests')
+    items = JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+    flush_at = models.DateTimeField()
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # At most one open (unsent) digest per case
+            models.UniqueConstraint(fields=['case'], condition=models.Q(sent_at__isnull=True),
+                                    name='single_open_alert_digest'),
+        ]
+
+    def __str__(self):
+        return f"Digest for {self.case.complaint_id}: {len(self.items)} detection(s)"
+
+
+class OutboxMessage(models.Model):
+    """
+    A notification to deliver, written in the same transaction as the row it is about
+    (Case, DetectionAlert, AlertDigest) and drained by the outbox dispatcher (cases/outbox.py).
+    payload holds the handler arguments only; the email itself is built at delivery time.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        SENT = 'sent', 'Sent'
+        FAILED = 'failed', 'Failed'  # gave up; kept for inspection in the admin
+
+    kind = models.CharField(max_length=40)
+    payload = JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status}, {self.attempts} attempt(s))"
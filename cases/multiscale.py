@@ -0,0 +1,157 @@
+# cases/multiscale.py
+
+import cv2
+import numpy as np
+from insightface.app.common import Face
+
+# --- Adaptive Multi-Scale Face Detection ---
+#
+# The detector is prepared with det_size=(640, 640), so a 4K frame is shrunk ~6x
+# before detection and far-field faces disappear. Instead of detecting on the
+# whole frame at full resolution, we:
+#   1. run one coarse pass on the full frame (downscaled to det_size as usual),
+#   2. cut native-resolution tiles only out of regions of interest (configured
+#      per camera, or found by frame differencing) and detect on each tile,
+#   3. merge coarse + tile detections with NMS, then run landmark/recognition
+#      models once per surviving face on the full-resolution frame.
+
+
+def nms(boxes, scores, iou_threshold=0.4, containment_threshold=0.7):
+    """
+    Greedy non-maximum suppression over (N, 4) [x1, y1, x2, y2] boxes. Returns kept indices.
+    When most of one box lies inside another, the larger box wins regardless of score; this
+    removes the half-faces detected where a tile edge cuts through a face.
+    """
+    if len(boxes) == 0:
+        return []
+
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = np.maximum(0, x2 - x1) * np.maximum(0, y2 - y1)
+    order = scores.argsort()[::-1]
+
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        rest = order[1:]
+
+        inter_w = np.maximum(0, np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]))
+        inter_h = np.maximum(0, np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]))
+        inter = inter_w * inter_h
+
+        # The best-scoring box may itself be the partial face: if it lies inside a larger
+        # candidate, drop it and let the larger box compete on its own.
+        inside_larger = (inter / max(areas[i], 1e-6) > containment_threshold) & (areas[rest] > areas[i])
+        if inside_larger.any():
+            order = rest
+            continue
+
+        keep.append(int(i))
+        iou = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-6)
+        containment = inter / np.maximum(np.minimum(areas[i], areas[rest]), 1e-6)
+
+        order = rest[(iou <= iou_threshold) & (containment <= containment_threshold)]
+    return keep
+
+
+def tiles_for_rois(rois, frame_w, frame_h, tile_size=640, overlap=0.25, max_tiles=8):
+    """
+    Splits pixel ROIs (x, y, w, h) into overlapping tiles of at most tile_size x tile_size,
+    clipped to the frame. ROIs are handled largest first and the total is capped at max_tiles.
+    """
+    step = max(1, int(tile_size * (1 - overlap)))
+    tiles = []
+
+    for x, y, w, h in sorted(rois, key=lambda r: r[2] * r[3], reverse=True):
+        x0, y0 = max(0, int(x)), max(0, int(y))
+        x1, y1 = min(frame_w, int(x + w)), min(frame_h, int(y + h))
+        if x1 <= x0 or y1 <= y0:
+            continue
+
+        for ty in range(y0, max(y0 + 1, y1 - tile_size + step), step):
+            for tx in range(x0, max(x0 + 1, x1 - tile_size + step), step):
+                tw, th = min(tile_size, x1 - tx), min(tile_size, y1 - ty)
+                tiles.append((tx, ty, tw, th))
+                if len(tiles) >= max_tiles:
+                    return tiles
+    return tiles
+
+
+class MotionRoiFinder:
+    """Finds moving regions by differencing consecutive frames of one camera on a small grayscale copy."""
+
+    def __init__(self, work_width=320, diff_threshold=25, min_area_fraction=0.0005, padding=0.5):
+        self.work_width = work_width
+        self.diff_threshold = diff_threshold
+        self.min_area_fraction = min_area_fraction
+        self.padding = padding
+        self._previous = None
+
+    def find(self, img):
+        h, w = img.shape[:2]
+        scale = self.work_width / w
+        small = cv2.resize(img, (self.work_width, max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+
+        previous, self._previous = self._previous, gray
+        if previous is None or previous.shape != gray.shape:
+            return []
+
+        _, mask = cv2.threshold(cv2.absdiff(previous, gray), self.diff_threshold, 255, cv2.THRESH_BINARY)
+        mask = cv2.dilate(mask, None, iterations=2)
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        min_area = self.min_area_fraction * gray.shape[0] * gray.shape[1]
+        rois = []
+        for contour in contours:
+            x, y, cw, ch = cv2.boundingRect(contour)
+            if cw * ch < min_area:
+                continue
+            # Pad the region (moving bodies: the face sits at the top edge) and map back to full resolution
+            pad_w, pad_h = cw * self.padding, ch * self.padding
+            rois.append(((x - pad_w) / scale, (y - pad_h) / scale,
+                         (cw + 2 * pad_w) / scale, (ch + 2 * pad_h) / scale))
+        return rois
+
+
+def detect_faces_multiscale(app, img, rois, tile_size=640, overlap=0.25, max_tiles=8, iou_threshold=0.4):
+    """
+    Coarse full-frame pass plus native-resolution passes over `rois`, merged with NMS.
+    Returns InsightFace Face objects (bbox, kps, det_score, embedding, ...) in full-frame coordinates,
+    like FaceAnalysis.get().
+    """
+    det_model = app.det_model
+    h, w = img.shape[:2]
+
+    bboxes, kpss = det_model.detect(img, max_num=0, metric='default')
+    all_boxes, all_kps = [bboxes], [kpss]
+
+    for tx, ty, tw, th in tiles_for_rois(rois, w, h, tile_size, overlap, max_tiles):
+        tile_boxes, tile_kps = det_model.detect(img[ty:ty + th, tx:tx + tw], max_num=0, metric='default')
+        if tile_boxes.shape[0] == 0:
+            continue
+        tile_boxes = tile_boxes.copy()
+        tile_boxes[:, [0, 2]] += tx
+        tile_boxes[:, [1, 3]] += ty
+        if tile_kps is not None:
+            tile_kps = tile_kps.copy()
+            tile_kps[:, :, 0] += tx
+            tile_kps[:, :, 1] += ty
+        all_boxes.append(tile_boxes)
+        all_kps.append(tile_kps)
+
+    boxes = np.concatenate(all_boxes, axis=0)
+    if boxes.shape[0] == 0:
+        return []
+    has_kps = all(k is not None for k in all_kps)
+    kps = np.concatenate(all_kps, axis=0) if has_kps else None
+
+    faces = []
+    for i in nms(boxes[:, :4], boxes[:, 4], iou_threshold):
+        face = Face(bbox=boxes[i, :4], kps=kps[i] if kps is not None else None, det_score=boxes[i, 4])
+        # Landmarks/recognition run once per merged face, on the full-resolution frame
+        for taskname, model in app.models.items():
+            if taskname == 'detection':
+                continue
+            model.get(img, face)
+        faces.append(face)
+    return faces
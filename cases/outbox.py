@@ -0,0 +1,219 @@
+# cases/outbox.py
+
+import random
+import time
+from datetime import timedelta
+
+import redis
+
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.utils import timezone
+
+from .mailer import get_mailer
+from .models import OutboxMessage
+from .shared_state import get_redis
+
+# --- Transactional Notification Outbox ---
+#
+# Notifications used to be sent from the request (case confirmation) or from a Celery task
+# that printed and dropped any exception (detection alerts). Now the request only writes an
+# OutboxMessage in the same transaction as the Case / DetectionAlert, so a notification
+# exists exactly when its row does. The dispatcher (cases.tasks.dispatch_outbox, kicked on
+# commit and by celery beat) drains due messages:
+#   * a failed delivery is retried with exponential backoff (plus jitter) and marked
+#     FAILED after OUTBOX_MAX_ATTEMPTS,
+#   * every recipient has a token bucket (OUTBOX_RECIPIENT_BURST messages, refilled at
+#     OUTBOX_RECIPIENT_RATE_PER_HOUR); a message for a recipient without tokens is deferred,
+#     not failed. The buckets live in Redis (shared_state.py) and are checked and drawn by one
+#     Lua script, so the limit holds across all dispatcher processes. If Redis is down the
+#     message is sent unthrottled rather than held back,
+#   * messages are built and rate-checked MAIL_BATCH_SIZE at a time, then the batch is sent
+#     over the pooled SMTP session (PooledMailer.send_many) and each row marked by its result.
+# Rows are claimed with a conditional UPDATE (lease), so concurrent dispatchers never
+# deliver the same message twice. A message of a kind without a handler is marked FAILED.
+
+MAX_ATTEMPTS = getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 8)
+BACKOFF_BASE_SECONDS = getattr(settings, 'OUTBOX_BACKOFF_BASE_SECONDS', 30)
+BACKOFF_MAX_SECONDS = getattr(settings, 'OUTBOX_BACKOFF_MAX_SECONDS', 60 * 60)
+RECIPIENT_BURST = getattr(settings, 'OUTBOX_RECIPIENT_BURST', 10)
+RECIPIENT_RATE_PER_HOUR = getattr(settings, 'OUTBOX_RECIPIENT_RATE_PER_HOUR', 60)
+MAIL_BATCH_SIZE = getattr(settings, 'MAIL_BATCH_SIZE', 50)
+LEASE_SECONDS = 5 * 60  # a claimed message is retried if its dispatcher died mid-delivery
+
+
+def enqueue(kind, payload):
+    """
+    Writes a notification for delivery. Call it inside the transaction that writes the row
+    the notification is about; the dispatcher is kicked once that transaction commits.
+    """
+    message = OutboxMessage.objects.create(kind=kind, payload=payload)
+    transaction.on_commit(_kick_dispatcher)
+    return message
+
+
+def _kick_dispatcher():
+    from .tasks import dispatch_outbox
+
+    try:
+        dispatch_outbox.delay()
+    except Exception as e:
+        # The broker being down must not fail the request; celery beat drains the outbox too
+        print(f"Outbox: Could not queue the dispatcher ({e}); the periodic run will deliver.")
+
+
+def backoff_seconds(attempts):
+    """Delay before retry number `attempts` (1-based): base * 2^(n-1), capped, +/-20% jitter."""
+    delay = min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+_TAKE = """
+local now, capacity, rate = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+
+local levels, wait = {}, 0
+for i, key in ipairs(KEYS) do
+    local state = redis.call('HMGET', key, 'tokens', 'updated')
+    local tokens, updated = tonumber(state[1]) or capacity, tonumber(state[2]) or now
+    levels[i] = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+    if levels[i] < 1 then
+        wait = math.max(wait, (1 - levels[i]) / rate)
+    end
+end
+if wait > 0 then
+    return tostring(wait)
+end
+
+-- An untouched bucket is full again after capacity / rate seconds, so it can expire then
+for i, key in ipairs(KEYS) do
+    redis.call('HSET', key, 'tokens', tostring(levels[i] - 1), 'updated', tostring(now))
+    redis.call('EXPIRE', key, math.ceil(capacity / rate))
+end
+return '0'
+"""
+_take_script = None
+
+
+class TokenBucket:
+    """Per-recipient token buckets, kept in Redis so all dispatchers share them."""
+
+    def __init__(self, capacity=RECIPIENT_BURST, rate_per_hour=RECIPIENT_RATE_PER_HOUR):
+        self.capacity = capacity
+        self.rate = rate_per_hour / 3600.0  # tokens per second
+
+    def _key(self, recipient):
+        return f"outbox:bucket:{recipient.lower()}"
+
+    def take(self, recipients, now=None):
+        """
+        Takes one token from every recipient's bucket and returns 0, or, if any bucket is
+        empty, takes nothing and returns the seconds until all of them have a token again.
+        """
+        global _take_script
+        if _take_script is None:
+            _take_script = get_redis().register_script(_TAKE)
+
+        now = time.time() if now is None else now
+        keys = sorted({self._key(r) for r in recipients})
+        return float(_take_script(keys=keys, args=[now, self.capacity, self.rate]))
+
+
+def _claim(message, now):
+    return OutboxMessage.objects.filter(
+        pk=message.pk, status=OutboxMessage.Status.PENDING, next_attempt_at=message.next_attempt_at,
+    ).update(next_attempt_at=now + timedelta(seconds=LEASE_SECONDS))
+
+
+def dispatch_due(handlers, limit=100, bucket=None):
+    """
+    Delivers up to `limit` due messages. `handlers` maps kind -> fn(payload) returning the
+    EmailMessage to send, or None when the handler has nothing to send (its database work then
+    commits together with the message being marked SENT).
+    Returns {"sent", "retried", "deferred", "failed"} counts.
+    """
+    bucket = bucket or TokenBucket()
+    counts = {'sent': 0, 'retried': 0, 'deferred': 0, 'failed': 0}
+    now = timezone.now()
+    due = list(OutboxMessage.objects
+               .filter(status=OutboxMessage.Status.PENDING, next_attempt_at__lte=now)
+               .order_by('next_attempt_at', 'pk')[:limit])
+
+    for start in range(0, len(due), MAIL_BATCH_SIZE):
+        ready = []  # (message, email) claimed, built and within the rate limit
+        for message in due[start:start + MAIL_BATCH_SIZE]:
+            if not _claim(message, timezone.now()):
+                continue  # Another dispatcher has it
+            handler = handlers.get(message.kind)
+            if handler is None:
+                counts[_mark_failed(message, LookupError(f"No handler for kind '{message.kind}'."), permanent=True)] += 1
+                continue
+            outcome = _prepare(message, handler, bucket)
+            if isinstance(outcome, str):
+                counts[outcome] += 1
+            else:
+                ready.append((message, outcome))
+
+        # The whole batch goes over one SMTP session; each row is marked by its own result
+        results = get_mailer().send_many([email for _, email in ready]) if ready else []
+        for (message, email), error in zip(ready, results):
+            if error is not None:
+                counts[_mark_failed(message, error)] += 1
+                continue
+            _mark_sent(message)
+            print(f"Outbox: Delivered {message.kind} #{message.pk}. TO: {email.to}, CC: {email.cc}")
+            counts['sent'] += 1
+
+    return counts
+
+
+def _prepare(message, handler, bucket):
+    """The EmailMessage to send for a claimed message, or the outcome name if there is nothing to send now."""
+    try:
+        with transaction.atomic():
+            email = handler(message.payload)
+            if email is None:
+                _mark_sent(message)
+                return 'sent'
+    except ObjectDoesNotExist as e:
+        # The case / photo / digest is gone: retrying cannot help
+        return _mark_failed(message, e, permanent=True)
+    except Exception as e:
+        return _mark_failed(message, e)
+
+    recipients = [r for r in email.to + email.cc + email.bcc if r]
+    if not recipients:
+        return _mark_failed(message, ValueError("Message has no recipients."), permanent=True)
+
+    try:
+        wait = bucket.take(recipients)
+    except redis.RedisError as e:
+        # The rate limit only protects inboxes from floods; alerts must not wait for Redis
+        print(f"Outbox: Rate limiter unavailable ({e}); sending {message} unthrottled.")
+        wait = 0
+    if wait:
+        OutboxMessage.objects.filter(pk=message.pk).update(
+            next_attempt_at=timezone.now() + timedelta(seconds=wait))
+        print(f"Outbox: {message} deferred {wait:.0f}s (recipient rate limit).")
+        return 'deferred'
+    return email
+
+
+def _mark_sent(message):
+    OutboxMessage.objects.filter(pk=message.pk).update(
+        status=OutboxMessage.Status.SENT, sent_at=timezone.now(), attempts=message.attempts + 1)
+
+
+def _mark_failed(message, error, permanent=False):
+    attempts = message.attempts + 1
+    if permanent or attempts >= MAX_ATTEMPTS:
+        OutboxMessage.objects.filter(pk=message.pk).update(
+            status=OutboxMessage.Status.FAILED, attempts=attempts, last_error=repr(error))
+        print(f"Outbox: Giving up on {message.kind} #{message.pk} after {attempts} attempt(s): {error}")
+        return 'failed'
+
+    delay = backoff_seconds(attempts)
+    OutboxMessage.objects.filter(pk=message.pk).update(
+        attempts=attempts, last_error=repr(error), next_attempt_at=timezone.now() + timedelta(seconds=delay))
+    print(f"Outbox: {message.kind} #{message.pk} failed ({error}); retry {attempts} in {delay:.0f}s.")
+    return 'retried'
@@ -0,0 +1,133 @@
+# cases/public_list.py
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import Count, Max, Prefetch, Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import Case, CasePhoto
+from .thumbnails import image_sources
+
+# --- Public Missing-Persons List Cache ---
+#
+# The public list is the busiest anonymous page and changes rarely, so each page is built
+# once: the rendered card grid (HTML fragment) and the same cases as plain data for the
+# JSON feed are cached together under the current list *version*. Any Case save/delete, or
+# an enrollment photo being added, removed or given thumbnails, bumps the version, which
+# orphans every cached page at once (they expire on their own). The cache is the shared
+# Redis cache (settings.CACHES), so a bump from any process (an admin save, the Celery
+# worker writing thumbnails) is seen by every web worker on its next request.
+#
+# The list state (time of the last change and the number of listed cases) is cached the same
+# way and gives the ETag / Last-Modified of both variants. Both also move on a photo or
+# thumbnail change, which leaves Case.updated_at untouched: the ETag carries the version and
+# the change time is recorded by invalidate(). A repeat visit costs no query at all and
+# browsers or a front proxy get 304s until something changes.
+
+ACTIVE_STATUSES = ('pending', 'verified')
+PAGE_SIZE = getattr(settings, 'PUBLIC_LIST_PAGE_SIZE', 24)
+CACHE_SECONDS = getattr(settings, 'PUBLIC_LIST_CACHE_SECONDS', 60 * 60)
+VERSION_KEY = 'public_list:version'
+CHANGED_KEY = 'public_list:changed'
+
+
+def _version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Seeded from the clock, not 1: after a cache flush an old ETag must not come back
+        cache.add(VERSION_KEY, int(time.time()), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def invalidate(*args, **kwargs):
+    """Signal receiver (and plain helper): the next request rebuilds the pages and the state."""
+    cache.set(CHANGED_KEY, timezone.now(), timeout=None)
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, int(time.time()), timeout=None)  # no version yet: nothing cached to orphan
+
+
+def enrollment_photo_changed(sender, instance, **kwargs):
+    # Evidence frames never appear on the public list
+    if not instance.is_detection_evidence:
+        invalidate()
+
+
+def list_state():
+    """{'newest': last change to any case or photo, 'count': listed cases, 'etag'}; one query per version."""
+    version = _version()
+    key = f"public_list:v{version}:state"
+    state = cache.get(key)
+    if state is None:
+        # Over all cases, not only listed ones: a case closed or reopened moves it too
+        state = Case.objects.aggregate(
+            newest=Max('updated_at'),
+            count=Count('id', filter=Q(status__in=ACTIVE_STATUSES)),
+        )
+        changed = cache.get(CHANGED_KEY)
+        if changed and (state['newest'] is None or changed > state['newest']):
+            state['newest'] = changed
+        stamp = f"{version}:{state['newest'].isoformat() if state['newest'] else '-'}:{state['count']}"
+        state['etag'] = hashlib.md5(stamp.encode()).hexdigest()[:16]
+        cache.set(key, state, CACHE_SECONDS)
+    return state
+
+
+def _serialize(case, photo):
+    sources = image_sources(photo) or {'src': None, 'srcset': '', 'webp_srcset': ''}
+    return {
+        'complaint_id': case.complaint_id,
+        'missing_name': case.missing_name,
+        'missing_age': case.missing_age,
+        'missing_gender': case.missing_gender,
+        'last_seen_location': case.last_seen_location,
+        'last_seen_date': case.last_seen_date.isoformat() if case.last_seen_date else None,
+        'status': case.status,
+        'photo_url': sources['src'],
+        'photo_srcset': sources['srcset'],
+        'photo_webp_srcset': sources['webp_srcset'],
+    }
+
+
+def get_page(number):
+    """One cached page: {'number', 'num_pages', 'count', 'html', 'cases'}. EmptyPage past the last one."""
+    key = f"public_list:v{_version()}:page:{number}"
+    page = cache.get(key)
+    if page is not None:
+        return page
+
+    cases = (Case.objects.filter(status__in=ACTIVE_STATUSES).order_by('-last_seen_date', '-id')
+             .prefetch_related(Prefetch(
+                 'photos',
+                 queryset=CasePhoto.objects.filter(is_detection_evidence=False)[:1],  # newest enrollment photo
+                 to_attr='enrollment_photos',
+             )))
+    paginator = Paginator(cases, PAGE_SIZE)
+    paginator.count = list_state()['count']  # known already, saves the COUNT(*)
+    current = paginator.page(number)
+
+    rows = [(case, case.enrollment_photos[0] if case.enrollment_photos else None) for case in current]
+    page = {
+        'number': current.number,
+        'num_pages': paginator.num_pages,
+        'count': paginator.count,
+        'html': render_to_string('cases/_public_case_cards.html', {'rows': rows}),
+        'cases': [_serialize(case, photo) for case, photo in rows],
+    }
+    cache.set(key, page, CACHE_SECONDS)
+    return page
+
+
+def page_number(raw):
+    try:
+        return max(1, int(raw))
+    except (TypeError, ValueError):
+        return 1
+
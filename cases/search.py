@@ -0,0 +1,108 @@
+# cases/search.py
+
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+# --- Full-Text Case Search (SQLite FTS5) ---
+#
+# icontains over the free-text fields is a LIKE '%...%' scan of the whole case table and
+# cannot rank. cases_case_fts is an FTS5 index over those fields ("external content": it
+# stores only the index and reads the text from cases_case). SQLite triggers keep it in
+# step with every INSERT / UPDATE / DELETE, including QuerySet.update() and bulk_create(),
+# which signals would miss (migration 0018_case_fulltext_search).
+#
+# Every word typed must match the start of a word in some field ("rav sha" finds "Ravi
+# Sharma"); results are ranked with bm25, a name hit weighing most. A complaint ID typed in
+# full matches too. Other database backends fall back to icontains.
+
+FTS_TABLE = 'cases_case_fts'
+FTS_COLUMNS = ('missing_name', 'guardian_name', 'clothing_description', 'special_marks', 'last_seen_location')
+FTS_WEIGHTS = (10.0, 4.0, 1.0, 2.0, 1.0)  # bm25 weight per column, in FTS_COLUMNS order
+MAX_TERMS = 8
+
+_columns = ', '.join(FTS_COLUMNS)
+_new = ', '.join(f'new.{c}' for c in FTS_COLUMNS)
+_old = ', '.join(f'old.{c}' for c in FTS_COLUMNS)
+
+# Current schema, also used by `manage.py benchmark fts` (the migration keeps its own copy)
+FTS_SCHEMA = [
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        {_columns},
+        content='cases_case', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER {FTS_TABLE}_insert AFTER INSERT ON cases_case BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, {_columns}) VALUES (new.id, {_new});
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_delete AFTER DELETE ON cases_case BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_columns}) VALUES ('delete', old.id, {_old});
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_update AFTER UPDATE OF {_columns} ON cases_case BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_columns}) VALUES ('delete', old.id, {_old});
+        INSERT INTO {FTS_TABLE}(rowid, {_columns}) VALUES (new.id, {_new});
+    END""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",  # index the existing rows
+]
+
+
+def fts_available():
+    return connection.vendor == 'sqlite'
+
+
+def match_query(text):
+    """User input -> FTS5 query: every word as a quoted prefix ('rav sha' -> '"rav"* "sha"*'), or None."""
+    words = re.findall(r'\w+', text.lower())[:MAX_TERMS]
+    return ' '.join(f'"{word}"*' for word in words) or None
+
+
+def _fts_ids(query):
+    return RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [query])
+
+
+def case_filter(text, prefix=''):
+    """Q for cases matching `text` (all words, as prefixes) or with complaint ID `text`; `prefix` e.g. 'case__'."""
+    text = text.strip()
+    by_id = Q(**{f'{prefix}complaint_id': text.upper()})  # unique index, IDs are stored upper-case
+    if not fts_available():
+        by_text = Q()
+        for column in FTS_COLUMNS:
+            by_text |= Q(**{f'{prefix}{column}__icontains': text})
+        return by_id | by_text
+
+    query = match_query(text)
+    if query is None:
+        return by_id
+    return by_id | Q(**{f'{prefix}pk__in': _fts_ids(query)})
+
+
+def search_cases(text, queryset, limit=20):
+    """
+    The best `limit` cases of `queryset` for `text`, most relevant first (exact complaint ID on
+    top). Ranking happens inside FTS5, restricted to the queryset's rows.
+    """
+    text = text.strip()
+    if not text:
+        return []
+    query = match_query(text)
+    if not fts_available() or query is None:
+        return list(queryset.filter(case_filter(text)).order_by('-created_at')[:limit])
+
+    subquery, params = queryset.order_by().values('pk').query.sql_with_params()
+    weights = ', '.join(str(w) for w in FTS_WEIGHTS)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid IN ({subquery}) "
+            f"ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT %s",
+            [query, *params, limit],
+        )
+        ranked = [row[0] for row in cursor.fetchall()]
+
+    exact = queryset.filter(complaint_id=text.upper()).values_list('pk', flat=True).first()
+    if exact is not None:
+        ranked = [exact] + [pk for pk in ranked if pk != exact][:limit - 1]
+
+    cases = queryset.in_bulk(ranked)
+    return [cases[pk] for pk in ranked if pk in cases]
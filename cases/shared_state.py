@@ -0,0 +1,30 @@
+# cases/shared_state.py
+
+import redis
+from django.conf import settings
+
+# --- Shared Redis State ---
+#
+# Web workers, Celery workers and management commands are separate processes, so state
+# they must agree on (live-match evidence windows, per-recipient send rates, status-cache
+# hit counters) lives in Redis.
+# Every read-modify-write is a single command or a Lua script, which Redis runs atomically,
+# so concurrent requests never lose an update.
+
+_client = None
+
+
+def get_redis():
+    """The Redis client of this process (created lazily; redis-py reconnects in forked children)."""
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(getattr(settings, 'REDIS_STATE_URL', 'redis://localhost:6379/2'))
+    return _client
+
+
+def available():
+    """True if the Redis server of REDIS_STATE_URL answers (used to skip tests without one)."""
+    try:
+        return bool(get_redis().ping())
+    except redis.RedisError:
+        return False
@@ -0,0 +1,104 @@
+# cases/sightings.py
+
+import time
+import uuid
+from collections import deque
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.utils import timezone
+
+from .models import Sighting
+
+# --- Sightings Store (retroactive matching) ---
+#
+# Faces the live cameras saw but could not match are stored with their embedding,
+# location and time. When a new case is enrolled, its vector is compared against this
+# store one day-partition at a time: each day is loaded as a single float32 matrix
+# (raw bytes, no JSON parsing) and scored with one matrix-vector product.
+
+RETENTION_DAYS = getattr(settings, 'SIGHTING_RETENTION_DAYS', 30)
+DEDUP_SECONDS = getattr(settings, 'SIGHTING_DEDUP_SECONDS', 30)
+DEDUP_SIMILARITY = 0.85  # same person, same camera, within the dedup window
+
+_recent = {}  # camera_id -> deque of (monotonic time, embedding) for de-duplication
+
+
+def _is_repeat(camera_id, embedding):
+    """True if this camera stored a near-identical face within DEDUP_SECONDS (in this process)."""
+    now = time.monotonic()
+    recent = _recent.setdefault(camera_id, deque())
+    while recent and now - recent[0][0] > DEDUP_SECONDS:
+        recent.popleft()
+
+    if any(float(embedding @ previous) >= DEDUP_SIMILARITY for _, previous in recent):
+        return True
+    recent.append((now, embedding))
+    return False
+
+
+def record_sightings(unmatched, camera_id=None, latitude=None, longitude=None):
+    """Stores the unmatched faces collected by match_faces_in_image(unmatched=[...])."""
+    saved = 0
+    seen_at = timezone.now()
+
+    for face in unmatched:
+        embedding = face['embedding'] / max(float(np.linalg.norm(face['embedding'])), 1e-12)
+        if _is_repeat(camera_id, embedding):
+            continue
+
+        sighting = Sighting(
+            model_version=face['model_version'],
+            embedding=embedding.astype(np.float32).tobytes(),
+            det_score=face['det_score'],
+            camera_id=camera_id,
+            latitude=latitude,
+            longitude=longitude,
+            seen_at=seen_at,
+        )
+        if face.get('face_jpeg'):
+            sighting.face_image = ContentFile(face['face_jpeg'], name=f"sighting_{uuid.uuid4().hex[:10]}.jpg")
+        sighting.save()
+        saved += 1
+    return saved
+
+
+def search_sightings(vector, model_version, threshold, exclude_case=None, since_days=None):
+    """
+    Sightings whose face matches `vector` (same model version) with cosine similarity >= threshold,
+    within the retention window. Returns [(Sighting id, similarity)], best first.
+    """
+    query = np.asarray(vector, dtype=np.float32)
+    query /= max(float(np.linalg.norm(query)), 1e-12)
+    start_day = timezone.localdate() - timedelta(days=since_days or RETENTION_DAYS)
+
+    base = Sighting.objects.filter(model_version=model_version, seen_on__gte=start_day)
+    if exclude_case is not None:
+        base = base.exclude(matched_case=exclude_case)
+
+    hits = []
+    days = base.order_by('-seen_on').values_list('seen_on', flat=True).distinct()
+    for day in days:
+        rows = list(base.filter(seen_on=day).values_list('pk', 'embedding'))
+        ids = np.fromiter((pk for pk, _ in rows), dtype=np.int64, count=len(rows))
+        matrix = np.frombuffer(b''.join(bytes(blob) for _, blob in rows), dtype=np.float32).reshape(len(rows), -1)
+
+        scores = matrix @ query
+        for i in np.flatnonzero(scores >= threshold):
+            hits.append((int(ids[i]), float(scores[i])))
+
+    hits.sort(key=lambda hit: hit[1], reverse=True)
+    return hits
+
+
+def purge_expired(retention_days=None):
+    """Deletes whole day-partitions older than the retention window, face crops included."""
+    cutoff = timezone.localdate() - timedelta(days=retention_days or RETENTION_DAYS)
+    expired = Sighting.objects.filter(seen_on__lt=cutoff)
+
+    for sighting in expired.exclude(face_image='').exclude(face_image__isnull=True).only('face_image'):
+        sighting.face_image.delete(save=False)
+    deleted, _ = expired.delete()
+    return deleted
@@ -0,0 +1,86 @@
+# cases/status_cache.py
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Case
+from .shared_state import get_redis
+
+# --- Public Status Lookup Cache ---
+#
+# Citizens refresh public_status_detail for the same few complaint IDs over and over (and
+# much more after media coverage). The page only needs a handful of public fields, so each
+# lookup is cached as a plain dict (the "view model") keyed by complaint ID:
+#   * found:   kept STATUS_CACHE_SECONDS, dropped by the Case save/delete signals, so a
+#              status change in update_case_status (or anywhere else) shows on the next refresh;
+#   * unknown: a MISSING marker kept STATUS_NEGATIVE_CACHE_SECONDS, so guessing IDs costs no
+#              query either. A case created under a marked ID clears it through the same signal.
+# QuerySet.update() skips signals; such changes show once the entry expires.
+#
+# The entries live in the shared Redis cache (settings.CACHES), so a save in any process
+# (admin, a Celery task) drops the copy every web worker reads. Hits, negative hits and misses
+# are counted in one Redis hash of the shared state store (shared_state.py) with HINCRBY, so
+# `manage.py status_cache_stats`, a process of its own, reports the hit ratio of all workers.
+
+CACHE_SECONDS = getattr(settings, 'STATUS_CACHE_SECONDS', 5 * 60)
+NEGATIVE_CACHE_SECONDS = getattr(settings, 'STATUS_NEGATIVE_CACHE_SECONDS', 60)
+MISSING = '__missing__'
+
+# Everything public_status_detail shows; guardian details never enter the cache
+PUBLIC_FIELDS = (
+    'pk', 'complaint_id', 'status', 'created_at', 'missing_name', 'missing_age', 'missing_gender',
+    'missing_height', 'missing_weight', 'missing_eye_color', 'missing_hair_color', 'special_marks',
+    'last_seen_location',
+)
+STAT_NAMES = ('hits', 'negative_hits', 'misses')
+STATS_KEY = 'status_view:stats'
+
+
+def _key(complaint_id):
+    # Hashed: the ID comes straight from the URL and must make a valid key for any backend
+    return f"status_view:{hashlib.md5(complaint_id.encode()).hexdigest()}"
+
+
+def _count(name):
+    get_redis().hincrby(STATS_KEY, name)
+
+
+def get_status_view(complaint_id):
+    """The public fields of the case as a dict, or None if no case has this complaint ID."""
+    key = _key(complaint_id)
+    cached = cache.get(key)
+    if cached == MISSING:
+        _count('negative_hits')
+        return None
+    if cached is not None:
+        _count('hits')
+        return cached
+
+    _count('misses')
+    view = Case.objects.filter(complaint_id=complaint_id).values(*PUBLIC_FIELDS).first()
+    if view is None:
+        cache.set(key, MISSING, NEGATIVE_CACHE_SECONDS)
+    else:
+        cache.set(key, view, CACHE_SECONDS)
+    return view
+
+
+def invalidate_case(sender, instance, **kwargs):
+    """Case post_save / post_delete receiver."""
+    if instance.complaint_id:
+        cache.delete(_key(instance.complaint_id))
+
+
+def stats(reset=False):
+    """{'hits', 'negative_hits', 'misses', 'lookups', 'hit_ratio'} since the last reset."""
+    pipe = get_redis().pipeline()  # MULTI: no lookup is counted between the read and the reset
+    pipe.hgetall(STATS_KEY)
+    if reset:
+        pipe.delete(STATS_KEY)
+    values = pipe.execute()[0]
+    counts = {name: int(values.get(name.encode(), 0)) for name in STAT_NAMES}
+    counts['lookups'] = sum(counts[name] for name in STAT_NAMES)
+    counts['hit_ratio'] = (counts['hits'] + counts['negative_hits']) / counts['lookups'] if counts['lookups'] else 0.0
+    return counts
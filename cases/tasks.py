@@ -2,8 +2,12 @@
 
 from celery import shared_task
 from django.conf import settings
-from .models import Case, FaceEmbedding
-from .ai_processor import generate_embedding_from_image # Import the AI function
+from django.core.files.base import ContentFile
+from .duplicates import flag_duplicates_for_case
+from .models import Case, CasePhoto, FaceEmbedding, EmbeddingModelVersion, DetectionAlert, Sighting
+from .ai_processor import (  # Import the AI functions
+    generate_embedding_from_image, generate_case_embedding, cached_case_embedding, active_model_version,
+)
 import os
 import numpy as np
 
@@ -55,39 +59,180 @@ def process_new_case_photo_for_embedding(case_id): # Note: Removed image_relativ
         print(f"Celery Task: No enrollment photos found for Case ID {case_id}.")
         return
 
-    all_vectors = []
-    
-    # 2. Iterate through all photos and generate vectors
-    for photo in enrollment_photos:
-        image_path = os.path.join(settings.MEDIA_ROOT, photo.image.name)
-        
-        # Call the AI function (must be updated to handle multiple calls)
-        vector_list = generate_embedding_from_image(image_path) # AI call
-        
-        if vector_list:
-            all_vectors.append(np.array(vector_list))
-            print(f"Celery Task: Generated vector for photo {photo.id}.")
+    # Dual-write: the active version, plus any version being rebuilt in the background,
+    # so a rebuild never misses cases registered while it runs.
+    active_version = active_model_version()
+    model_versions = [active_version] + list(
+        EmbeddingModelVersion.objects.filter(is_building=True).exclude(name=active_version).values_list('name', flat=True)
+    )
+
+    for model_version in model_versions:
+        all_vectors = []
+
+        # 2. Iterate through all photos and generate vectors
+        for photo in enrollment_photos:
+            image_path = os.path.join(settings.MEDIA_ROOT, photo.image.name)
+
+            # Call the AI function (must be updated to handle multiple calls)
+            vector_list = generate_embedding_from_image(image_path, model_version) # AI call
+
+            if vector_list:
+                all_vectors.append(np.array(vector_list))
+                print(f"Celery Task: Generated {model_version} vector for photo {photo.id}.")
+            else:
+                # Handle failure for a single photo (e.g., face not detected)
+                print(f"Celery Task: Failed to generate {model_version} vector for photo {photo.id}.")
+
+        # 3. Aggregate Vectors (Create the Mean Vector)
+        if all_vectors:
+            # Stack all vectors into a NumPy array and calculate the mean vector
+            mean_vector_np = np.mean(np.stack(all_vectors), axis=0)
+            mean_vector_list = mean_vector_np.tolist()
+
+            # 4. Save the Final Mean Vector (re-runs replace the case's vector for this model version)
+            FaceEmbedding.objects.update_or_create(
+                case=case,
+                model_version=model_version,
+                defaults={
+                    'embedding_vector': mean_vector_list,
+                    'source_image_path': f"Aggregated from {len(all_vectors)} photos.",
+                },
+            )
+            print(f"Celery Task: Successfully saved AGGREGATED {model_version} embedding for Case ID {case_id}.")
+
+            if model_version == active_version:
+                # Is this person already registered under another case?
+                flagged = flag_duplicates_for_case(case.pk, mean_vector_list, model_version)
+                if flagged:
+                    print(f"Celery Task: Case ID {case_id} flagged as possible duplicate of {flagged} case(s).")
+                # Was this person already seen by a camera before the case existed?
+                retroactive_match_case.delay(case_id)
         else:
-            # Handle failure for a single photo (e.g., face not detected)
-            print(f"Celery Task: Failed to generate vector for photo {photo.id}.")
+            print(f"Celery Task: No valid {model_version} vectors could be generated for Case ID {case_id}.")
+
+
+@shared_task
+def rebuild_embedding_version(model_version, batch_size=100):
+    """
+    Background ("green") rebuild of one model version while the active ("blue") one keeps serving.
+    Resumable: cases that already have a vector for this version are skipped. Cuts over
+    atomically once the new version covers every case the active version can match.
+    """
+    version, _ = EmbeddingModelVersion.objects.get_or_create(name=model_version)
+    if version.is_active:
+        print(f"Celery Task: {model_version} is already active, nothing to rebuild.")
+        return
+    EmbeddingModelVersion.objects.filter(pk=version.pk).update(is_building=True)
+
+    # 1. Cases still missing a vector for this version, with their enrollment photos (one query)
+    done = FaceEmbedding.objects.filter(model_version=model_version).values('case_id')
+    case_ids = list(Case.objects.exclude(pk__in=done).values_list('pk', flat=True))
+
+    photos = {}
+    for photo_case_id, image_name in (CasePhoto.objects
+                                      .filter(case_id__in=case_ids, is_detection_evidence=False)
+                                      .values_list('case_id', 'image')):
+        photos.setdefault(photo_case_id, []).append(image_name)
+
+    print(f"Celery Task: Rebuilding {model_version} for {len(case_ids)} case(s).")
+
+    # 2. Embed (content-hash cache first) and upsert in batches
+    batch = []
+    for case_id in case_ids:
+        paths = photos.get(case_id, [])
+        vector, used = cached_case_embedding(paths, model_version) or generate_case_embedding(paths, model_version)
+        if vector is not None:
+            batch.append(FaceEmbedding(case_id=case_id, model_version=model_version, embedding_vector=vector,
+                                       source_image_path=f"Aggregated from {used} photos."))
+        if len(batch) >= batch_size:
+            FaceEmbedding.bulk_upsert(batch)
+            batch = []
+    if batch:
+        FaceEmbedding.bulk_upsert(batch)
+
+    # 3. Cut over only if no currently matchable case would be lost
+    missing = version.missing_case_ids()
+    if missing:
+        print(f"Celery Task: {model_version} still misses {len(missing)} case(s) the active version matches; "
+              f"not switching. Cases: {sorted(missing)[:20]}")
+        return
+
+    EmbeddingModelVersion.activate(model_version)
+    print(f"Celery Task: {model_version} fully built and now active.")
 
 
-    # 3. Aggregate Vectors (Create the Mean Vector)
-    if all_vectors:
-        # Stack all vectors into a NumPy array and calculate the mean vector
-        mean_vector_np = np.mean(np.stack(all_vectors), axis=0)
-        mean_vector_list = mean_vector_np.tolist()
+@shared_task
+def retroactive_match_case(case_id):
+    """
+    Searches the stored sightings (unmatched faces from the last SIGHTING_RETENTION_DAYS)
+    for a newly enrolled case. Matches are logged as detection evidence and raise one
+    retroactive alert pointing at the most recent located sighting.
+    """
+    from .ai_processor import MATCH_THRESHOLD
+    from .sightings import search_sightings
+
+    model_version = active_model_version()
+    embedding = FaceEmbedding.objects.filter(case_id=case_id, model_version=model_version).select_related('case').first()
+    if embedding is None:
+        return
+
+    case = embedding.case
+    hits = search_sightings(embedding.embedding_vector, model_version, MATCH_THRESHOLD, exclude_case=case)
+    if not hits:
+        print(f"Celery Task: No earlier sightings match Case {case.complaint_id}.")
+        return
+
+    max_evidence = getattr(settings, 'SIGHTING_MAX_EVIDENCE', 20)
+    similarity_by_id = dict(hits[:max_evidence])
+    sightings = Sighting.objects.filter(pk__in=similarity_by_id).order_by('-seen_at')
 
-        # 4. Save the Final Mean Vector
-        FaceEmbedding.objects.create(
+    latest_located = None
+    for sighting in sightings:
+        sighting.matched_case = case
+        sighting.save(update_fields=['matched_case'])
+        if not sighting.face_image:
+            continue
+
+        photo = CasePhoto.objects.create(
             case=case,
-            embedding_vector=mean_vector_list,
-            source_image_path=f"Aggregated from {len(all_vectors)} photos." 
+            image=ContentFile(sighting.face_image.read(), name=f"{case.complaint_id}_Sighting_{sighting.pk}.jpg"),
+            is_detection_evidence=True,
+            latitude=sighting.latitude,
+            longitude=sighting.longitude,
         )
-        print(f"Celery Task: Successfully saved AGGREGATED embedding for Case ID {case_id}.")
-    else:
-        print(f"Celery Task: No valid vectors could be generated for Case ID {case_id}.")
-        
+        # Evidence is dated when the camera saw the face, not when the case was registered
+        CasePhoto.objects.filter(pk=photo.pk).update(uploaded_at=sighting.seen_at)
+
+        if latest_located is None and sighting.latitude is not None and sighting.longitude is not None:
+            latest_located = (sighting, photo)
+
+    print(f"Celery Task: {len(similarity_by_id)} earlier sighting(s) match Case {case.complaint_id}.")
+
+    if latest_located is None:
+        print(f"Celery Task: Retroactive matches for {case.complaint_id} have no location; evidence saved, no alert.")
+        return
+
+    sighting, photo = latest_located
+    with transaction.atomic():
+        DetectionAlert.objects.create(case=case, detection_photo=photo, is_retroactive=True)
+        enqueue_detection_alert(
+            case.pk,
+            photo.pk,
+            similarity_by_id[sighting.pk],
+            float(sighting.latitude),
+            float(sighting.longitude),
+        )
+
+
+@shared_task
+def purge_expired_sightings():
+    """Periodic (celery beat): drops sighting day-partitions past SIGHTING_RETENTION_DAYS."""
+    from .sightings import purge_expired
+
+    deleted = purge_expired()
+    print(f"Celery Task: Purged {deleted} expired sighting(s).")
+
+
 # cases/tasks.py (Modified send_detection_alert_email function)
 # cases/tasks.py (The final, corrected send_detection_alert_email)
 from celery import shared_task
@@ -220,148 +365,225 @@ from .models import Case, CasePhoto, DetectionAlert
 # Import PoliceStation from its actual application (Assuming 'police')
 # **CRITICAL FIX:** Adjust the 'police' app name if your location models are elsewhere
 from police.models import PoliceStation 
+from police.spatial import alert_stations
+from .digest import add_to_digest, claim_digest, plan_digest_emails, build_digest_email, due_digest_ids
+from .outbox import enqueue, dispatch_due
+from django.db import transaction
 
 # Used for Haversine calculation
-from math import radians, sin, cos, sqrt, atan2 
 import os
 from email.mime.image import MIMEImage
 
-# Earth's radius in kilometers
-R = 6371.0 
+# Distance maths lives in cases/geo.py (vectorized); station lookups go through police/spatial.py
+
+
+def alert_recipients(case, latitude, longitude):
+    """(to, cc) for a detection of `case` at the given location."""
+    recipient_list = [] # TO list (Assigned Officer)
+    cc_list = []        # CC list (Guardian and Nearest Stations)
+    
+    # A. Assigned Officer (Primary Recipient)
+    # Access officer email via the user model
+    if case.police_officer and case.police_officer.email:
+        recipient_list.append(case.police_officer.email)
+        
+    # B. Guardian (Standard CC Recipient)
+    if case.guardian_email:
+        cc_list.append(case.guardian_email)
 
-def haversine_distance(lat1, lon1, lat2, lon2):
-    """Calculates the distance between two points on the Earth's surface (in km)."""
-    lat1_rad = radians(lat1)
-    lon1_rad = radians(lon1)
-    lat2_rad = radians(lat2)
-    lon2_rad = radians(lon2)
+    # C. FIND NEAREST POLICE STATIONS (Geospatial Search)
+    # Logic is now safe because PoliceStation is correctly imported
+    if latitude is not None and longitude is not None:
 
-    dlon = lon2_rad - lon1_rad
-    dlat = lat2_rad - lat1_rad
+        # The 2 nearest stations from the cached BallTree (police/spatial.py), or those within
+        # ALERT_STATION_RADIUS_KM when it is set (cases/geo.py); no query or full sort per alert
+        for station in alert_stations(latitude, longitude, k=2):
+            if station['email']:
+                cc_list.append(station['email'])
+                print(f"CC -> {station['name']} at {station['distance_km']:.2f} km")
 
-    a = sin(dlat / 2)**2 + cos(lat1_rad) * cos(lat2_rad) * sin(dlon / 2)**2
-    c = 2 * atan2(sqrt(a), sqrt(1 - a))
+        print("DEBUG - CC LIST:", cc_list)
+
+    return recipient_list, cc_list
+
+
+def build_detection_alert_email(case_id, detection_photo_pk, similarity, latitude, longitude):
+    """Builds (does not send) the high-priority alert email for one detection."""
+    case = Case.objects.select_related('police_officer').get(pk=case_id)
+    detection_photo = CasePhoto.objects.get(pk=detection_photo_pk)
+    
+    # --- 1. ALERT COOLDOWN CHECK (2-Minute Throttle) ---
+    # now = timezone.now()
+    # cooldown_period = timedelta(minutes=1)
     
-    return R * c # Distance in kilometers
+    # last_alert = DetectionAlert.objects.filter(case=case).order_by('-alert_sent_at').first()
+    
+    # if last_alert and (now - last_alert.alert_sent_at) < cooldown_period:
+    #     print(f"ALERT SKIPPED (Email Throttle): Case {case.complaint_id} is in 2 min cooldown.")
+    #     return
 
+    # 2. FIND RECIPIENT LISTS
+    recipient_list, cc_list = alert_recipients(case, latitude, longitude)
 
-@shared_task
-def send_detection_alert_email(case_id, detection_photo_pk, similarity, latitude, longitude):
+    # 3. PREPARE EMAIL CONTENT  
+    detection_photo_path = detection_photo.image.name
+    subject = f"🚨 HIGH PRIORITY ALERT: Match Found for Case ID {case.complaint_id}"
+    image_cid = f'detection_image_{case.pk}'
+    
+    # Determine location display strings
+    location_string = f"{latitude}, {longitude}" if latitude and longitude else "Location Data Unavailable"
+    map_link = f"https://www.google.com/maps/search/?api=1&query={latitude},{longitude}" if latitude and longitude else None
     
+    # 4. Create the Email
+    email = EmailMultiAlternatives(
+        subject=subject,
+        body=(
+            f"URGENT: AI detected a match for {case.missing_name} (Case ID: {case.complaint_id}).\n"
+            f"Confidence: {similarity*100:.2f}% | Location: {location_string}\n"
+            f"Action Required: Check the case dashboard immediately."
+        ),
+        to=recipient_list, # Assigned officer
+        cc=cc_list         # Guardian and nearest stations
+    )
+    
+    # Attach Image Inline (Critical for display)
+    photo_abs_path = os.path.join(settings.MEDIA_ROOT, detection_photo_path) 
     try:
-        case = Case.objects.get(pk=case_id)
-        detection_photo = CasePhoto.objects.get(pk=detection_photo_pk)
-        
-        # --- 1. ALERT COOLDOWN CHECK (2-Minute Throttle) ---
-        # now = timezone.now()
-        # cooldown_period = timedelta(minutes=1)
-        
-        # last_alert = DetectionAlert.objects.filter(case=case).order_by('-alert_sent_at').first()
-        
-        # if last_alert and (now - last_alert.alert_sent_at) < cooldown_period:
-        #     print(f"ALERT SKIPPED (Email Throttle): Case {case.complaint_id} is in 2 min cooldown.")
-        #     return
+        with open(photo_abs_path, 'rb') as f:
+            img = MIMEImage(f.read())
+            img.add_header('Content-ID', f'<{image_cid}>')
+            email.attach(img)
+    except FileNotFoundError:
+        print(f"ERROR: Image file not found at {photo_abs_path}. Skipping image attachment.")
+
+    # Attach HTML Content
+    html_content = render_to_string(
+        'emails/detection_alert.html',
+        {
+            'case': case,
+            'image_cid': image_cid, 
+            'similarity': f"{similarity*100:.2f}%",
+            'location_link': map_link,
+            'location_coords': location_string,
+            'officer_email': case.police_officer.email if case.police_officer else 'N/A'
+        }
+    )
+
+    email.attach_alternative(html_content, "text/html")
+    return email
+
+
+def build_case_confirmation_email(case_id):
+    """Builds the 'complaint registered' email for the guardian."""
+    case = Case.objects.get(pk=case_id)
+
+    # Render HTML content
+    html_content = render_to_string(
+        'emails/complaint_confirmation.html',
+        {'case': case}
+    )
+
+    # Text fallback version
+    text_content = f"""
+    Complaint Registered Successfully!
+    Complaint ID: {case.complaint_id}
+    Missing Person: {case.missing_name}
+    Status: {case.status}
+    """
+
+    email = EmailMultiAlternatives(
+        subject=f"✅ Case Registered - ID: {case.complaint_id}",
+        body=text_content,
+        to=[case.guardian_email]
+    )
+    email.attach_alternative(html_content, "text/html")
+    return email
+
+
+# --- Notification Outbox (cases/outbox.py) ---
+# Each kind maps to fn(payload) -> EmailMessage to deliver, or None for pure database work.
+
+def _coalesce_detection_alert(payload):
+    """A DetectionAlert joins its case's open digest; opening a digest schedules its flush."""
+    digest, opened = add_to_digest(**payload)
+    if opened:
+        transaction.on_commit(lambda: flush_alert_digest.apply_async((digest.pk,), eta=digest.flush_at))
+        print(f"ALERT DIGEST: Opened digest {digest.pk} for Case ID {payload['case_id']}, flushing at {digest.flush_at}.")
+    return None
+
+
+OUTBOX_HANDLERS = {
+    'detection_alert': _coalesce_detection_alert,
+    'alert_digest': lambda payload: build_digest_email(payload, build_detection_alert_email),
+    'case_confirmation': lambda payload: build_case_confirmation_email(payload['case_id']),
+}
+
+
+def enqueue_detection_alert(case_id, photo_pk, similarity, latitude, longitude):
+    """Outbox entry for a new DetectionAlert; call inside the transaction that creates it."""
+    enqueue('detection_alert', {
+        'case_id': case_id,
+        'photo_pk': photo_pk,
+        'similarity': similarity,
+        'latitude': latitude,
+        'longitude': longitude,
+    })
 
-        # 2. FIND RECIPIENT LISTS
-        recipient_list = [] # TO list (Assigned Officer)
-        cc_list = []        # CC list (Guardian and Nearest Stations)
-        
-        # A. Assigned Officer (Primary Recipient)
-        # Access officer email via the user model
-        if case.police_officer and case.police_officer.email:
-            recipient_list.append(case.police_officer.email)
-            
-        # B. Guardian (Standard CC Recipient)
-        if case.guardian_email:
-            cc_list.append(case.guardian_email)
 
-        # C. FIND NEAREST POLICE STATIONS (Geospatial Search)
-        # Logic is now safe because PoliceStation is correctly imported
-        if latitude is not None and longitude is not None:
-    
-            lat_float = float(latitude)
-            lon_float = float(longitude)
-            
-            all_stations = PoliceStation.objects.exclude(latitude__isnull=True).exclude(longitude__isnull=True)
-            
-            stations_with_distance = []
-            for station in all_stations:
-                distance = haversine_distance(
-                    lat_float, lon_float,
-                    float(station.latitude), float(station.longitude)
-                )
-                stations_with_distance.append((station, distance))
-            
-            # Sort by distance ASC
-            stations_with_distance.sort(key=lambda x: x[1])
+@shared_task
+def dispatch_outbox():
+    counts = dispatch_due(OUTBOX_HANDLERS)
+    if any(counts.values()):
+        print(f"Outbox: {counts}")
 
-            # Debug logging
-            print("DEBUG - DISTANCE LIST:", [(s.name, d) for s, d in stations_with_distance])
 
-            for station, dist in stations_with_distance[:2]:
-                if station.email:
-                    cc_list.append(station.email)
-                    print(f"CC -> {station.name} at {dist:.2f} km")
+@shared_task
+def flush_alert_digest(digest_id):
+    """Closes the digest and queues its emails in one transaction."""
+    with transaction.atomic():
+        digest = claim_digest(digest_id)
+        if digest is None:
+            return  # Already flushed (e.g. by the periodic safety net)
+        payloads = plan_digest_emails(digest, alert_recipients)
+        for payload in payloads:
+            enqueue('alert_digest', payload)
 
-            print("DEBUG - CC LIST:", cc_list)
+    print(f"ALERT DIGEST: {len(digest.items)} detection(s) for Case ID {digest.case_id} "
+          f"queued as {len(payloads)} email(s).")
 
-        # 3. PREPARE EMAIL CONTENT  
-        detection_photo_path = detection_photo.image.name
-        subject = f"🚨 HIGH PRIORITY ALERT: Match Found for Case ID {case.complaint_id}"
-        image_cid = f'detection_image_{case.pk}'
-        
-        # Determine location display strings
-        location_string = f"{latitude}, {longitude}" if latitude and longitude else "Location Data Unavailable"
-        map_link = f"https://www.google.com/maps/search/?api=1&query={latitude},{longitude}" if latitude and longitude else None
-        
-        # 4. Create and Send Email
-        email = EmailMultiAlternatives(
-            subject=subject,
-            body=(
-                f"URGENT: AI detected a match for {case.missing_name} (Case ID: {case.complaint_id}).\n"
-                f"Confidence: {similarity*100:.2f}% | Location: {location_string}\n"
-                f"Action Required: Check the case dashboard immediately."
-            ),
-            to=recipient_list, # Assigned officer
-            cc=cc_list         # Guardian and nearest stations
-        )
-        print("DEBUG EMAIL LIST:", recipient_list, cc_list)
-        
-        # Attach Image Inline (Critical for display)
-        photo_abs_path = os.path.join(settings.MEDIA_ROOT, detection_photo_path) 
-        try:
-            with open(photo_abs_path, 'rb') as f:
-                img = MIMEImage(f.read())
-                img.add_header('Content-ID', f'<{image_cid}>')
-                email.attach(img)
-        except FileNotFoundError:
-            print(f"ERROR: Image file not found at {photo_abs_path}. Skipping image attachment.")
-
-        # Attach HTML Content
-        html_content = render_to_string(
-            'emails/detection_alert.html',
-            {
-                'case': case,
-                'image_cid': image_cid, 
-                'similarity': f"{similarity*100:.2f}%",
-                'location_link': map_link,
-                'location_coords': location_string,
-                'officer_email': case.police_officer.email if case.police_officer else 'N/A'
-            }
-        )
-        print("DEBUG EMAIL LIST:", recipient_list, cc_list)
 
-        email.attach_alternative(html_content, "text/html")
-        email.send()
-        print(f"ALERT SENT: Email alert successfully dispatched for Case {case.complaint_id}. TO: {recipient_list}, CC: {cc_list}")
+@shared_task
+def flush_due_alert_digests():
+    """Periodic safety net: flushes digests whose scheduled flush was lost (worker restart, etc.)."""
+    for digest_id in due_digest_ids():
+        flush_alert_digest(digest_id)
 
-        # # 5. CREATE NEW ALERT RECORD
-        # DetectionAlert.objects.create(
-        #     case=case,
-        #     detection_photo=detection_photo,
-        # )
-        
-    except Case.DoesNotExist:
-        print(f"Celery Error: Case ID {case_id} not found.")
+
+# --- Photo derivatives (cases/thumbnails.py) ---
+
+@shared_task
+def generate_photo_derivatives(photo_id):
+    """Encodes the WebP/JPEG thumbnails of one uploaded photo."""
+    from .thumbnails import generate_for_photo, record_failure
+
+    try:
+        photo = CasePhoto.objects.get(pk=photo_id)
+    except CasePhoto.DoesNotExist:
+        return  # deleted before the worker got to it
+    try:
+        derivatives = generate_for_photo(photo)
     except Exception as e:
-        print(f"Celery Error sending detection email for Case {case_id}: {e}")
\ No newline at end of file
+        attempts = record_failure(photo, e)
+        print(f"Celery Error: Could not build derivatives for photo {photo_id} (attempt {attempts}): {e}")
+        return
+    print(f"Celery Task: Photo {photo_id} -> {len(derivatives['jpeg'])} width(s) in WebP and JPEG.")
+
+
+@shared_task
+def generate_missing_derivatives(limit=200):
+    """Periodic safety net: photos whose task was never queued (broker down) or failed fewer than MAX_ATTEMPTS times."""
+    from .thumbnails import pending_photos
+
+    photo_ids = list(pending_photos(CasePhoto.objects.order_by('pk')).values_list('pk', flat=True)[:limit])
+    for photo_id in photo_ids:
+        generate_photo_derivatives(photo_id)
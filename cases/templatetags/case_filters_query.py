@@ -1,13 +1,15 @@
 from django import template
+from django.db.models import QuerySet
 
 register = template.Library() # <-- MUST be named 'register'
 
 @register.filter
 def filter_by_key(queryset, args):
-    # ... your filter code ...
     """
     Allows simple filtering of a QuerySet within a template.
     Usage: queryset|filter_by_key:"key=value"
+    If the rows are already loaded (prefetch_related / evaluated queryset, or a plain list),
+    they are filtered in Python instead of issuing a new query per call.
     """
     if not args:
         return queryset
@@ -21,8 +23,19 @@ def filter_by_key(queryset, args):
         elif value.lower() == 'false':
             value = False
 
-        filter_kwargs = {key: value}
-        return queryset.filter(**filter_kwargs)
+        if isinstance(queryset, QuerySet) and queryset._result_cache is None:
+            filter_kwargs = {key: value}
+            return queryset.filter(**filter_kwargs)
+        return [obj for obj in queryset if _matches(obj, key, value)]
     except Exception:
         # Return the original queryset if parsing fails
-        return queryset
\ No newline at end of file
+        return queryset
+
+
+def _matches(obj, key, value):
+    # "a__b" follows relations like the ORM lookup would; values are compared as in the template
+    for attr in key.split('__'):
+        obj = getattr(obj, attr)
+    if isinstance(value, bool) or obj is None:
+        return obj == value
+    return str(obj) == str(value)
@@ -0,0 +1,30 @@
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+
+from cases.thumbnails import image_sources
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_photo(photo, sizes='100vw', **attrs):
+    """
+    {% responsive_photo photo sizes="80px" class="..." data_bs_toggle="modal" %}
+    Renders a lazily loaded <picture> (WebP, JPEG fallback) choosing the width from `sizes`;
+    underscores in attribute names become hyphens. Plain <img> of the original until derivatives exist.
+    """
+    sources = image_sources(photo)
+    if sources is None:
+        return ''
+    attrs = {name.replace('_', '-'): value for name, value in attrs.items()}
+    attrs.setdefault('loading', 'lazy')
+    attrs.setdefault('decoding', 'async')
+
+    if not sources['srcset']:
+        return format_html('<img src="{}"{}>', sources['src'], flatatt(attrs))
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}"{}></picture>',
+        sources['webp_srcset'], sizes, sources['src'], sources['srcset'], sizes, flatatt(attrs),
+    )
@@ -1,3 +1,1274 @@
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail import EmailMessage
+from django.core.management import CommandError, call_command
+from django.test import RequestFactory, TestCase, SimpleTestCase, override_settings
+from django.urls import reverse
+from django.db import connection
+from unittest import skipUnless
+from unittest.mock import Mock, patch
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from types import SimpleNamespace
+from datetime import timedelta
+import socketserver
+import threading
+import multiprocessing as mp
+import numpy as np
+import redis
+import cv2
+
+from . import ai_processor
+from .frame_buffer import FrameRing, letterbox
+from .image_decode import decode_image
+from .management.commands import scan_video
+from .mailer import PooledMailer
+from .duplicates import duplicate_clusters, find_duplicate_pairs, flag_duplicates_for_case
+from .multiscale import MotionRoiFinder, detect_faces_multiscale, nms, tiles_for_rois
+from .models import (Case, CasePhoto, DetectionAlert, EmbeddingModelVersion, FaceEmbedding,
+                     DuplicateCaseCandidate, ImageEmbeddingCache, OutboxMessage, Sighting)
+from . import evidence, gallery, geo, public_list, shared_state, sightings, thumbnails
+from .outbox import TokenBucket, dispatch_due
+from .search import search_cases
+from .status_cache import get_status_view, stats
+from .templatetags.case_photos import responsive_photo
+from .tasks import generate_missing_derivatives, retroactive_match_case
+from .thumbnails import generate_for_photo, image_sources, serve_media
+from PIL import Image
+from insightface.app.common import Face
+from insightface.utils import face_align
+from django.core import mail
+from django.core.cache import cache
+from django.utils import timezone
 
 # Create your tests here.
+
+# 1x1 transparent GIF
+TINY_IMAGE = b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;'
+
+
+# --- Shared-Memory Frame Ring ---
+
+RING_SHAPE = (1080, 1920, 3)   # 1080p BGR, the size rtspCam publishes
+RING_FRAMES = 120
+
+
+def _ring_writer(name, n_frames, start_event):
+    ring = FrameRing.attach(name)
+    frame = np.empty(RING_SHAPE, dtype=np.uint8)
+    start_event.wait()
+    for n in range(n_frames):
+        frame.fill(n % 251)   # every pixel carries the frame number, so a torn copy is detectable
+        ring.write(frame)
+    ring.close()
+
+
+def _ring_reader(name, n_frames, result_queue):
+    ring = FrameRing.attach(name)
+    out = np.empty(RING_SHAPE, dtype=np.uint8)
+    intact = torn = 0
+    seen = set()
+    while ring.latest() < n_frames - 1:
+        frame_no, frame = ring.read_latest(out=out)
+        if frame is None:
+            continue
+        expected = frame_no % 251
+        if frame.min() == expected and frame.max() == expected:
+            intact += 1
+            seen.add(frame_no)
+        else:
+            torn += 1
+    ring.close()
+    result_queue.put((intact, torn, len(seen)))
+
+
+def _queue_writer(queue, n_frames):
+    frame = np.empty(RING_SHAPE, dtype=np.uint8)
+    for n in range(n_frames):
+        frame.fill(n % 251)
+        queue.put(frame)
+    queue.put(None)
+
+
+class FrameRingTests(SimpleTestCase):
+
+    def test_round_trip_and_overwrite(self):
+        with FrameRing.create(slots=2, frame_shape=(4, 4, 3)) as ring:
+            self.assertEqual(ring.latest(), -1)
+            self.assertIsNone(ring.view(0))
+
+            for value in (10, 20, 30):
+                ring.write(np.full((4, 4, 3), value, dtype=np.uint8))
+
+            self.assertEqual(ring.latest(), 2)
+            self.assertFalse(ring.is_intact(0))            # slot reused by frame 2
+            self.assertEqual(int(ring.view(1)[0, 0, 0]), 20)
+            self.assertEqual(int(ring.view(2)[0, 0, 0]), 30)
+
+            with self.assertRaises(ValueError):
+                ring.write(np.zeros((2, 2, 3), dtype=np.uint8))
+
+    def test_letterbox_keeps_aspect_ratio(self):
+        frame = np.full((480, 640, 3), 200, dtype=np.uint8)    # 4:3 camera, 16:9 ring
+        boxed = letterbox(frame, (90, 160, 3))
+        self.assertEqual(boxed.shape, (90, 160, 3))
+        self.assertTrue((boxed[:, 20:140] == 200).all())      # 120x90 picture, centred
+        self.assertFalse(boxed[:, :20].any())
+        self.assertFalse(boxed[:, 140:].any())
+
+    def test_stress_no_torn_frames_and_throughput(self):
+        """One capture process, several readers; every validated read must be a whole frame."""
+        ring = FrameRing.create(slots=4, frame_shape=RING_SHAPE)
+        try:
+            results = mp.Queue()
+            start = mp.Event()
+            readers = [mp.Process(target=_ring_reader, args=(ring.name, RING_FRAMES, results)) for _ in range(3)]
+            writer = mp.Process(target=_ring_writer, args=(ring.name, RING_FRAMES, start))
+            for p in readers + [writer]:
+                p.start()
+
+            t0 = time.perf_counter()
+            start.set()
+            writer.join()
+            ring_elapsed = time.perf_counter() - t0
+            stats = [results.get(timeout=60) for _ in readers]
+            for p in readers:
+                p.join()
+        finally:
+            ring.close()
+            ring.unlink()
+
+        for intact, torn, distinct in stats:
+            self.assertEqual(torn, 0)
+            self.assertGreater(intact, 0)
+
+        # Baseline: the same frames pickled through a multiprocessing.Queue to one consumer.
+        queue = mp.Queue(maxsize=4)
+        producer = mp.Process(target=_queue_writer, args=(queue, RING_FRAMES))
+        t0 = time.perf_counter()
+        producer.start()
+        received = 0
+        while queue.get(timeout=60) is not None:
+            received += 1
+        queue_elapsed = time.perf_counter() - t0
+        producer.join()
+        self.assertEqual(received, RING_FRAMES)
+
+        print(
+            f"\nFrameRing: {RING_FRAMES / ring_elapsed:.1f} fps published to {len(readers)} readers "
+            f"(distinct frames seen per reader: {[s[2] for s in stats]}) | "
+            f"Queue baseline: {RING_FRAMES / queue_elapsed:.1f} fps to 1 reader"
+        )
+
+
+# --- Offline Video Scanning ---
+
+def _write_test_video(path, frames, fps=10):
+    """Tiny video whose frame n is filled with the value 8 * n, so a frame tells its own index."""
+    values = [8 * n for n in range(frames)]
+    if path.endswith('.mjpeg'):
+        # Raw concatenated JPEGs: the container reports no usable frame count
+        with open(path, 'wb') as f:
+            for value in values:
+                f.write(cv2.imencode('.jpg', np.full((48, 64, 3), value, dtype=np.uint8))[1].tobytes())
+        return
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), fps, (64, 48))
+    for value in values:
+        writer.write(np.full((48, 64, 3), value, dtype=np.uint8))
+    writer.release()
+
+
+class ScanVideoTests(SimpleTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def _scanned_frames(self, path, start, end, fps, stride=1):
+        seen = []
+
+        def match(frame, camera_id=None, model_version=None):
+            seen.append((round(float(frame.mean()) / 8), model_version))
+            return None
+
+        with patch('cases.ai_processor.match_faces_in_image', side_effect=match):
+            decoded, matches = scan_video._scan_segment(path, start, end, stride, fps, 10.0, 'v1')
+        self.assertEqual(decoded, len(seen))
+        self.assertEqual(matches, [])
+        return seen
+
+    def test_segments_start_on_their_exact_frame(self):
+        path = os.path.join(self.tmp, 'clip.avi')
+        _write_test_video(path, 30)
+        plan = scan_video._plan_segments(path, segment_seconds=1)
+        self.assertEqual(plan, [(0, 10, 10.0), (10, 20, 10.0), (20, 30, 10.0)])
+
+        scanned = [self._scanned_frames(path, *segment, stride=3) for segment in plan]
+        self.assertEqual(scanned[1], [(10, 'v1'), (13, 'v1'), (16, 'v1'), (19, 'v1')])
+        self.assertEqual([n for frames in scanned for n, _ in frames], [0, 3, 6, 9, 10, 13, 16, 19, 20, 23, 26, 29])
+
+    def test_unknown_frame_count_is_read_sequentially(self):
+        path = os.path.join(self.tmp, 'stream.mjpeg')
+        _write_test_video(path, 12)
+        plan = scan_video._plan_segments(path, segment_seconds=1)
+        self.assertEqual(len(plan), 1)
+        start, end, fps = plan[0]
+        self.assertEqual((start, end), (0, None))
+        self.assertEqual([n for n, _ in self._scanned_frames(path, start, end, fps)], list(range(12)))
+
+    def test_checkpoint_only_resumes_with_the_same_stride_and_segments(self):
+        path = os.path.join(self.tmp, 'clip.avi')
+        _write_test_video(path, 30)
+        checkpoint = os.path.join(self.tmp, 'scan.json')
+        command = scan_video.Command()
+        command._save_checkpoint(checkpoint, {f"{path}|0": 0}, {'stride': 5, 'segment_seconds': 1})
+
+        self.assertEqual(command._load_checkpoint(checkpoint, {'stride': 5, 'segment_seconds': 1}), {f"{path}|0": 0})
+        for changed in (['--stride', '3'], ['--segment-seconds', '2']):
+            with self.assertRaisesMessage(CommandError, 'Resume with the same options'):
+                call_command('scan_video', path, '--checkpoint', checkpoint, '--segment-seconds', '1', '--stride', '5',
+                             *changed, stdout=io.StringIO())
+
+
+# --- Multi-Scale Detection ---
+
+class _BlobDetector:
+    """Detector stand-in: every bright blob is a face, unless the image is larger than one tile (a far-field miss)."""
+
+    def __init__(self, max_side=None):
+        self.max_side = max_side
+        self.calls = []
+
+    def detect(self, img, max_num=0, metric='default'):
+        self.calls.append(img.shape[:2])
+        if self.max_side and max(img.shape[:2]) > self.max_side:
+            return np.zeros((0, 5), np.float32), np.zeros((0, 5, 2), np.float32)
+        n, _, stats, _ = cv2.connectedComponentsWithStats((img[:, :, 0] > 128).astype(np.uint8))
+        boxes = [[x, y, x + w, y + h, 0.9] for x, y, w, h, _ in stats[1:]]
+        kps = [[[x1 + (x2 - x1) * fx, y1 + (y2 - y1) * fy] for fx, fy in ((0.3, 0.4), (0.7, 0.4), (0.5, 0.6),
+                                                                         (0.35, 0.8), (0.65, 0.8))]
+               for x1, y1, x2, y2, _ in boxes]
+        return np.array(boxes, np.float32).reshape(-1, 5), np.array(kps, np.float32).reshape(-1, 5, 2)
+
+
+class MultiScaleDetectionTests(SimpleTestCase):
+
+    def _app(self, detector):
+        recognition = SimpleNamespace(get=lambda img, face: face.__setitem__('embedding', np.ones(512)))
+        return SimpleNamespace(det_model=detector, models={'detection': detector, 'recognition': recognition})
+
+    def test_nms_keeps_the_best_of_overlaps_and_the_whole_of_contained_boxes(self):
+        boxes = np.array([
+            [100, 100, 200, 200],   # 0: face
+            [105, 105, 205, 205],   # 1: same face, lower score -> suppressed by IoU
+            [400, 100, 500, 200],   # 2: whole face cut by a tile edge...
+            [400, 100, 450, 200],   # 3: ...and its left half, scoring higher -> the larger box wins
+            [700, 100, 800, 200],   # 4: unrelated face
+        ], dtype=np.float32)
+        scores = np.array([0.9, 0.8, 0.7, 0.95, 0.6])
+        self.assertEqual(sorted(nms(boxes, scores)), [0, 2, 4])
+        self.assertEqual(nms(np.zeros((0, 4)), np.zeros(0)), [])
+
+    def test_tiles_cover_the_rois_and_stay_in_the_frame(self):
+        frame_w, frame_h = 3840, 2160
+        rois = [(3000, 1500, 1500, 1000),   # runs past the right and bottom edges
+                (-200, -100, 900, 500)]     # starts above and left of the frame
+        tiles = tiles_for_rois(rois, frame_w, frame_h, tile_size=640, overlap=0.25, max_tiles=50)
+
+        covered = np.zeros((frame_h, frame_w), bool)
+        for tx, ty, tw, th in tiles:
+            self.assertTrue(0 <= tx and 0 <= ty and tx + tw <= frame_w and ty + th <= frame_h, (tx, ty, tw, th))
+            self.assertTrue(0 < tw <= 640 and 0 < th <= 640)
+            covered[ty:ty + th, tx:tx + tw] = True
+        self.assertTrue(covered[1500:, 3000:].all())
+        self.assertTrue(covered[:400, :700].all())
+        self.assertEqual(tiles[0][:2], (3000, 1500))   # largest ROI first
+
+        self.assertEqual(len(tiles_for_rois(rois, frame_w, frame_h, max_tiles=3)), 3)
+        self.assertEqual(tiles_for_rois([(4000, 0, 100, 100)], frame_w, frame_h), [])   # outside the frame
+
+    def test_tile_detections_map_back_to_full_frame_coordinates(self):
+        img = np.zeros((2160, 3840, 3), np.uint8)
+        img[1310:1350, 2105:2137] = 255   # a 32x40 far-field face the coarse pass misses
+        img[600:700, 1150:1230] = 255     # a face crossed by the left edge of the tile at x=1180
+        detector = _BlobDetector(max_side=640)
+
+        faces = detect_faces_multiscale(self._app(detector), img, [(1900, 1200, 400, 300), (700, 500, 700, 300)])
+
+        self.assertEqual(detector.calls[0], (2160, 3840))   # coarse pass on the whole frame
+        self.assertEqual(len(detector.calls), 4)            # + one tile, then two across x=1180
+        self.assertEqual(sorted(face.bbox.tolist() for face in faces),
+                         [[1150, 600, 1230, 700], [2105, 1310, 2137, 1350]])
+        for face in faces:
+            x1, y1, x2, y2 = face.bbox
+            self.assertTrue((face.kps[:, 0] > x1).all() and (face.kps[:, 0] < x2).all())
+            self.assertTrue((face.kps[:, 1] > y1).all() and (face.kps[:, 1] < y2).all())
+            self.assertIsNotNone(face.embedding)
+
+    def test_motion_rois_are_in_full_frame_pixels(self):
+        finder = MotionRoiFinder(padding=0)
+        frame = np.zeros((2160, 3840, 3), np.uint8)
+        self.assertEqual(finder.find(frame), [])   # nothing to compare with yet
+
+        moved = frame.copy()
+        moved[1080:1320, 1920:2160] = 255
+        (x, y, w, h), = finder.find(moved)
+        # the work copy is 1/12 scale, so a few work pixels of blur and dilation either side
+        self.assertTrue(1920 - 120 <= x <= 1920 and 2160 <= x + w <= 2160 + 120, (x, w))
+        self.assertTrue(1080 - 120 <= y <= 1080 and 1320 <= y + h <= 1320 + 120, (y, h))
+
+
+# --- Small-Face Refinement ---
+
+class _StubRecognition:
+    """ArcFace stand-in: the feature is the aligned face at 16x16, so it tracks the crop's pixels."""
+    input_size = (112, 112)
+
+    def get_feat(self, imgs):
+        feats = np.stack([cv2.resize(img, (16, 16), interpolation=cv2.INTER_AREA).astype(np.float32).ravel()
+                          for img in imgs])
+        return feats - feats.mean(axis=1, keepdims=True)
+
+
+class SmallFaceRefinementTests(SimpleTestCase):
+
+    def test_region_embedding_matches_full_decode(self):
+        rng = np.random.default_rng(7)
+        texture = cv2.resize(rng.integers(0, 256, (48, 64, 3), dtype=np.uint8), (5120, 3840),
+                             interpolation=cv2.INTER_CUBIC)
+        ok, jpg = cv2.imencode('.jpg', texture, [cv2.IMWRITE_JPEG_QUALITY, 95])
+        data = jpg.tobytes()
+
+        reduced, scale = decode_image(data)
+        self.assertEqual(scale, 8.0)
+        # Two faces, 240px and 400px at full resolution: 30px and 50px in the 1/8 decode
+        faces, expected = [], []
+        full = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        recognition = _StubRecognition()
+        for x, y, side in ((1000, 900, 240), (3600, 2900, 400)):
+            kps = np.array([[0.34, 0.46], [0.66, 0.46], [0.5, 0.64], [0.37, 0.82], [0.63, 0.82]]) * side + (x, y)
+            faces.append(Face(bbox=np.array([x, y, x + side, y + side], dtype=np.float32) / scale,
+                              kps=kps / scale, embedding=np.ones(512, dtype=np.float32)))
+            feature = recognition.get_feat([face_align.norm_crop(full, landmark=kps, image_size=112)])[0]
+            expected.append(feature / np.linalg.norm(feature))
+        del full
+
+        model = SimpleNamespace(models={'recognition': recognition})
+        with patch('cases.ai_processor.decode_regions', wraps=ai_processor.decode_regions) as decode_regions:
+            refined = ai_processor._refine_small_face_embeddings(faces, data, scale, model)
+        decode_regions.assert_called_once()
+        self.assertEqual(decode_regions.call_args.kwargs['factor'], 2)   # 240px / 2 still >= 112px
+        for got, want in zip(refined, expected):
+            self.assertGreater(float(np.dot(got, want)), 0.99)
+
+
+# --- In-Memory Embedding Gallery ---
+
+class GalleryTests(TestCase):
+
+    def setUp(self):
+        for patcher in (patch.dict(gallery._galleries, clear=True), patch.object(gallery, 'GALLERY_REFRESH_SECONDS', 0),
+                        patch.object(ai_processor, '_serving_version', None)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.a, self.b = self._case('A'), self._case('B')
+
+    def _case(self, name):
+        return Case.objects.create(guardian_name='Guardian', guardian_relationship='Parent', guardian_phone='1',
+                                   guardian_address='Address', missing_name=name)
+
+    def _embed(self, case, vector, model_version='v-old'):
+        FaceEmbedding.bulk_upsert([FaceEmbedding(case=case, model_version=model_version, embedding_vector=vector)])
+
+    def _best(self, vector, model_version='v-old'):
+        current = gallery.get_gallery(model_version)
+        (row,), (similarity,) = current.search([vector])
+        return current.case_ids[row[0]], round(float(similarity[0]), 3)
+
+    def test_added_deleted_and_reembedded_cases_reload_the_gallery(self):
+        self._embed(self.a, [1, 0, 0, 0])
+        self._embed(self.b, [0, 1, 0, 0])
+        self.assertEqual(len(gallery.get_gallery('v-old')), 2)
+
+        c = self._case('C')
+        self._embed(c, [0, 0, 1, 0])
+        self.assertEqual(self._best([0, 0, 1, 0]), (c.pk, 1.0))
+
+        self.b.delete()
+        self.assertNotIn(self.b.pk, gallery.get_gallery('v-old').case_ids)
+        self.assertEqual(len(gallery.get_gallery('v-old')), 2)
+
+        self._embed(self.a, [0, 0, 0, 2])   # re-embedded: same row count, newer updated_at
+        self.assertEqual(self._best([0, 0, 0, 1]), (self.a.pk, 1.0))
+
+    def test_stale_gallery_is_kept_within_the_refresh_interval(self):
+        self._embed(self.a, [1, 0, 0, 0])
+        loaded = gallery.get_gallery('v-old')
+        with patch.object(gallery, 'GALLERY_REFRESH_SECONDS', 60):
+            self._embed(self.b, [0, 1, 0, 0])
+            self.assertIs(gallery.get_gallery('v-old'), loaded)
+        self.assertEqual(len(gallery.get_gallery('v-old')), 2)
+
+    def test_matching_follows_the_version_switch(self):
+        # The two versions embed the same people into unrelated spaces
+        self._embed(self.a, [1, 0, 0, 0], 'v-old')
+        self._embed(self.b, [0, 1, 0, 0], 'v-old')
+        self._embed(self.a, [0, 1, 0, 0], 'v-new')
+        self._embed(self.b, [0, 0, 1, 0], 'v-new')
+        EmbeddingModelVersion.activate('v-old')
+
+        face = Face(bbox=np.array([10, 10, 60, 60], np.float32), kps=None, det_score=0.9,
+                    embedding=np.array([0, 1, 0, 0], np.float32))
+        model = SimpleNamespace(get=Mock(return_value=[face]))
+        frame = np.zeros((100, 100, 3), np.uint8)
+        with patch.dict(ai_processor._loaded_models, {'v-old': model, 'v-new': model}):
+            before = ai_processor.match_faces_in_image(frame)
+            EmbeddingModelVersion.activate('v-new')
+            after = ai_processor.match_faces_in_image(frame)
+
+        self.assertEqual([m['case_id'] for m in before], [self.b.complaint_id])
+        self.assertEqual([m['case_id'] for m in after], [self.a.complaint_id])
+        self.assertEqual(self._best([0, 1, 0, 0], 'v-old'), (self.b.pk, 1.0))   # the old matrix is untouched
+
+
+# --- Image Embedding Cache ---
+
+class EmbeddingCacheTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.media = override_settings(MEDIA_ROOT=self.media_root)
+        self.media.enable()
+        self.addCleanup(self.media.disable)
+        ok, jpg = cv2.imencode('.jpg', np.full((120, 100, 3), 90, np.uint8))
+        for name in ('a.jpg', 'copy_of_a.jpg'):
+            with open(os.path.join(self.media_root, name), 'wb') as f:
+                f.write(jpg.tobytes())
+
+    def _model(self, faces):
+        model = SimpleNamespace(get=Mock(return_value=faces))
+        return model, patch('cases.ai_processor.load_ai_models', return_value=model)
+
+    def _face(self):
+        return Face(bbox=np.array([10, 10, 90, 110], np.float32), kps=None, det_score=0.9,
+                    embedding=np.arange(1, 513, dtype=np.float32))
+
+    def test_same_bytes_and_version_skip_the_model(self):
+        model, loaded = self._model([self._face()])
+        with loaded:
+            first = ai_processor.generate_embedding_from_image('a.jpg')
+            again = ai_processor.generate_embedding_from_image('a.jpg')
+            renamed = ai_processor.generate_embedding_from_image('copy_of_a.jpg')   # keyed by content, not name
+        self.assertEqual(model.get.call_count, 1)
+        self.assertEqual(len(first), 512)
+        self.assertEqual(again, first)
+        self.assertEqual(renamed, first)
+
+    def test_no_face_is_cached_as_no_face(self):
+        model, loaded = self._model([])
+        with loaded:
+            self.assertIsNone(ai_processor.generate_embedding_from_image('a.jpg'))
+            self.assertIsNone(ai_processor.generate_embedding_from_image('a.jpg'))
+        self.assertEqual(model.get.call_count, 1)
+        self.assertIsNone(ImageEmbeddingCache.objects.get().embedding_vector)
+        self.assertEqual(ai_processor.cached_case_embedding(['a.jpg']), (None, 0))
+
+    def test_another_model_version_misses_the_cache(self):
+        model, loaded = self._model([self._face()])
+        versions = patch.dict(ai_processor.FACE_MODEL_VERSIONS, {'v-new': {'pack': 'antelopev2', 'det_size': (640, 640)}})
+        with loaded, versions:
+            ai_processor.generate_embedding_from_image('a.jpg')
+            ai_processor.generate_embedding_from_image('a.jpg', model_version='v-new')
+            self.assertIsNone(ai_processor.cached_case_embedding(['a.jpg'], 'v-other'))
+        self.assertEqual(model.get.call_count, 2)
+        self.assertEqual(sorted(ImageEmbeddingCache.objects.values_list('model_version', flat=True)),
+                         sorted([ai_processor.DEFAULT_MODEL_VERSION, 'v-new']))
+
+
+# --- Embedding Rebuild / Cut-Over ---
+
+class RebuildEmbeddingsTests(TestCase):
+    """rebuild_embeddings with every photo served by a stubbed model (no worker pool)."""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        self.media = override_settings(MEDIA_ROOT=self.tmp)
+        self.media.enable()
+        self.addCleanup(self.media.disable)
+        models = patch.dict(ai_processor.FACE_MODEL_VERSIONS, {'v-new': {'pack': 'buffalo_l', 'det_size': (640, 640)}})
+        models.start()
+        self.addCleanup(models.stop)
+        self.checkpoint = os.path.join(self.tmp, 'rebuild.json')
+
+        EmbeddingModelVersion.activate('v-old')
+        self.cases = []
+        for i in range(4):
+            case = Case.objects.create(guardian_name='Guardian', guardian_relationship='Parent', guardian_phone='1',
+                                       guardian_address='Address', missing_name=f'Person {i}')
+            CasePhoto.objects.create(case=case, image=SimpleUploadedFile(f'face{i}.gif', TINY_IMAGE))
+            FaceEmbedding.objects.create(case=case, model_version='v-old', embedding_vector=[1.0, 0.0])
+            self.cases.append(case)
+        self.embedded = []
+
+    def _model(self, no_face=(), crash_after=None):
+        """Stub for cached_case_embedding: [0, 1] for every case, None for `no_face`, dies after `crash_after` cases."""
+        def embed(image_paths, model_version):
+            case = CasePhoto.objects.get(image=os.path.relpath(image_paths[0], self.tmp)).case
+            if crash_after is not None and len(self.embedded) >= crash_after:
+                raise KeyboardInterrupt
+            self.embedded.append(case.pk)
+            return (None, 0) if case in no_face else ([0.0, 1.0], 1)
+        return patch('cases.ai_processor.cached_case_embedding', side_effect=embed)
+
+    def _rebuild(self, *args):
+        call_command('rebuild_embeddings', '--model-version', 'v-new', '--batch-size', '1',
+                     '--checkpoint', self.checkpoint, *args, stdout=io.StringIO(), stderr=io.StringIO())
+
+    def test_switch_over_is_refused_while_a_case_lacks_the_new_embedding(self):
+        with self._model(no_face=[self.cases[2]]), self.assertRaisesMessage(CommandError, self.cases[2].complaint_id):
+            self._rebuild()
+        self.assertEqual(ai_processor.active_model_version(), 'v-old')
+        self.assertEqual(EmbeddingModelVersion.objects.get(name='v-new').missing_case_ids(), {self.cases[2].pk})
+
+        with self._model(no_face=[self.cases[2]]):
+            self._rebuild('--force')
+        self.assertEqual(ai_processor.active_model_version(), 'v-new')
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_resumed_run_skips_the_batches_already_done(self):
+        with self._model(crash_after=2), self.assertRaises(KeyboardInterrupt):
+            self._rebuild()
+        first_run = list(self.embedded)
+        self.assertEqual(len(first_run), 2)
+        self.assertEqual(ai_processor.active_model_version(), 'v-old')
+        with open(self.checkpoint) as f:
+            self.assertEqual(sorted(json.load(f)['done']), sorted(first_run))
+
+        self.embedded.clear()
+        with self._model():
+            self._rebuild()
+        self.assertEqual(sorted(self.embedded), sorted(c.pk for c in self.cases if c.pk not in first_run))
+        self.assertEqual(FaceEmbedding.objects.filter(model_version='v-new').count(), 4)
+        self.assertEqual(ai_processor.active_model_version(), 'v-new')
+
+
+# --- Sightings Store ---
+
+class SightingTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.media = override_settings(MEDIA_ROOT=self.media_root)
+        self.media.enable()
+        self.addCleanup(self.media.disable)
+        recent = patch.dict(sightings._recent, clear=True)
+        recent.start()
+        self.addCleanup(recent.stop)
+        self.version = ai_processor.active_model_version()
+        self.face = np.eye(4, dtype=np.float32)[0] + np.float32(0.1)   # the person enrolled later
+
+    def _sight(self, embedding, days_ago=0, camera_id='gate', **fields):
+        sightings.record_sightings([{'embedding': embedding, 'det_score': 0.9, 'model_version': self.version,
+                                     'face_jpeg': TINY_IMAGE}], camera_id=camera_id, **fields)
+        sighting = Sighting.objects.latest('pk')
+        if days_ago:
+            seen_at = timezone.now() - timedelta(days=days_ago)
+            Sighting.objects.filter(pk=sighting.pk).update(seen_at=seen_at, seen_on=timezone.localdate(seen_at))
+        return sighting
+
+    def test_search_scans_every_day_in_the_window_best_first(self):
+        today = self._sight(self.face)
+        earlier = self._sight(self.face * 0.9 + np.eye(4, dtype=np.float32)[1] * 0.2, days_ago=3, camera_id='market')
+        self._sight(np.eye(4, dtype=np.float32)[2], days_ago=1, camera_id='bus')         # someone else
+        self._sight(self.face, days_ago=sightings.RETENTION_DAYS + 1, camera_id='old')   # past retention
+
+        hits = sightings.search_sightings(self.face, self.version, threshold=0.9)
+        self.assertEqual([pk for pk, _ in hits], [today.pk, earlier.pk])
+        self.assertAlmostEqual(hits[0][1], 1.0, places=5)
+        self.assertEqual(sightings.search_sightings(self.face, 'other-version', threshold=0.9), [])
+
+    def test_repeat_faces_on_one_camera_are_stored_once(self):
+        self._sight(self.face)
+        self._sight(self.face * 1.01)
+        self._sight(self.face, camera_id='market')
+        self.assertEqual(Sighting.objects.count(), 2)
+
+    def test_purge_drops_sightings_past_retention_with_their_crops(self):
+        expired = self._sight(self.face, days_ago=sightings.RETENTION_DAYS + 1)
+        kept = self._sight(self.face, days_ago=sightings.RETENTION_DAYS - 1, camera_id='market')
+        crop = os.path.join(self.media_root, expired.face_image.name)
+        self.assertTrue(os.path.exists(crop))
+
+        self.assertEqual(sightings.purge_expired(), 1)
+        self.assertEqual(list(Sighting.objects.values_list('pk', flat=True)), [kept.pk])
+        self.assertFalse(os.path.exists(crop))
+
+    def test_case_enrolled_later_matches_an_earlier_sighting(self):
+        sighting = self._sight(self.face, days_ago=2, latitude='18.520000', longitude='73.850000')
+        case = Case.objects.create(guardian_name='Guardian', guardian_relationship='Parent', guardian_phone='1',
+                                   guardian_address='Address', missing_name='Person')
+        FaceEmbedding.objects.create(case=case, model_version=self.version, embedding_vector=self.face.tolist())
+
+        retroactive_match_case(case.pk)
+
+        sighting.refresh_from_db()
+        self.assertEqual(sighting.matched_case, case)
+        evidence = CasePhoto.objects.get(case=case, is_detection_evidence=True)
+        self.assertEqual(evidence.uploaded_at, sighting.seen_at)   # dated when the camera saw the face
+        alert = DetectionAlert.objects.get(case=case)
+        self.assertTrue(alert.is_retroactive)
+        self.assertEqual(OutboxMessage.objects.get(kind='detection_alert').payload['photo_pk'], evidence.pk)
+
+        retroactive_match_case(case.pk)   # already matched: no second alert
+        self.assertEqual(DetectionAlert.objects.filter(case=case).count(), 1)
+
+
+# --- Duplicate Case Detection ---
+
+def _unit(degrees):
+    """A unit vector `degrees` round from the first axis, in 4-D."""
+    angle = np.radians(degrees)
+    return np.array([np.cos(angle), np.sin(angle), 0, 0], dtype=np.float32)
+
+
+class DuplicateCaseTests(TestCase):
+
+    def setUp(self):
+        for patcher in (patch.dict(gallery._galleries, clear=True), patch.object(gallery, 'GALLERY_REFRESH_SECONDS', 0)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        officer = get_user_model().objects.create_user('officer@example.com', 'secret')
+        self.client.force_login(officer)
+
+    def _case(self, name, vector):
+        case = Case.objects.create(guardian_name='Guardian', guardian_relationship='Parent', guardian_phone='1',
+                                   guardian_address='Address', missing_name=name)
+        FaceEmbedding.bulk_upsert([FaceEmbedding(case=case, model_version='v1', embedding_vector=vector.tolist())])
+        return case
+
+    def test_blocked_self_join_finds_each_pair_once(self):
+        rng = np.random.default_rng(7)
+        matrix = rng.normal(size=(7, 16)).astype(np.float32)
+        matrix[5] = matrix[0] + 0.05 * rng.normal(size=16)   # pairs that straddle block edges
+        matrix[6] = matrix[2] + 0.05 * rng.normal(size=16)
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+
+        full = matrix @ matrix.T
+        expected = {(i, j) for i in range(7) for j in range(i + 1, 7) if full[i, j] >= 0.9}
+        for block_size in (2, 3, 2048):
+            pair_i, pair_j, sims = find_duplicate_pairs(matrix, 0.9, block_size=block_size)
+            self.assertEqual(sorted(zip(pair_i.tolist(), pair_j.tolist())), sorted(expected))
+            np.testing.assert_allclose(sims, full[pair_i, pair_j], rtol=1e-5)
+        self.assertEqual(expected, {(0, 5), (2, 6)})
+
+    def test_clusters_are_transitive(self):
+        # A~B and B~C at 40 degrees apart, but A and C (80 degrees) are not similar themselves
+        matrix = np.stack([_unit(0), _unit(40), _unit(80), _unit(180)])
+        pair_i, pair_j, _ = find_duplicate_pairs(matrix, 0.7)
+        self.assertEqual(list(zip(pair_i.tolist(), pair_j.tolist())), [(0, 1), (1, 2)])
+        self.assertEqual(duplicate_clusters(4, pair_i, pair_j), [[0, 1, 2]])
+
+    def test_pairs_are_stored_low_pk_first_and_listed_once(self):
+        older, newer = self._case('Older', _unit(0)), self._case('Newer', _unit(10))
+        self._case('Stranger', _unit(90))
+
+        self.assertEqual(flag_duplicates_for_case(newer.pk, _unit(10), 'v1'), 1)
+        self.assertEqual(flag_duplicates_for_case(older.pk, _unit(0), 'v1'), 1)
+        call_command('find_duplicate_cases', model_version='v1', save=True, stdout=io.StringIO())
+
+        pair = DuplicateCaseCandidate.objects.get()
+        self.assertEqual((pair.case, pair.duplicate_of), (older, newer))
+        for case, other in ((older, newer), (newer, older)):
+            listed = self.client.get(reverse('cases:detail', args=[case.pk])).context['possible_duplicates']
+            self.assertEqual([dup['case'] for dup in listed], [other])
+
+
+# --- Live-Match Evidence Windows ---
+
+@skipUnless(shared_state.available(), 'needs the Redis server of REDIS_STATE_URL')
+class EvidenceWindowTests(SimpleTestCase):
+
+    def setUp(self):
+        self.camera = f"test-cam-{uuid.uuid4().hex[:8]}"
+        self.addCleanup(shared_state.get_redis().delete, evidence._key(self.camera, 'MP-1'))
+
+    def _observe(self, similarity, now):
+        return evidence.observe(self.camera, 'MP-1', similarity, now=now)
+
+    def test_confirms_after_min_hits_and_starts_over(self):
+        states = [self._observe(0.75, now=100 + n)['state'] for n in range(evidence.MIN_HITS)]
+        self.assertEqual(states, [evidence.PENDING] * (evidence.MIN_HITS - 1) + [evidence.CONFIRMED])
+
+        after = self._observe(0.75, now=100 + evidence.MIN_HITS)
+        self.assertEqual((after['state'], after['hits']), (evidence.PENDING, 1))   # window was reset
+
+    def test_instant_score_and_low_mean(self):
+        self.assertEqual(self._observe(evidence.INSTANT_SCORE, now=100)['state'], evidence.CONFIRMED)
+        results = [self._observe(0.70, now=200 + n) for n in range(evidence.MIN_HITS + 1)]
+        self.assertEqual({r['state'] for r in results}, {evidence.PENDING})        # mean below CONFIRM_SCORE
+        self.assertAlmostEqual(results[-1]['score'], 0.70)
+
+    def test_old_hits_decay_out_of_the_window(self):
+        for n in range(evidence.MIN_HITS - 1):
+            self._observe(0.80, now=100 + n)
+        late = self._observe(0.80, now=100 + evidence.MIN_HITS + evidence.WINDOW_SECONDS)
+        self.assertEqual((late['state'], late['hits']), (evidence.PENDING, 1))
+
+    def test_concurrent_frames_all_count_and_confirm_once(self):
+        barrier = threading.Barrier(evidence.MIN_HITS * 2)
+        results = []
+
+        def frame():
+            barrier.wait()
+            results.append(self._observe(0.80, now=time.time()))
+
+        threads = [threading.Thread(target=frame) for _ in range(evidence.MIN_HITS * 2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(sum(r['state'] == evidence.CONFIRMED for r in results), 2)
+
+
+# --- Geo Utilities ---
+
+class GeoTests(SimpleTestCase):
+
+    def test_bounding_box_near_a_pole_spans_every_longitude(self):
+        min_lat, max_lat, min_lon, max_lon = geo.bounding_box(89.9, 10.0, 50.0)
+        self.assertEqual((max_lat, min_lon, max_lon), (90.0, -180.0, 180.0))
+        self.assertAlmostEqual(min_lat, 89.9 - 50.0 / geo.KM_PER_DEGREE_LAT)
+
+    def test_bounding_box_across_the_antimeridian_spans_every_longitude(self):
+        self.assertEqual(geo.bounding_box(-17.7, 179.9, 30.0)[2:], (-180.0, 180.0))  # Fiji
+        min_lat, max_lat, min_lon, max_lon = geo.bounding_box(18.52, 73.86, 25.0)   # Pune
+        self.assertTrue(73.5 < min_lon < 73.86 < max_lon < 74.2)
+        self.assertAlmostEqual(max_lat - min_lat, 50.0 / geo.KM_PER_DEGREE_LAT)
+
+    def test_within_radius_matches_a_full_scan(self):
+        rng = np.random.default_rng(1)
+        coords = np.column_stack([rng.uniform(17.5, 19.5, 5000), rng.uniform(72.8, 74.8, 5000)])
+        coords[0] = (-17.7, -179.95)                                   # 10 km across the antimeridian
+        all_dist = geo.distances_from(18.52, 73.86, coords)
+
+        indices, dist = geo.within_radius(18.52, 73.86, coords, 25.0)
+        self.assertEqual(sorted(indices.tolist()), np.flatnonzero(all_dist <= 25.0).tolist())
+        self.assertTrue((np.diff(dist) >= 0).all())                   # closest first
+        self.assertEqual(geo.within_radius(-17.7, 179.95, coords, 15.0)[0].tolist(), [0])
+
+
+# --- Pooled SMTP Mailer ---
+
+class _SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib: accepts every message and records it."""
+
+    def handle(self):
+        server = self.server
+        server.sessions.append(self.connection)
+        self.wfile.write(b"220 sink ready\r\n")
+        while True:
+            try:
+                line = self.rfile.readline()
+            except OSError:   # connection dropped by drop_all_connections()
+                return
+            if not line:
+                return
+            command = line.decode().strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self.wfile.write(b"250 sink\r\n")
+            elif command == "DATA":
+                self.wfile.write(b"354 end with .\r\n")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                server.messages += 1
+                self.wfile.write(b"250 queued\r\n")
+            elif command == "QUIT":
+                self.wfile.write(b"221 bye\r\n")
+                return
+            else:  # MAIL, RCPT, RSET, NOOP
+                self.wfile.write(b"250 ok\r\n")
+
+
+class _SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _SMTPSinkHandler)
+        self.sessions = []
+        self.messages = 0
+
+    def drop_all_connections(self):
+        for sock in self.sessions:
+            try:
+                sock.shutdown(2)
+            except OSError:
+                pass
+
+
+class PooledMailerTests(SimpleTestCase):
+
+    def setUp(self):
+        self.sink = _SMTPSink()
+        threading.Thread(target=self.sink.serve_forever, daemon=True).start()
+        self.smtp_settings = override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1', EMAIL_PORT=self.sink.server_address[1],
+            EMAIL_USE_TLS=False, EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD='',
+        )
+        self.smtp_settings.enable()
+
+    def tearDown(self):
+        self.smtp_settings.disable()
+        self.sink.shutdown()
+        self.sink.server_close()
+
+    def _messages(self, n):
+        return [EmailMessage(f"Alert {i}", "body", "alerts@example.com", ["officer@example.com"]) for i in range(n)]
+
+    def test_batch_is_drained_over_one_connection(self):
+        mailer = PooledMailer()
+        results = mailer.send_many(self._messages(25))
+        mailer.send(self._messages(1)[0])   # later sends reuse the same session
+        mailer.close()
+
+        self.assertEqual(results, [None] * 25)
+        self.assertEqual(self.sink.messages, 26)
+        self.assertEqual(mailer.connects, 1)
+        self.assertEqual(len(self.sink.sessions), 1)
+
+    def test_reconnects_after_server_drops_connection(self):
+        mailer = PooledMailer()
+        mailer.send_many(self._messages(3))
+        self.sink.drop_all_connections()
+
+        results = mailer.send_many(self._messages(3))
+        mailer.close()
+
+        self.assertEqual(results, [None] * 3)
+        self.assertEqual(self.sink.messages, 6)
+        self.assertEqual(mailer.connects, 2)
+
+
+# --- Notification Outbox ---
+
+@skipUnless(shared_state.available(), 'needs the Redis server of REDIS_STATE_URL')
+class OutboxTests(TestCase):
+
+    def setUp(self):
+        recipients = ('officer@example.com', 'station@example.com', 'a@example.com', 'b@example.com', 'c@example.com')
+        shared_state.get_redis().delete(*[TokenBucket()._key(r) for r in recipients])
+        mail.outbox = []
+
+    def _email(self, payload):
+        return EmailMessage("Alert", "body", "alerts@example.com", [payload['to']])
+
+    def test_transient_failure_is_retried_with_backoff(self):
+        calls = []
+
+        def flaky(payload):
+            calls.append(payload)
+            if len(calls) == 1:
+                raise ConnectionError("SMTP server went away")
+            return self._email(payload)
+
+        message = OutboxMessage.objects.create(kind='alert', payload={'to': 'officer@example.com'})
+        self.assertEqual(dispatch_due({'alert': flaky}), {'sent': 0, 'retried': 1, 'deferred': 0, 'failed': 0})
+
+        message.refresh_from_db()
+        self.assertEqual(message.status, OutboxMessage.Status.PENDING)
+        self.assertEqual(message.attempts, 1)
+        self.assertGreater(message.next_attempt_at, timezone.now())
+        self.assertIn("SMTP server went away", message.last_error)
+        self.assertEqual(dispatch_due({'alert': flaky})['sent'], 0)   # not due yet
+
+        OutboxMessage.objects.filter(pk=message.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(dispatch_due({'alert': flaky})['sent'], 1)
+        message.refresh_from_db()
+        self.assertEqual(message.status, OutboxMessage.Status.SENT)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_recipient_rate_limit_defers_instead_of_dropping(self):
+        for _ in range(3):
+            OutboxMessage.objects.create(kind='alert', payload={'to': 'officer@example.com'})
+        OutboxMessage.objects.create(kind='alert', payload={'to': 'station@example.com'})
+
+        counts = dispatch_due({'alert': self._email}, bucket=TokenBucket(capacity=2, rate_per_hour=60))
+
+        self.assertEqual(counts, {'sent': 3, 'retried': 0, 'deferred': 1, 'failed': 0})
+        deferred = OutboxMessage.objects.get(status=OutboxMessage.Status.PENDING)
+        self.assertEqual(deferred.payload['to'], 'officer@example.com')
+        self.assertEqual(deferred.attempts, 0)
+        self.assertGreater(deferred.next_attempt_at, timezone.now())
+
+    def test_concurrent_takes_never_overdraw_a_bucket(self):
+        recipient = f"burst-{uuid.uuid4().hex[:8]}@example.com"
+        bucket = TokenBucket(capacity=5, rate_per_hour=1)
+        self.addCleanup(shared_state.get_redis().delete, bucket._key(recipient))
+        barrier = threading.Barrier(12)
+        results = []
+
+        def take():
+            barrier.wait()
+            results.append(bucket.take([recipient]))
+
+        threads = [threading.Thread(target=take) for _ in range(12)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(results), 12)
+        self.assertEqual(results.count(0), 5)
+
+    def test_unknown_kind_fails_without_stopping_the_run(self):
+        unknown = OutboxMessage.objects.create(kind='retired_kind', payload={'to': 'officer@example.com'})
+        OutboxMessage.objects.create(kind='alert', payload={'to': 'officer@example.com'})
+
+        self.assertEqual(dispatch_due({'alert': self._email}), {'sent': 1, 'retried': 0, 'deferred': 0, 'failed': 1})
+        unknown.refresh_from_db()
+        self.assertEqual(unknown.status, OutboxMessage.Status.FAILED)
+        self.assertIn('retired_kind', unknown.last_error)
+
+    def test_rate_limiter_outage_sends_unthrottled(self):
+        for to in ('officer@example.com', 'station@example.com'):
+            OutboxMessage.objects.create(kind='alert', payload={'to': to})
+        bucket = TokenBucket()
+        with patch.object(bucket, 'take', side_effect=redis.ConnectionError("Connection refused")):
+            counts = dispatch_due({'alert': self._email}, bucket=bucket)
+        self.assertEqual(counts, {'sent': 2, 'retried': 0, 'deferred': 0, 'failed': 0})
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_due_messages_are_sent_as_one_batch(self):
+        for to in ('a@example.com', 'b@example.com', 'c@example.com'):
+            OutboxMessage.objects.create(kind='alert', payload={'to': to})
+
+        with patch('cases.outbox.get_mailer') as get_mailer:
+            get_mailer.return_value.send_many.return_value = [None, ConnectionError("dropped"), None]
+            counts = dispatch_due({'alert': self._email})
+
+        (batch,), _ = get_mailer.return_value.send_many.call_args
+        self.assertEqual([email.to for email in batch], [['a@example.com'], ['b@example.com'], ['c@example.com']])
+        self.assertEqual(counts, {'sent': 2, 'retried': 1, 'deferred': 0, 'failed': 0})
+        self.assertEqual(OutboxMessage.objects.get(status=OutboxMessage.Status.PENDING).payload['to'], 'b@example.com')
+
+
+# --- Photo Thumbnails ---
+
+class ThumbnailTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.media = override_settings(MEDIA_ROOT=self.media_root)
+        self.media.enable()
+        officer = get_user_model().objects.create_user('officer@example.com', 'secret')
+        case = Case.objects.create(guardian_name='Guardian', guardian_relationship='Parent', guardian_phone='1',
+                                   guardian_address='Address', missing_name='Person', police_officer=officer)
+        buffer = io.BytesIO()
+        Image.new('RGB', (800, 600), (200, 40, 40)).save(buffer, 'JPEG')
+        self.photo = CasePhoto.objects.create(case=case, image=SimpleUploadedFile('upload.jpg', buffer.getvalue()))
+
+    def tearDown(self):
+        self.media.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def test_derivatives_are_content_hashed_and_never_upscaled(self):
+        self.assertEqual(responsive_photo(self.photo).count('<img'), 1)   # original until the task runs
+
+        derivatives = generate_for_photo(self.photo)
+        self.assertEqual([w for w, _ in derivatives['jpeg']], [160, 320, 640, 800])
+        self.assertEqual([w for w, _ in derivatives['webp']], [160, 320, 640, 800])
+        for width, name in derivatives['webp']:
+            with Image.open(os.path.join(self.media_root, name)) as img:
+                self.assertEqual((img.format, img.width), ('WEBP', width))
+
+        self.assertEqual(generate_for_photo(self.photo), derivatives)   # same bytes, same names
+        self.photo.refresh_from_db()
+        html = responsive_photo(self.photo, sizes='80px', data_bs_toggle='modal')
+        self.assertIn('type="image/webp"', html)
+        self.assertIn(' 640w', html)
+        self.assertIn('loading="lazy"', html)
+        self.assertIn('data-bs-toggle="modal"', html)
+        self.assertNotIn('upload', html)
+
+    def test_derivatives_are_served_immutable(self):
+        name = generate_for_photo(self.photo)['jpeg'][0][1]
+        request = RequestFactory().get('/')
+        self.assertIn('immutable', serve_media(request, name)['Cache-Control'])
+        self.assertNotIn('immutable', serve_media(request, self.photo.image.name)['Cache-Control'])
+
+
+    def test_unreadable_photos_stop_blocking_the_sweep(self):
+        generate_for_photo(self.photo)
+        broken = CasePhoto.objects.create(case=self.photo.case, image=SimpleUploadedFile('broken.jpg', b'not a jpeg'))
+        with self.photo.image.open('rb') as source:
+            newer = CasePhoto.objects.create(case=self.photo.case, image=SimpleUploadedFile('newer.jpg', source.read()))
+        for attempt in range(1, thumbnails.MAX_ATTEMPTS + 1):
+            generate_missing_derivatives(limit=1)
+            broken.refresh_from_db()
+            self.assertEqual(broken.derivatives['attempts'], attempt)
+
+        generate_missing_derivatives(limit=1)   # the broken photo is no longer picked
+        broken.refresh_from_db()
+        self.assertEqual(broken.derivatives['attempts'], thumbnails.MAX_ATTEMPTS)
+        newer.refresh_from_db()
+        self.assertIn('jpeg', newer.derivatives)
+        self.assertEqual(image_sources(broken)['src'], broken.image.url)   # the original is still served
+
+# --- Detection Evidence API ---
+
+class EvidenceApiTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.media = override_settings(MEDIA_ROOT=self.media_root)
+        self.media.enable()
+        officer = get_user_model().objects.create_user('officer@example.com', 'secret')
+        self.client.force_login(officer)
+        self.case = Case.objects.create(guardian_name='Guardian', guardian_relationship='Parent', guardian_phone='1',
+                                        guardian_address='Address', missing_name='Person', police_officer=officer)
+        self.start = timezone.now() - timedelta(hours=1)
+
+    def tearDown(self):
+        self.media.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def _add_evidence(self, n, latitude=None, longitude=None):
+        for _ in range(n):
+            photo = CasePhoto.objects.create(case=self.case, image=SimpleUploadedFile('e.gif', TINY_IMAGE),
+                                             is_detection_evidence=True, latitude=latitude, longitude=longitude)
+            # every other pair shares a timestamp, so the id tie-break is exercised
+            CasePhoto.objects.filter(pk=photo.pk).update(uploaded_at=self.start + timedelta(seconds=photo.pk // 2))
+
+    def _get(self, **params):
+        response = self.client.get(reverse('cases:evidence_api', args=[self.case.pk]), params)
+        return response.status_code, response.json()
+
+    def test_pages_are_ordered_and_complete(self):
+        self._add_evidence(7)
+        expected = list(CasePhoto.objects.filter(case=self.case).order_by('-uploaded_at', '-id')
+                        .values_list('pk', flat=True))
+        seen, cursor = [], None
+        while True:
+            _, data = self._get(limit=3, **({'cursor': cursor} if cursor else {}))
+            seen += [row['id'] for row in data['results']]
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(seen, expected)
+        self.assertEqual([row['id'] for row in self._get(order='asc', limit=50)[1]['results']], expected[::-1])
+
+        page = self.client.get(reverse('cases:detail', args=[self.case.pk]))
+        self.assertContains(page, 'MATCH CONFIRMED (7 sightings)')
+        self.assertNotContains(page, 'case_photos/e')   # frames come from the API, not the page
+
+    def test_time_range_and_bbox_filters(self):
+        self._add_evidence(3, latitude='18.520000', longitude='73.850000')   # Pune
+        self._add_evidence(2, latitude='19.070000', longitude='72.870000')   # Mumbai
+        self._add_evidence(1)                                                # no location
+
+        _, data = self._get(bbox='73.8,18.4,74.0,18.6')
+        self.assertEqual(len(data['results']), 3)
+        self.assertEqual(data['results'][0]['latitude'], 18.52)
+
+        newest = CasePhoto.objects.order_by('-uploaded_at').first().uploaded_at
+        _, data = self._get(since=newest.isoformat())
+        self.assertTrue(all(row['uploaded_at'] >= newest.isoformat() for row in data['results']))
+        self.assertEqual(len(self._get(until=self.start.isoformat())[1]['results']), 0)
+
+        self.assertEqual(self._get(bbox='north')[0], 400)
+        self.assertEqual(self._get(since='yesterday')[0], 400)
+        self.assertEqual(self._get(cursor='!!')[0], 400)
+
+
+# --- Query Plans ---
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite-specific')
+class QueryPlanTests(TestCase):
+    """The hot list queries must stay on their indexes (cases/migrations/0017_hot_query_indexes.py)."""
+
+    HOT_QUERIES = {
+        'alert_visible_sent_idx':
+            lambda: DetectionAlert.objects.filter(case_id=1, is_deleted_by_officer=False).order_by('-alert_sent_at', '-id'),
+        'photo_evidence_uploaded_idx':
+            lambda: CasePhoto.objects.filter(case_id=1, is_detection_evidence=True).order_by('-uploaded_at', '-id'),
+        'photo_enrollment_uploaded_idx':
+            lambda: CasePhoto.objects.filter(case_id=1, is_detection_evidence=False).order_by('-uploaded_at'),
+        'case_officer_status_idx':
+            lambda: Case.objects.filter(police_officer_id=1, status='pending').order_by('-created_at', '-id'),
+        'case_status_last_seen_idx':
+            lambda: Case.objects.filter(status__in=['pending', 'verified']).order_by('-last_seen_date'),
+    }
+
+    def _plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def test_hot_queries_use_their_index(self):
+        for index, queryset in self.HOT_QUERIES.items():
+            with self.subTest(index=index):
+                plan = self._plan(queryset())
+                self.assertFalse([step for step in plan if step.startswith('SCAN ') and 'INDEX' not in step],
+                                 f'table scan: {plan}')
+                self.assertTrue(any(index in step for step in plan), f'{index} not used: {plan}')
+
+
+# --- Public Missing-Persons List ---
+
+class PublicListTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.officer = get_user_model().objects.create_user('officer@example.com', 'secret')
+        for i, status in enumerate(['pending', 'verified', 'pending', 'closed']):
+            self._case(f'Person {i}', status)
+        self.url = reverse('cases:public_missing_list')
+        self.json_url = reverse('cases:public_missing_list_json')
+
+    def _case(self, name, status='pending'):
+        return Case.objects.create(guardian_name='Guardian', guardian_relationship='Parent', guardian_phone='1',
+                                   guardian_address='Address', missing_name=name, police_officer=self.officer,
+                                   status=status)
+
+    def test_repeat_visits_are_served_from_cache_and_revalidate(self):
+        with patch.object(public_list, 'PAGE_SIZE', 2):
+            first = self.client.get(self.url)
+            self.assertContains(first, 'Page 1 of 2')
+            etag = first['ETag']
+
+            with self.assertNumQueries(0):
+                self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+                data = self.client.get(self.json_url).json()   # page 1 is already cached by the HTML view
+            self.assertEqual(data['count'], 3)
+            self.assertEqual([row['missing_name'] for row in data['results']], ['Person 2', 'Person 1'])
+            self.assertEqual(len(self.client.get(self.json_url, {'page': 2}).json()['results']), 1)
+            self.assertEqual(self.client.get(self.url, {'page': 9}).status_code, 404)
+
+            self._case('Person New')
+            second = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(second.status_code, 200)
+            self.assertNotEqual(second['ETag'], etag)
+            self.assertContains(second, 'PERSON NEW')
+            self.assertEqual(self.client.get(self.json_url).json()['count'], 4)
+
+    def test_photo_changes_move_the_etag_and_last_modified(self):
+        first = self.client.get(self.json_url)
+        later = timezone.now() + timedelta(minutes=1)
+        with patch('cases.public_list.timezone.now', return_value=later):
+            public_list.invalidate()   # what the thumbnail worker does; no Case row changes
+
+        response = self.client.get(self.json_url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+        response = self.client.get(self.json_url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(self.json_url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_closing_a_case_removes_it(self):
+        etag = self.client.get(self.json_url)['ETag']
+        case = Case.objects.get(missing_name='Person 1')
+        case.status = 'closed'
+        case.save()
+
+        response = self.client.get(self.json_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Person 1', [row['missing_name'] for row in response.json()['results']])
+
+
+# --- Public Status Lookup Cache ---
+
+@skipUnless(shared_state.available(), 'needs the Redis server of REDIS_STATE_URL')
+class StatusCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        stats(reset=True)
+        officer = get_user_model().objects.create_user('officer@example.com', 'secret')
+        self.case = Case.objects.create(guardian_name='Guardian', guardian_relationship='Parent', guardian_phone='1',
+                                        guardian_address='Address', missing_name='Person', police_officer=officer)
+
+    def _status_page(self, complaint_id):
+        return self.client.get(reverse('cases:status_detail', args=[complaint_id]))
+
+    def test_known_and_unknown_ids_are_cached_until_the_case_changes(self):
+        self.assertContains(self._status_page(self.case.complaint_id), 'CURRENT STATUS: PENDING')
+        with self.assertNumQueries(0):
+            self.assertContains(self._status_page(self.case.complaint_id), 'CURRENT STATUS: PENDING')
+
+        self.case.status = 'verified'
+        self.case.save()   # what update_case_status does
+        self.assertContains(self._status_page(self.case.complaint_id), 'CURRENT STATUS: VERIFIED')
+
+        self.assertRedirects(self._status_page('MP-99-999999'), reverse('cases:status_check'))
+        with self.assertNumQueries(0):
+            self.assertIsNone(get_status_view('MP-99-999999'))
+
+        self.assertEqual(stats(), {'hits': 1, 'negative_hits': 1, 'misses': 3, 'lookups': 5, 'hit_ratio': 0.4})
+        out = io.StringIO()
+        call_command('status_cache_stats', '--reset', stdout=out)
+        self.assertIn('Hit ratio: 40.0%', out.getvalue())
+        self.assertEqual(stats()['lookups'], 0)
+
+    def test_new_case_clears_a_cached_unknown_id(self):
+        future_id = f"{self.case.complaint_id[:-6]}{self.case.pk + 1:06d}"
+        self.assertIsNone(get_status_view(future_id))
+        Case.objects.create(guardian_name='Guardian', guardian_relationship='Parent', guardian_phone='1',
+                            guardian_address='Address', missing_name='Next Person')
+        self.assertEqual(get_status_view(future_id)['missing_name'], 'Next Person')
+
+
+# --- Full-Text Case Search ---
+
+@skipUnless(connection.vendor == 'sqlite', 'the FTS5 index exists on SQLite only')
+class CaseSearchTests(TestCase):
+
+    def setUp(self):
+        self.officer = get_user_model().objects.create_user('officer@example.com', 'secret')
+        self.ravi = self._case('Ravi Sharma', clothing_description='Blue school uniform')
+        self.priya = self._case('Priya Ravindran', last_seen_location='Swargate')
+        self.amit = self._case('Amit Patil', special_marks='Scar near the left eye', last_seen_location='Ravet')
+
+    def _case(self, name, **fields):
+        return Case.objects.create(guardian_name='Guardian', guardian_relationship='Parent', guardian_phone='1',
+                                   guardian_address='Address', missing_name=name, police_officer=self.officer,
+                                   **fields)
+
+    def test_word_prefixes_ranked_with_name_first(self):
+        cases = Case.objects.all()
+        ranked = search_cases('rav', cases)
+        self.assertEqual(set(ranked[:2]), {self.ravi, self.priya})
+        self.assertEqual(ranked[2], self.amit)  # a location hit weighs less than a name hit
+        self.assertEqual(search_cases('rav sha', cases), [self.ravi])
+        self.assertEqual(search_cases('uniform', cases), [self.ravi])
+        self.assertEqual(search_cases(self.priya.complaint_id.lower(), cases)[0], self.priya)
+        self.assertEqual(search_cases('"* OR NEAR(', cases), [])  # operators are never passed through
+        self.assertEqual(search_cases('rav', cases.filter(last_seen_location='Swargate')), [self.priya])
+        self.assertEqual(search_cases('', cases), [])
+
+    def test_index_follows_updates_and_deletes(self):
+        Case.objects.filter(pk=self.ravi.pk).update(missing_name='Rohan Sharma')  # no signals
+        self.assertEqual(search_cases('rav', Case.objects.all()), [self.priya, self.amit])
+        self.assertEqual(search_cases('rohan', Case.objects.all()), [self.ravi])
+        self.priya.delete()
+        self.assertEqual(search_cases('swargate', Case.objects.all()), [])
+
+    def test_dashboard_apis_search_the_index(self):
+        self.client.force_login(self.officer)
+        listed = self.client.get(reverse('police:cases_api'), {'q': 'scar'}).json()['results']
+        self.assertEqual([c['missing_name'] for c in listed], ['Amit Patil'])
+        ranked = self.client.get(reverse('police:case_search_api'), {'q': 'ravet', 'status': 'pending'}).json()
+        self.assertEqual([c['missing_name'] for c in ranked['results']], ['Amit Patil'])
+        self.amit.status = 'closed'
+        self.amit.save()
+        ranked = self.client.get(reverse('police:case_search_api'), {'q': 'ravet', 'status': 'pending'}).json()
+        self.assertEqual(ranked['results'], [])
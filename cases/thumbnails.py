@@ -0,0 +1,155 @@
+# cases/thumbnails.py
+
+import hashlib
+import io
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.utils.cache import patch_cache_control
+from django.views.static import serve
+from PIL import Image, ImageOps
+
+# --- Photo Derivatives ---
+#
+# Uploaded photos are kept as they came (the AI pipeline and the PDF report read the
+# originals), but pages never serve them: a background task (cases.tasks.generate_photo_derivatives)
+# encodes every photo at a few widths, in WebP and JPEG, and records them on
+# CasePhoto.derivatives as {"webp": [[width, name], ...], "jpeg": [...]}, narrowest first.
+#
+# A derivative's file name is the hash of its bytes, so a URL never changes meaning and can be
+# cached forever (serve_media below sends "immutable"; configure the production web server
+# the same way for MEDIA_URL + "derivatives/"). Until the task has run, templates fall back
+# to the original.
+#
+# A photo that cannot be encoded (corrupt or missing file) is recorded as
+# {"error": ..., "attempts": n}; the periodic sweep retries it at most
+# PHOTO_DERIVATIVE_MAX_ATTEMPTS times, so broken uploads never crowd out new ones.
+
+WIDTHS = tuple(sorted(getattr(settings, 'PHOTO_DERIVATIVE_WIDTHS', (160, 320, 640, 1280))))
+QUALITY = getattr(settings, 'PHOTO_DERIVATIVE_QUALITY', 80)
+DERIVATIVE_DIR = 'derivatives'
+MAX_ATTEMPTS = getattr(settings, 'PHOTO_DERIVATIVE_MAX_ATTEMPTS', 3)
+FORMATS = (
+    ('webp', 'WEBP', {'quality': QUALITY, 'method': 4}),
+    ('jpeg', 'JPEG', {'quality': QUALITY, 'optimize': True, 'progressive': True}),
+)
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+ORIGINAL_MAX_AGE = getattr(settings, 'MEDIA_ORIGINAL_MAX_AGE_SECONDS', 60 * 60)
+
+
+def target_widths(original_width):
+    """The configured widths up to the original's (never upscaled), plus the original if it is narrower."""
+    return sorted({min(width, original_width) for width in WIDTHS})
+
+
+def _store(data, extension):
+    digest = hashlib.sha256(data).hexdigest()[:24]
+    name = f"{DERIVATIVE_DIR}/{digest[:2]}/{digest}.{extension}"
+    if not default_storage.exists(name):  # identical bytes are stored once
+        name = default_storage.save(name, ContentFile(data))
+    return name
+
+
+def build_derivatives(source):
+    """Encodes one image file at every target width and format; returns the derivatives mapping."""
+    with Image.open(source) as img:
+        # JPEGs are decoded at a reduced DCT scale when even the widest target is far smaller
+        img.draft('RGB', (WIDTHS[-1], WIDTHS[-1]))
+        img = ImageOps.exif_transpose(img).convert('RGB')
+
+    derivatives = {key: [] for key, _, _ in FORMATS}
+    for width in reversed(target_widths(img.width)):  # widest first, each step downscales the previous
+        if width != img.width:
+            img = img.resize((width, max(1, round(img.height * width / img.width))), Image.LANCZOS)
+        for key, pil_format, options in FORMATS:
+            buffer = io.BytesIO()
+            img.save(buffer, pil_format, **options)
+            derivatives[key].insert(0, [width, _store(buffer.getvalue(), key)])
+    return derivatives
+
+
+def generate_for_photo(photo):
+    """Builds and records the derivatives of one CasePhoto; returns the mapping."""
+    with photo.image.open('rb') as source:
+        derivatives = build_derivatives(source)
+    # update() rather than save(): no signals, and a concurrent edit of other fields is not overwritten
+    type(photo).objects.filter(pk=photo.pk).update(derivatives=derivatives)
+    photo.derivatives = derivatives
+    if not photo.is_detection_evidence:
+        from .public_list import invalidate
+        invalidate()  # the public list shows enrollment photos
+    return derivatives
+
+
+def record_failure(photo, error):
+    """Marks the photo as failed (the original keeps being served) and returns the attempt count."""
+    attempts = (photo.derivatives or {}).get('attempts', 0) + 1
+    photo.derivatives = {'error': repr(error)[:500], 'attempts': attempts}
+    type(photo).objects.filter(pk=photo.pk).update(derivatives=photo.derivatives)
+    return attempts
+
+
+def pending_photos(queryset):
+    """Photos of `queryset` without derivatives that are still worth an attempt."""
+    return queryset.filter(Q(derivatives={}) | Q(derivatives__has_key='error', derivatives__attempts__lt=MAX_ATTEMPTS))
+
+
+def photo_created(sender, instance, created, **kwargs):
+    """post_save receiver: queue the derivatives of a new photo once it is committed."""
+    if created:
+        transaction.on_commit(lambda: _queue(instance.pk))
+
+
+def _queue(photo_id):
+    from .tasks import generate_photo_derivatives
+
+    try:
+        generate_photo_derivatives.delay(photo_id)
+    except Exception as e:
+        # Pages use the original meanwhile; the periodic sweep picks the photo up later
+        print(f"Thumbnails: Could not queue photo {photo_id} ({e}).")
+
+
+# --- Template data ---
+
+def _srcset(derivatives, key):
+    return ', '.join(f"{default_storage.url(name)} {width}w" for width, name in derivatives.get(key, ()))
+
+
+def image_sources(photo):
+    """{'src', 'srcset', 'webp_srcset'} for <img>/<picture>; just the original until derivatives exist."""
+    if photo is None or not photo.image:
+        return None
+    derivatives = photo.derivatives or {}
+    jpeg = derivatives.get('jpeg')
+    return {
+        'src': default_storage.url(jpeg[-1][1]) if jpeg else photo.image.url,
+        'srcset': _srcset(derivatives, 'jpeg'),
+        'webp_srcset': _srcset(derivatives, 'webp'),
+    }
+
+
+def photo_fields(photo):
+    """The photo keys of the dashboard JSON APIs (cases_api, alerts_api, live alerts)."""
+    sources = image_sources(photo) or {'src': None, 'srcset': '', 'webp_srcset': ''}
+    return {
+        'photo_url': sources['src'],
+        'photo_srcset': sources['srcset'],
+        'photo_webp_srcset': sources['webp_srcset'],
+    }
+
+
+# --- Serving ---
+
+def serve_media(request, path):
+    """Development media server with caching headers: derivatives are immutable, originals are not."""
+    response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    if path.startswith(f"{DERIVATIVE_DIR}/"):
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    else:
+        patch_cache_control(response, private=True, max_age=ORIGINAL_MAX_AGE)
+    return response
@@ -8,12 +8,14 @@ app_name = 'cases'  # important for namespacing in templates
 urlpatterns = [
     path('create/', views.create_case, name='create'),
     path('<int:pk>/', views.case_detail, name='detail'),
+    path('<int:pk>/evidence/', views.evidence_api, name='evidence_api'),
     path('<int:pk>/update_status/', views.update_case_status, name='update_status'),
     path('<int:pk>/delete/', views.delete_case, name='delete'),
     path('<int:pk>/report/', views.generate_case_report_pdf, name='report_pdf'),
     path('case/<int:case_id>/report/', get_report, name='get_report'),
     path('status/result/<str:case_id>/report/', views.get_report, name='report_pdf'),
     path('list/', views.public_missing_list, name='public_missing_list'),
+    path('list/json/', views.public_missing_list_json, name='public_missing_list_json'),
     path('status/check/', views.public_status_check_form, name='status_check'),
     path('status/result/<str:complaint_id>/', views.public_status_detail, name='status_detail'),
     
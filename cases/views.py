@@ -14,6 +14,8 @@ from .ai_processor import generate_embedding_from_image
 
 from .models import CasePhoto, Case, FaceEmbedding 
 from .tasks import process_new_case_photo_for_embedding # New: Import the task
+from .outbox import enqueue
+from django.db import transaction
 # Note: You no longer need 'from .ai_processor import generate_embedding_from_image' here!
 # ... (rest of imports) ...
 
@@ -47,17 +49,23 @@ def create_case(request):
         files = request.FILES.getlist('images')
         
         if case_form.is_valid():
-            case = case_form.save(commit=False)
-            case.police_officer = request.user
-            case.save()
+            # The case, its photos and its confirmation email (outbox entry) are written together
+            with transaction.atomic():
+                case = case_form.save(commit=False)
+                case.police_officer = request.user
+                case.save()
+
+                has_enrollment_photos = False
 
-            has_enrollment_photos = False
+                # Save uploaded images
+                for f in files:
+                    # We assume all photos uploaded during case creation are for enrollment/embedding
+                    photo = CasePhoto.objects.create(case=case, image=f, is_detection_evidence=False)
+                    has_enrollment_photos = True
 
-            # Save uploaded images
-            for f in files:
-                # We assume all photos uploaded during case creation are for enrollment/embedding
-                photo = CasePhoto.objects.create(case=case, image=f, is_detection_evidence=False)
-                has_enrollment_photos = True
+                # Sent by the outbox dispatcher, outside this request (cases/outbox.py)
+                if case.guardian_email:
+                    enqueue('case_confirmation', {'case_id': case.pk})
 
 
             # =========================================================
@@ -75,35 +83,6 @@ def create_case(request):
             # =========================================================
 
 
-            try:
-                # Render HTML content
-                html_content = render_to_string(
-                    'emails/complaint_confirmation.html',
-                    {'case': case}
-                )
-
-                # Text fallback version (optional but recommended)
-                text_content = f"""
-                Complaint Registered Successfully!
-                Complaint ID: {case.complaint_id}
-                Missing Person: {case.missing_name}
-                Status: {case.status}
-                """
-
-                # Create email
-                email = EmailMultiAlternatives(
-                    subject=f"✅ Case Registered - ID: {case.complaint_id}",
-                    body=text_content,
-                    to=[case.guardian_email]
-                )
-                email.attach_alternative(html_content, "text/html") 
-                email.send()
-
-            except Exception as e:
-                print(f"Error sending email: {e}")
-                messages.warning(request, "Case registered but confirmation email failed.")
-
-
             messages.success(request, "Case registered successfully.")
             return redirect(
                 f"{redirect('police:dashboard').url}?success=true&id={case.complaint_id}"
@@ -174,17 +153,95 @@ def create_case(request):
 
 
 from django.shortcuts import render, get_object_or_404
-from .models import Case
+from django.db.models import Count, Max, Q
+from django.http import JsonResponse
+from django.utils.dateparse import parse_datetime
+from .models import Case, DuplicateCaseCandidate
+from .thumbnails import photo_fields
+from police.pagination import InvalidCursor, keyset_page, page_size
 @login_required
 def case_detail(request, pk):
     """
     Displays the detailed information for a specific missing person case.
     """
     case = get_object_or_404(Case, pk=pk)
+    # Evidence frames can run into thousands: the page gets their count and newest time here
+    # and loads the frames themselves page by page from evidence_api
+    enrollment_photos = list(case.photos.filter(is_detection_evidence=False))
+    evidence = case.photos.filter(is_detection_evidence=True).aggregate(count=Count('id'), latest=Max('uploaded_at'))
     
     # You can add logic here to check if the user is authorized to view the case.
 
-    return render(request, 'cases/case_detail.html', {'case': case})
+    # This case sits on either side of a pair (lower pk first). Keyed by the other case so
+    # each one is listed once, at its best similarity (ordering is -similarity)
+    duplicate_pairs = (DuplicateCaseCandidate.objects
+                       .filter(Q(case=case) | Q(duplicate_of=case))
+                       .select_related('case', 'duplicate_of'))
+    possible_duplicates = {}
+    for pair in duplicate_pairs:
+        other = pair.duplicate_of if pair.case_id == case.pk else pair.case
+        possible_duplicates.setdefault(other.pk, {'case': other, 'similarity': pair.similarity})
+    possible_duplicates = list(possible_duplicates.values())
+
+    return render(request, 'cases/case_detail.html', {
+        'case': case,
+        'possible_duplicates': possible_duplicates,
+        'enrollment_photos': enrollment_photos,
+        'evidence_count': evidence['count'],
+        'latest_evidence_at': evidence['latest'],
+    })
+
+
+# --- Detection evidence (paged JSON for case_detail) ---
+
+EVIDENCE_SORTS = {
+    'desc': ['-uploaded_at', '-id'],
+    'asc': ['uploaded_at', 'id'],
+}
+
+
+def _evidence_filters(request):
+    """?since= / ?until= (ISO datetimes) and ?bbox=min_lon,min_lat,max_lon,max_lat; raises ValueError."""
+    filters = Q()
+    for param, lookup in (('since', 'uploaded_at__gte'), ('until', 'uploaded_at__lt')):
+        if request.GET.get(param):
+            value = parse_datetime(request.GET[param])
+            if value is None:
+                raise ValueError(f"'{param}' must be an ISO 8601 datetime.")
+            filters &= Q(**{lookup: value})
+
+    if request.GET.get('bbox'):
+        try:
+            min_lon, min_lat, max_lon, max_lat = (float(v) for v in request.GET['bbox'].split(','))
+        except ValueError:
+            raise ValueError("'bbox' must be min_lon,min_lat,max_lon,max_lat.")
+        filters &= Q(latitude__range=(min_lat, max_lat), longitude__range=(min_lon, max_lon))
+    return filters
+
+
+@login_required
+def evidence_api(request, pk):
+    """GET ?order=desc|asc&since=&until=&bbox=&cursor=&limit= -> {"results": [...], "next_cursor"}"""
+    case = get_object_or_404(Case.objects.only('pk'), pk=pk)
+    ordering = EVIDENCE_SORTS.get(request.GET.get('order'), EVIDENCE_SORTS['desc'])
+    try:
+        photos = case.photos.filter(is_detection_evidence=True).filter(_evidence_filters(request))
+        rows, next_cursor = keyset_page(photos, ordering, request.GET.get('cursor'), page_size(request.GET.get('limit')))
+    except (ValueError, InvalidCursor) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return JsonResponse({
+        'results': [{
+            'id': photo.pk,
+            **photo_fields(photo),
+            'uploaded_at': photo.uploaded_at.isoformat(),
+            'latitude': float(photo.latitude) if photo.latitude is not None else None,
+            'longitude': float(photo.longitude) if photo.longitude is not None else None,
+            'source_video': photo.source_video,
+            'video_timestamp': photo.video_timestamp,
+        } for photo in rows],
+        'next_cursor': next_cursor,
+    })
 
 from django.shortcuts import redirect, get_object_or_404
 from django.contrib import messages
@@ -400,20 +457,67 @@ def get_report(request, case_id):
 from django.shortcuts import render
 from .models import Case
 
-def public_missing_list(request):
-    # Retrieve cases with 'pending' (newly registered) OR 'verified' (police-reviewed) status.
-    # Exclude 'closed' cases.
-    active_statuses = ['pending', 'verified'] 
-    
-    active_cases = Case.objects.filter(
-        status__in=active_statuses
-    ).order_by('-last_seen_date') 
+from django.core.paginator import EmptyPage
+from django.http import Http404
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+from .public_list import get_page, list_state, page_number
+
+
+# --- Public list: cached pages, conditional GET (cases/public_list.py) ---
+
+PUBLIC_LIST_MAX_AGE = getattr(settings, 'PUBLIC_LIST_MAX_AGE_SECONDS', 0)  # 0: always revalidate (cheap 304s)
 
+
+def _public_list_etag(request):
+    # The page header shows the signed-in officer, so the HTML differs per user
+    return f"{list_state()['etag']}-{request.user.pk or 'anon'}"
+
+
+def _public_list_last_modified(request):
+    return list_state()['newest']
+
+
+def _public_cache_headers(response, request):
+    if request.user.is_authenticated:
+        patch_cache_control(response, private=True, max_age=0, must_revalidate=True)
+    else:
+        patch_cache_control(response, public=True, max_age=PUBLIC_LIST_MAX_AGE, must_revalidate=True)
+    patch_vary_headers(response, ['Cookie'])
+    return response
+
+
+
+def _cached_page(request):
+    try:
+        return get_page(page_number(request.GET.get('page')))
+    except EmptyPage:
+        raise Http404("No such page.")
+
+
+@condition(etag_func=_public_list_etag, last_modified_func=_public_list_last_modified)
+def public_missing_list(request):
+    # Only 'pending' (newly registered) and 'verified' (police-reviewed) cases are listed
     context = {
-        'cases': active_cases,
+        'page': _cached_page(request),
         'title': 'Active Missing Persons',
     }
-    return render(request, 'cases/missing_persons_list.html', context)
+    return _public_cache_headers(render(request, 'cases/missing_persons_list.html', context), request)
+
+
+@condition(etag_func=lambda request: list_state()['etag'], last_modified_func=_public_list_last_modified)
+def public_missing_list_json(request):
+    """GET ?page= -> the same page as public_missing_list, for partner sites."""
+    page = _cached_page(request)
+    response = JsonResponse({
+        'page': page['number'],
+        'num_pages': page['num_pages'],
+        'count': page['count'],
+        'results': page['cases'],
+    })
+    response['Access-Control-Allow-Origin'] = '*'
+    patch_cache_control(response, public=True, max_age=PUBLIC_LIST_MAX_AGE, must_revalidate=True)
+    return response
 
 # cases/views.py
 
@@ -423,6 +527,7 @@ from django import forms
 from .models import Case
 from django.db.models import ObjectDoesNotExist
 from django.http import HttpResponse
+from .status_cache import get_status_view
 
 # --- FORM DEFINITION ---
 # Simple non-ModelForm for ID input
@@ -450,32 +555,31 @@ def public_status_check_form(request):
 # cases/views.py
 
 def public_status_detail(request, complaint_id):
-    try:
-        case = Case.objects.get(complaint_id=complaint_id)
-        
-        # We only show non-closed cases for public engagement
-        if case.status == 'closed':
-            # Option 1: Show minimal 'Closed' status
-            messages.info(request, f"Case {complaint_id} is currently marked as CLOSED. Please contact police for details.")
-            return render(request, 'public/status_detail.html', {'case': case, 'is_sensitive_data': False})
-            
-        # Placeholder for system/officer updates (You would need an actual CaseUpdate model)
-        updates = [
-            {'date': case.created_at, 'text': 'Case registered and sent for verification.'},
-            {'date': timezone.now(), 'text': 'AI engine initiated real-time scanning across public feeds.'}
-        ]
-        
-        context = {
-            'case': case,
-            'updates': updates,
-            # We explicitly prevent sensitive data like guardian contacts from reaching the template
-            'is_sensitive_data': False 
-        }
-        return render(request, 'public/status_detail.html', context)
-        
-    except ObjectDoesNotExist:
+    # Cached public fields of the case, unknown IDs included (cases/status_cache.py)
+    case = get_status_view(complaint_id)
+    if case is None:
         messages.error(request, f"Complaint ID '{complaint_id}' not found. Please check the ID.")
-        return redirect('public:status_check')
+        return redirect('cases:status_check')
+
+    # We only show non-closed cases for public engagement
+    if case['status'] == 'closed':
+        # Option 1: Show minimal 'Closed' status
+        messages.info(request, f"Case {complaint_id} is currently marked as CLOSED. Please contact police for details.")
+        return render(request, 'public/status_detail.html', {'case': case, 'is_sensitive_data': False})
+
+    # Placeholder for system/officer updates (You would need an actual CaseUpdate model)
+    updates = [
+        {'date': case['created_at'], 'text': 'Case registered and sent for verification.'},
+        {'date': timezone.now(), 'text': 'AI engine initiated real-time scanning across public feeds.'}
+    ]
+
+    context = {
+        'case': case,
+        'updates': updates,
+        # Only PUBLIC_FIELDS are in the view model; guardian contacts never reach the template
+        'is_sensitive_data': False 
+    }
+    return render(request, 'public/status_detail.html', context)
     
 
     
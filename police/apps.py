@@ -4,3 +4,20 @@ from django.apps import AppConfig
 class PoliceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'police'
+
+    def ready(self):
+        from django.db.models.signals import post_save, post_delete
+        from .models import PoliceStation
+        from .spatial import invalidate_station_index
+
+        post_save.connect(invalidate_station_index, sender=PoliceStation, dispatch_uid='station_index_save')
+        post_delete.connect(invalidate_station_index, sender=PoliceStation, dispatch_uid='station_index_delete')
+
+        # Dashboard counters follow Case / DetectionAlert changes (police/counters.py)
+        from .counters import connect_signals
+        connect_signals()
+
+        # New alerts wake the live-alert publisher of this process (police/live.py)
+        from cases.models import DetectionAlert
+        from .live import alert_created
+        post_save.connect(alert_created, sender=DetectionAlert, dispatch_uid='live_alerts_publish')
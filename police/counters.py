@@ -0,0 +1,184 @@
+# police/counters.py
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from cases.models import Case, DetectionAlert
+from .models import OfficerCounters, PoliceProfile
+
+# --- Per-Officer Dashboard Counters ---
+#
+# The dashboard KPIs (total / pending / closed cases, alert totals, alerts since the last
+# visit) are kept in one OfficerCounters row per officer instead of being counted on every
+# page view. The Case and DetectionAlert signals below apply +1/-1 deltas with F()
+# expressions, inside the same transaction as the change itself:
+#   * Case created / deleted, or its status or officer changed,
+#   * DetectionAlert created / deleted, marked read, or soft-deleted by the officer.
+# The previous state of an instance is remembered at load time (post_init), so a change
+# costs no extra SELECT. A missing row is built with one recount on first read.
+# QuerySet.update() bypasses signals: run recount() for the affected officers after one.
+
+CLOSED_STATUSES = ('closed', 'resolved')
+DASHBOARD_VIEW_DEBOUNCE_SECONDS = getattr(settings, 'DASHBOARD_VIEW_DEBOUNCE_SECONDS', 60)
+
+
+def recount(officer_id):
+    """Rebuilds the officer's counters from the tables (first use, or repair after bulk updates)."""
+    last_view = (PoliceProfile.objects.filter(user_id=officer_id).values_list('last_dashboard_view', flat=True).first()
+                 or timezone.now())
+    cases = Case.objects.filter(police_officer_id=officer_id).aggregate(
+        total=Count('id'),
+        pending=Count('id', filter=Q(status='pending')),
+        closed=Count('id', filter=Q(status__in=CLOSED_STATUSES)),
+    )
+    alerts = DetectionAlert.objects.filter(case__police_officer_id=officer_id, is_deleted_by_officer=False).aggregate(
+        total=Count('id'),
+        unreviewed=Count('id', filter=Q(is_reviewed=False)),
+        since_view=Count('id', filter=Q(alert_sent_at__gt=last_view)),
+    )
+    counters, _ = OfficerCounters.objects.update_or_create(officer_id=officer_id, defaults={
+        'total_cases': cases['total'],
+        'pending_cases': cases['pending'],
+        'closed_cases': cases['closed'],
+        'alerts_total': alerts['total'],
+        'alerts_unreviewed': alerts['unreviewed'],
+        'alerts_since_view': alerts['since_view'],
+        'last_view_at': last_view,
+    })
+    return counters
+
+
+def get_counters(officer):
+    try:
+        return OfficerCounters.objects.get(officer=officer)
+    except OfficerCounters.DoesNotExist:
+        return recount(officer.pk)
+
+
+def mark_dashboard_viewed(counters):
+    """
+    Records a dashboard view, at most once per DASHBOARD_VIEW_DEBOUNCE_SECONDS. Only the alerts
+    that were shown are subtracted, so an alert arriving meanwhile still counts as new.
+    """
+    now = timezone.now()
+    if now - counters.last_view_at < timedelta(seconds=DASHBOARD_VIEW_DEBOUNCE_SECONDS):
+        return
+    OfficerCounters.objects.filter(pk=counters.pk).update(
+        alerts_since_view=F('alerts_since_view') - counters.alerts_since_view, last_view_at=now)
+    PoliceProfile.objects.filter(user_id=counters.pk).update(last_dashboard_view=now)
+
+
+def _apply(officer_id, deltas, sign=1, **conditions):
+    deltas = {field: value * sign for field, value in deltas.items() if value}
+    if officer_id is None or not deltas:
+        return
+    OfficerCounters.objects.filter(officer_id=officer_id, **conditions).update(
+        **{field: F(field) + value for field, value in deltas.items()})
+
+
+# --- Case signals ---
+
+def _case_deltas(status):
+    return {
+        'total_cases': 1,
+        'pending_cases': int(status == 'pending'),
+        'closed_cases': int(status in CLOSED_STATUSES),
+    }
+
+
+def remember_case_state(sender, instance, **kwargs):
+    # __dict__ (not attribute access) so deferred fields are never loaded just for this
+    fields = instance.__dict__
+    instance._counted_state = (
+        (fields['police_officer_id'], fields['status'])
+        if instance.pk and 'police_officer_id' in fields and 'status' in fields else None
+    )
+
+
+def case_saved(sender, instance, created, **kwargs):
+    current = (instance.police_officer_id, instance.status)
+    previous = getattr(instance, '_counted_state', None)
+    if created:
+        _apply(instance.police_officer_id, _case_deltas(instance.status))
+    elif previous is None:
+        if instance.police_officer_id:
+            recount(instance.police_officer_id)  # previous state unknown (deferred fields)
+    elif previous != current:
+        _apply(previous[0], _case_deltas(previous[1]), sign=-1)
+        _apply(current[0], _case_deltas(current[1]))
+    instance._counted_state = current
+
+
+def case_deleted(sender, instance, **kwargs):
+    previous = getattr(instance, '_counted_state', None) or (instance.police_officer_id, instance.status)
+    _apply(previous[0], _case_deltas(previous[1]), sign=-1)
+
+
+# --- DetectionAlert signals ---
+
+def _alert_deltas(is_deleted, is_reviewed):
+    if is_deleted:
+        return {}
+    return {'alerts_total': 1, 'alerts_unreviewed': int(not is_reviewed)}
+
+
+def _alert_officer_id(alert):
+    return alert.case.police_officer_id
+
+
+def _since_view(alert, officer_id, sign):
+    # Only alerts newer than the officer's last dashboard view are in alerts_since_view
+    _apply(officer_id, {'alerts_since_view': 1}, sign, last_view_at__lt=alert.alert_sent_at)
+
+
+def remember_alert_state(sender, instance, **kwargs):
+    fields = instance.__dict__
+    instance._counted_state = (
+        (fields['is_deleted_by_officer'], fields['is_reviewed'])
+        if instance.pk and 'is_deleted_by_officer' in fields and 'is_reviewed' in fields else None
+    )
+
+
+def alert_saved(sender, instance, created, **kwargs):
+    current = (instance.is_deleted_by_officer, instance.is_reviewed)
+    previous = None if created else getattr(instance, '_counted_state', None)
+    if not created and previous == current:
+        return
+
+    officer_id = _alert_officer_id(instance)
+    if created:
+        _apply(officer_id, _alert_deltas(*current))
+        if not instance.is_deleted_by_officer:
+            _since_view(instance, officer_id, +1)
+    elif previous is None:
+        if officer_id:
+            recount(officer_id)  # previous state unknown (deferred fields)
+    else:
+        _apply(officer_id, _alert_deltas(*previous), sign=-1)
+        _apply(officer_id, _alert_deltas(*current))
+        if previous[0] != current[0]:
+            _since_view(instance, officer_id, -1 if current[0] else +1)
+    instance._counted_state = current
+
+
+def alert_deleted(sender, instance, **kwargs):
+    state = getattr(instance, '_counted_state', None) or (instance.is_deleted_by_officer, instance.is_reviewed)
+    if state[0]:
+        return
+    officer_id = _alert_officer_id(instance)
+    _apply(officer_id, _alert_deltas(*state), sign=-1)
+    _since_view(instance, officer_id, -1)
+
+
+def connect_signals():
+    from django.db.models.signals import post_delete, post_init, post_save
+
+    post_init.connect(remember_case_state, sender=Case, dispatch_uid='counters_case_init')
+    post_save.connect(case_saved, sender=Case, dispatch_uid='counters_case_save')
+    post_delete.connect(case_deleted, sender=Case, dispatch_uid='counters_case_delete')
+    post_init.connect(remember_alert_state, sender=DetectionAlert, dispatch_uid='counters_alert_init')
+    post_save.connect(alert_saved, sender=DetectionAlert, dispatch_uid='counters_alert_save')
+    post_delete.connect(alert_deleted, sender=DetectionAlert, dispatch_uid='counters_alert_delete')
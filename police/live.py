@@ -0,0 +1,171 @@
+# police/live.py
+
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.urls import reverse
+
+from cases.models import DetectionAlert
+from cases.thumbnails import photo_fields
+
+# --- Live Detection Alerts (Server-Sent Events) ---
+#
+# Dashboards keep one EventSource open to police:alerts_stream instead of reloading to
+# see new alerts. Each process runs ONE publisher no matter how many dashboards are
+# connected: it tails the DetectionAlert table by primary key, at most every
+# LIVE_ALERTS_POLL_SECONDS, and fans each new alert out to the queues of the subscribers
+# who own its case. Alerts created in this process (surveillance_match_api) wake the
+# publisher immediately after commit; alerts written elsewhere (Celery retroactive matches)
+# arrive with the next poll. The publisher stops when its last subscriber leaves.
+#
+# The event id is the alert's pk. A reconnecting EventSource sends it back as Last-Event-ID
+# and the stream replays what was missed before going live. A subscriber that cannot keep
+# up is disconnected rather than buffered without bound; its browser reconnects and
+# resumes the same way.
+#
+# Streaming responses hold a connection open, so this endpoint needs the ASGI server
+# (Reunite/asgi.py); under WSGI each open stream would pin a worker thread.
+
+POLL_SECONDS = getattr(settings, 'LIVE_ALERTS_POLL_SECONDS', 2)
+HEARTBEAT_SECONDS = 15
+QUEUE_SIZE = 100
+REPLAY_LIMIT = 200
+
+
+def serialize_alert(alert):
+    """JSON shape of one alert, shared by the paged list (alerts_api) and the live stream."""
+    photo = alert.detection_photo
+    return {
+        'id': alert.pk,
+        'case_id': alert.case_id,
+        'complaint_id': alert.case.complaint_id,
+        'missing_name': alert.case.missing_name,
+        **photo_fields(photo),
+        'has_location': bool(photo and photo.latitude and photo.longitude),
+        'alert_sent_at': alert.alert_sent_at.isoformat(),
+        'is_reviewed': alert.is_reviewed,
+        'detail_url': reverse('cases:detail', args=[alert.case_id]),
+    }
+
+
+def format_event(alert_id, data):
+    return f"id: {alert_id}\nevent: alert\ndata: {json.dumps(data)}\n\n"
+
+
+def _alerts_after(last_id, officer_id=None, limit=500):
+    alerts = (DetectionAlert.objects.filter(pk__gt=last_id, is_deleted_by_officer=False)
+              .select_related('case', 'detection_photo').order_by('pk'))
+    if officer_id is not None:
+        alerts = alerts.filter(case__police_officer_id=officer_id)
+    return [(alert.pk, alert.case.police_officer_id, serialize_alert(alert)) for alert in alerts[:limit]]
+
+
+def latest_alert_id():
+    return DetectionAlert.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+
+
+class Subscription:
+    def __init__(self, officer_id):
+        self.officer_id = officer_id
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.overflowed = False
+
+
+class AlertPublisher:
+    """The single per-process tailer of DetectionAlert; one instance per event loop."""
+
+    def __init__(self):
+        self.subscribers = {}   # officer_id -> set of Subscription
+        self.last_id = None
+        self._task = None
+        self._wake = None
+        self._loop = None
+
+    async def subscribe(self, officer_id):
+        if self.last_id is None:
+            self.last_id = await sync_to_async(latest_alert_id)()
+        subscription = Subscription(officer_id)
+        self.subscribers.setdefault(officer_id, set()).add(subscription)
+        if self._task is None or self._task.done():
+            self._loop = asyncio.get_running_loop()
+            self._wake = asyncio.Event()
+            self._task = self._loop.create_task(self._run())
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscriptions = self.subscribers.get(subscription.officer_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self.subscribers[subscription.officer_id]
+
+    def notify(self):
+        """Thread-safe: wake the publisher now (called after an alert commits in this process)."""
+        if self._loop is not None and self._wake is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def poll(self):
+        """Fetches alerts newer than last_id and hands each one to its officer's subscribers."""
+        for alert_id, officer_id, data in await sync_to_async(_alerts_after)(self.last_id):
+            self.last_id = alert_id
+            for subscription in list(self.subscribers.get(officer_id, ())):
+                try:
+                    subscription.queue.put_nowait((alert_id, data))
+                except asyncio.QueueFull:
+                    subscription.overflowed = True
+                    self.unsubscribe(subscription)
+
+    async def _run(self):
+        while self.subscribers:
+            try:
+                await self.poll()
+            except Exception as e:
+                print(f"Live alerts: Poll failed: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+        self.last_id = None  # next subscriber starts from the then-latest alert
+
+
+publisher = AlertPublisher()
+
+
+def alert_created(sender, instance, created, **kwargs):
+    """post_save receiver: wake this process's publisher once the new alert is committed."""
+    if created:
+        transaction.on_commit(publisher.notify)
+
+
+async def event_stream(officer_id, last_event_id):
+    """Replays alerts after last_event_id (if given), then streams new ones with heartbeats."""
+    subscription = await publisher.subscribe(officer_id)
+    try:
+        yield f"retry: {POLL_SECONDS * 1000}\n\n"
+
+        sent_up_to = last_event_id or 0
+        if last_event_id is not None:
+            # Subscribed first, so nothing falls between the replay and the live queue
+            for alert_id, _, data in await sync_to_async(_alerts_after)(last_event_id, officer_id, REPLAY_LIMIT):
+                sent_up_to = alert_id
+                yield format_event(alert_id, data)
+
+        while True:
+            try:
+                alert_id, data = await asyncio.wait_for(subscription.queue.get(), timeout=HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if subscription.overflowed:
+                    return  # client reconnects with Last-Event-ID and catches up
+                yield ": keep-alive\n\n"
+                continue
+            if alert_id > sent_up_to:
+                sent_up_to = alert_id
+                yield format_event(alert_id, data)
+            if subscription.overflowed and subscription.queue.empty():
+                return
+    finally:
+        publisher.unsubscribe(subscription)
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 14:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('police', '0004_policestation_latitude_policestation_longitude'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='policestation',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, null=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:01
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('police', '0005_policestation_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OfficerCounters',
+            fields=[
+                ('officer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counters', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total_cases', models.IntegerField(default=0)),
+                ('pending_cases', models.IntegerField(default=0)),
+                ('closed_cases', models.IntegerField(default=0)),
+                ('alerts_total', models.IntegerField(default=0)),
+                ('alerts_unreviewed', models.IntegerField(default=0)),
+                ('alerts_since_view', models.IntegerField(default=0)),
+                ('last_view_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
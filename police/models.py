@@ -70,6 +70,8 @@ class PoliceStation(models.Model):
     email = models.EmailField(max_length=200, blank=True, null=True) 
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    # Lets the nearest-station index (police/spatial.py) notice edits made by other processes
+    updated_at = models.DateTimeField(auto_now=True, null=True)
     def __str__(self):
         return f"{self.name} ({self.taluka.name})"
     
@@ -104,3 +106,21 @@ class OTPVerification(models.Model):
 
     def __str__(self):
         return f"OTP for {self.email} (used={self.is_used})"
+
+
+class OfficerCounters(models.Model):
+    """
+    Denormalized dashboard numbers for one officer, kept current by the Case / DetectionAlert
+    signals in police/counters.py so the dashboard reads one row instead of counting.
+    """
+    officer = models.OneToOneField(PoliceUser, on_delete=models.CASCADE, primary_key=True, related_name='counters')
+    total_cases = models.IntegerField(default=0)
+    pending_cases = models.IntegerField(default=0)
+    closed_cases = models.IntegerField(default=0)
+    alerts_total = models.IntegerField(default=0)        # non-deleted alerts
+    alerts_unreviewed = models.IntegerField(default=0)   # non-deleted, not marked read
+    alerts_since_view = models.IntegerField(default=0)   # created since last_view_at (KPI tile)
+    last_view_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Counters for {self.officer}"
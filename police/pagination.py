@@ -0,0 +1,89 @@
+# police/pagination.py
+
+import base64
+import json
+from datetime import date, datetime
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+# --- Keyset (Cursor) Pagination ---
+#
+# OFFSET pagination rescans every skipped row and shifts when new rows arrive at the top.
+# A keyset page instead continues strictly after the last row of the previous page:
+#   ORDER BY created_at DESC, id DESC  ->  WHERE (created_at, id) < (:last_created_at, :last_id)
+# which an index on the ordering columns answers directly. The ordering must end in a
+# unique column (the primary key) so ties are broken deterministically.
+# The cursor handed to the client is the last row's ordering values, base64-encoded JSON.
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _to_json(value):
+    if isinstance(value, (datetime, date)):
+        return {'dt': value.isoformat()}
+    return value
+
+
+def _from_json(value):
+    if isinstance(value, dict) and 'dt' in value:
+        return parse_datetime(value['dt'])
+    return value
+
+
+def encode_cursor(values):
+    raw = json.dumps([_to_json(v) for v in values], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, n_fields):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = [_from_json(v) for v in json.loads(raw)]
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(str(e))
+    if len(values) != n_fields:
+        raise InvalidCursor("Cursor does not match the sort order.")
+    return values
+
+
+def _after(ordering, values):
+    """Q for rows strictly after `values` in `ordering` (e.g. ['-created_at', '-id']), mixed directions allowed."""
+    condition = Q(pk__in=[])
+    equal = Q()
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= equal & Q(**{f'{name}__{lookup}': value})
+        equal &= Q(**{name: value})
+    return condition
+
+
+def page_size(raw):
+    try:
+        return max(1, min(int(raw), MAX_PAGE_SIZE))
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+
+
+def keyset_page(queryset, ordering, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    One page of `queryset` ordered by `ordering` (last field must be unique, e.g. 'id').
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        queryset = queryset.filter(_after(ordering, decode_cursor(cursor, len(ordering))))
+
+    rows = list(queryset[:limit + 1])  # one extra row tells whether another page exists
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor([getattr(last, field.lstrip('-')) for field in ordering])
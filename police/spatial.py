@@ -0,0 +1,111 @@
+# police/spatial.py
+
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Max
+from sklearn.neighbors import BallTree
+
+from cases import geo
+from .models import PoliceStation
+
+# --- Nearest Police Station Index ---
+#
+# Alert emails CC the stations closest to a detection. Instead of computing the distance
+# to every station and sorting on each alert, each process keeps a BallTree (haversine
+# metric, coordinates in radians) over all stations with coordinates. A k-nearest query
+# is O(log N). The tree is rebuilt when stations change: immediately in this process via
+# the PoliceStation signals, and in other processes (Celery workers) when the table's
+# fingerprint (row count, newest updated_at) differs, checked at most every
+# STATION_INDEX_REFRESH_SECONDS.
+#
+# Station coordinates are converted to a float array once per build (cases/geo.py). Alerts
+# go to the k nearest stations. With ALERT_STATION_RADIUS_KM set (opt-in), they only go to
+# stations within that distance of the detection (bounding-box prefilter, then haversine, on
+# that array), and to the single nearest one when none is that close.
+
+STATION_INDEX_REFRESH_SECONDS = getattr(settings, 'STATION_INDEX_REFRESH_SECONDS', 60)
+ALERT_STATION_RADIUS_KM = getattr(settings, 'ALERT_STATION_RADIUS_KM', None)
+
+_index = None
+_lock = threading.Lock()
+
+
+class StationIndex:
+    """Immutable snapshot: BallTree plus row-aligned station id / name / email / [lat, lon]."""
+
+    def __init__(self, ids, names, emails, coords_deg, fingerprint):
+        self.ids = ids
+        self.names = names
+        self.emails = emails
+        self.coords = coords_deg
+        self.tree = BallTree(np.radians(coords_deg), metric='haversine') if len(ids) else None
+        self.fingerprint = fingerprint
+        self.checked_at = time.monotonic()
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def build(cls):
+        fingerprint = _fingerprint()
+        rows = list(PoliceStation.objects
+                    .exclude(latitude__isnull=True).exclude(longitude__isnull=True)
+                    .values_list('pk', 'name', 'email', 'latitude', 'longitude'))
+        coords = np.array([(float(lat), float(lon)) for *_, lat, lon in rows], dtype=np.float64).reshape(-1, 2)
+        return cls([r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows], coords, fingerprint)
+
+    def _station(self, i, distance_km):
+        return {'id': self.ids[i], 'name': self.names[i], 'email': self.emails[i], 'distance_km': float(distance_km)}
+
+    def nearest(self, latitude, longitude, k=2):
+        """The k closest stations as [{"id", "name", "email", "distance_km"}], closest first."""
+        if self.tree is None:
+            return []
+        dist, idx = self.tree.query(np.radians([[latitude, longitude]]), k=min(k, len(self)))
+        return [self._station(i, d * geo.EARTH_RADIUS_KM) for d, i in zip(dist[0], idx[0])]
+
+    def within(self, latitude, longitude, radius_km, k=None):
+        """Stations within radius_km (at most k), closest first, in the same form as nearest()."""
+        indices, dist = geo.within_radius(latitude, longitude, self.coords, radius_km)
+        return [self._station(i, d) for i, d in zip(indices[:k], dist[:k])]
+
+
+def _fingerprint():
+    stats = PoliceStation.objects.aggregate(n=Count('id'), newest=Max('updated_at'))
+    return stats['n'], stats['newest']
+
+
+def get_station_index():
+    global _index
+    index = _index
+    if index is not None and time.monotonic() - index.checked_at < STATION_INDEX_REFRESH_SECONDS:
+        return index
+
+    with _lock:
+        if _index is not None and _index.fingerprint == _fingerprint():
+            _index.checked_at = time.monotonic()
+            return _index
+        _index = StationIndex.build()
+        print(f"Station index: Built over {len(_index)} stations.")
+        return _index
+
+
+def invalidate_station_index(**kwargs):
+    """Signal receiver: the next lookup in this process rebuilds the tree."""
+    global _index
+    _index = None
+
+
+def alert_stations(latitude, longitude, k=2, radius_km=ALERT_STATION_RADIUS_KM):
+    """
+    The k stations nearest to a detection. With a radius_km, up to k stations within it, or
+    the nearest one if none is that close.
+    """
+    index = get_station_index()
+    latitude, longitude = float(latitude), float(longitude)
+    if radius_km is None:
+        return index.nearest(latitude, longitude, k=k)
+    return index.within(latitude, longitude, radius_km, k) or index.nearest(latitude, longitude, k=1)
@@ -1,3 +1,289 @@
 from django.test import TestCase
 
 # Create your tests here.
+
+import shutil
+import tempfile
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.core import mail
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from cases.evidence import CONFIRMED
+from cases.models import AlertDigest, Case, CasePhoto, DetectionAlert, OutboxMessage
+from cases import shared_state
+from cases.outbox import TokenBucket, dispatch_due
+from cases.tasks import OUTBOX_HANDLERS, alert_recipients, flush_alert_digest
+from .counters import get_counters, recount
+from .live import event_stream, publisher
+
+from asgiref.sync import sync_to_async
+from .models import District, OfficerCounters, PoliceProfile, PoliceStation, PoliceUser, State, Taluka
+from .spatial import alert_stations, invalidate_station_index
+
+from datetime import timedelta
+from unittest import skipUnless
+from unittest.mock import patch
+from django.utils import timezone
+import base64
+import json
+
+COUNTER_FIELDS = ('total_cases', 'pending_cases', 'closed_cases', 'alerts_total', 'alerts_unreviewed', 'alerts_since_view')
+
+# 1x1 transparent GIF
+TINY_IMAGE = b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;'
+
+
+# --- Dashboard Query Count ---
+
+class _OfficerTestCase(TestCase):
+    """Logged-in officer; _add_cases() registers cases with an enrollment photo and one alert each."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.media = override_settings(MEDIA_ROOT=self.media_root)
+        self.media.enable()
+        self.officer = PoliceUser.objects.create_user('officer@example.com', 'secret')
+        PoliceProfile.objects.create(
+            user=self.officer, officer_name='Officer', phone_number='1', police_station_name='Central',
+            police_station_address='Main Road', pincode='411001',
+        )
+        self.client.force_login(self.officer)
+
+    def tearDown(self):
+        self.media.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def _add_cases(self, start, n):
+        for i in range(start, start + n):
+            case = Case.objects.create(
+                guardian_name='Guardian', guardian_relationship='Parent', guardian_phone='1',
+                guardian_address='Address', missing_name=f'Person {i}', police_officer=self.officer,
+                status='pending' if i % 2 else 'closed',
+            )
+            CasePhoto.objects.create(case=case, image=SimpleUploadedFile(f'p{i}.gif', TINY_IMAGE))
+            evidence = CasePhoto.objects.create(case=case, image=SimpleUploadedFile(f'e{i}.gif', TINY_IMAGE),
+                                                is_detection_evidence=True)
+            DetectionAlert.objects.create(case=case, detection_photo=evidence)
+
+
+class DashboardQueryCountTests(_OfficerTestCase):
+
+    def _queries(self, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_query_count_does_not_grow_with_cases(self):
+        get_counters(self.officer)  # built on first visit; every later visit reads the one row
+        self._add_cases(0, 2)
+        _, few = self._queries(reverse('police:dashboard'))
+        _, few_api = self._queries(reverse('police:cases_api'), limit=50)
+
+        self._add_cases(2, 20)
+        response, many = self._queries(reverse('police:dashboard'))
+        api_response, many_api = self._queries(reverse('police:cases_api'), limit=50)
+
+        self.assertEqual(few, many)
+        self.assertEqual(few_api, many_api)
+        self.assertEqual(response.context['total_cases'], 22)
+        self.assertEqual(response.context['pending_cases'], 11)
+        self.assertEqual(response.context['closed_cases'], 11)
+        self.assertEqual(response.context['alerts_total'], 22)
+        self.assertContains(api_response, 'case_photos/p21', count=1)  # the enrollment photo, not the evidence one
+
+
+# --- Keyset-Paginated Lists ---
+
+class KeysetListTests(_OfficerTestCase):
+
+    def _walk(self, url, **params):
+        seen, cursor = [], None
+        while True:
+            data = self.client.get(url, dict(params, **({'cursor': cursor} if cursor else {}))).json()
+            seen.extend(row['id'] for row in data['results'])
+            cursor = data['next_cursor']
+            if cursor is None:
+                return seen
+            self._add_cases(len(seen) + 100, 1)  # rows arriving between pages must not shift the pages
+
+    def test_pages_cover_every_row_once_in_order(self):
+        self._add_cases(0, 7)
+        expected = list(Case.objects.filter(police_officer=self.officer).order_by('-created_at', '-id')
+                        .values_list('pk', flat=True))
+
+        self.assertEqual(self._walk(reverse('police:cases_api'), limit=3), expected)
+
+        names = self._walk(reverse('police:cases_api'), limit=2, sort='name_asc')
+        self.assertEqual(len(names), len(set(names)))
+
+    def test_alert_pages_and_filters(self):
+        self._add_cases(0, 5)
+        DetectionAlert.objects.filter(case__missing_name='Person 3').update(is_reviewed=True)
+
+        unread = self.client.get(reverse('police:alerts_api'), {'state': 'unread'}).json()['results']
+        self.assertEqual(len(unread), 4)
+        found = self.client.get(reverse('police:alerts_api'), {'q': 'person 3'}).json()['results']
+        self.assertEqual([a['missing_name'] for a in found], ['Person 3'])
+
+        expected = list(DetectionAlert.objects.order_by('-alert_sent_at', '-id').values_list('pk', flat=True))
+        self.assertEqual(self._walk(reverse('police:alerts_api'), limit=2), expected)
+
+    def test_filters_and_bad_cursor(self):
+        self._add_cases(0, 6)
+        pending = self.client.get(reverse('police:cases_api'), {'status': 'pending'}).json()['results']
+        self.assertEqual({c['status'] for c in pending}, {'pending'})
+        self.assertEqual(len(pending), 3)
+
+        self.assertEqual(self.client.get(reverse('police:cases_api'), {'cursor': 'garbage'}).status_code, 400)
+
+
+# --- Denormalized Dashboard Counters ---
+
+class OfficerCountersTests(_OfficerTestCase):
+
+    def _counters(self):
+        counters = get_counters(self.officer)
+        return {field: getattr(counters, field) for field in COUNTER_FIELDS}
+
+    def test_signals_keep_counters_equal_to_a_recount(self):
+        get_counters(self.officer)  # row exists before the changes, so every delta is applied
+        self._add_cases(0, 6)
+
+        case = Case.objects.filter(status='pending').first()
+        case.status = 'closed'
+        case.save()
+        Case.objects.filter(status='closed').first().delete()   # cascades to its photos and alert
+
+        alerts = list(DetectionAlert.objects.all())
+        alerts[0].is_reviewed = True
+        alerts[0].save(update_fields=['is_reviewed'])
+        alerts[1].is_deleted_by_officer = True
+        alerts[1].save(update_fields=['is_deleted_by_officer'])
+        alerts[2].delete()
+
+        incremental = self._counters()
+        recount(self.officer.pk)
+        self.assertEqual(incremental, self._counters())
+        self.assertEqual(incremental['total_cases'], 5)
+        self.assertEqual(incremental['alerts_total'], 3)
+        self.assertEqual(incremental['alerts_unreviewed'], 2)
+
+    def test_dashboard_view_write_is_debounced(self):
+        get_counters(self.officer)
+        self._add_cases(0, 2)
+        OfficerCounters.objects.filter(officer=self.officer).update(last_view_at=timezone.now() - timedelta(hours=1))
+
+        first = self.client.get(reverse('police:dashboard'))
+        self.assertEqual(first.context['notifications_count'], 2)
+
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(reverse('police:dashboard'))
+        self.assertEqual(second.context['notifications_count'], 0)
+        self.assertFalse([q for q in queries if q['sql'].startswith('UPDATE')])
+
+
+# --- Live Alert Stream ---
+
+class LiveAlertStreamTests(_OfficerTestCase):
+
+    async def test_replays_from_last_event_id_then_streams_own_alerts(self):
+        await sync_to_async(self._add_cases)(0, 2)
+        first, second = [a async for a in DetectionAlert.objects.order_by('pk').values_list('pk', flat=True)]
+
+        stream = event_stream(self.officer.pk, last_event_id=first)
+        try:
+            self.assertTrue((await anext(stream)).startswith('retry:'))
+            self.assertTrue((await anext(stream)).startswith(f'id: {second}\n'))   # replayed
+
+            other = await sync_to_async(PoliceUser.objects.create_user)('other@example.com', 'secret')
+            await sync_to_async(self._add_cases)(2, 1)
+            await Case.objects.filter(missing_name='Person 2').aupdate(police_officer=other)
+            await sync_to_async(self._add_cases)(3, 1)
+            await publisher.poll()
+
+            event = await anext(stream)
+            newest = await DetectionAlert.objects.filter(case__missing_name='Person 3').values_list('pk', flat=True).aget()
+            self.assertTrue(event.startswith(f'id: {newest}\nevent: alert\n'))
+            self.assertIn('"missing_name": "Person 3"', event)   # the other officer's alert was skipped
+        finally:
+            await stream.aclose()
+            publisher._task.cancel()
+        self.assertEqual(publisher.subscribers, {})
+
+
+# --- Alert Stations ---
+
+class AlertStationTests(TestCase):
+
+    def setUp(self):
+        taluka = Taluka.objects.create(name='Haveli', district=District.objects.create(
+            name='Pune', state=State.objects.create(name='Maharashtra')))
+        for name, lat, lon in (('Shivajinagar', '18.530', '73.847'), ('Swargate', '18.501', '73.863'),
+                               ('Hadapsar', '18.508', '73.926'), ('Nagpur', '21.146', '79.088')):
+            PoliceStation.objects.create(taluka=taluka, name=name, email=f'{name.lower()}@example.com',
+                                         latitude=lat, longitude=lon)
+        invalidate_station_index()
+        self.addCleanup(invalidate_station_index)
+
+    def test_stations_within_the_radius_closest_first(self):
+        stations = alert_stations('18.5204', '73.8567', k=2, radius_km=10)   # Pune centre
+        self.assertEqual([s['name'] for s in stations], ['Shivajinagar', 'Swargate'])
+        self.assertLess(stations[1]['distance_km'], 10)
+
+    def test_nearest_station_when_none_is_in_the_radius(self):
+        stations = alert_stations(20.0, 77.0, k=2, radius_km=25)
+        self.assertEqual([s['name'] for s in stations], ['Nagpur'])
+
+    def test_two_nearest_stations_are_cced_however_far(self):
+        officer = PoliceUser.objects.create_user('officer@example.com', 'secret')
+        case = Case.objects.create(guardian_name='Guardian', guardian_relationship='Parent', guardian_phone='1',
+                                   guardian_address='Address', missing_name='Person', police_officer=officer)
+        to, cc = alert_recipients(case, '21.150', '79.090')   # Nagpur; every other station is ~600 km away
+        self.assertEqual(to, ['officer@example.com'])
+        self.assertEqual(cc, ['nagpur@example.com', 'hadapsar@example.com'])
+
+
+# --- Alert Digest ---
+
+@skipUnless(shared_state.available(), 'needs the Redis server of REDIS_STATE_URL')
+class SurveillanceDigestTests(_OfficerTestCase):
+
+    def _detect(self, case, lat, lon):
+        frame = 'data:image/gif;base64,' + base64.b64encode(TINY_IMAGE).decode()
+        with patch('police.views.match_live_face_to_db', return_value=[{'case_id': case.complaint_id, 'similarity': 0.8}]), \
+                patch('police.views.evidence_observe', return_value={'state': CONFIRMED, 'hits': 3, 'required': 3, 'score': 0.8}):
+            response = self.client.post(reverse('police:surveillance_match'), json.dumps({
+                'image': frame, 'camera_id': 'gate', 'location': {'lat': lat, 'lon': lon},
+            }), content_type='application/json')
+        self.assertEqual(response.json()['status'], 'match_found')
+
+    def test_repeat_detections_in_the_window_share_one_email(self):
+        invalidate_station_index()
+        self.addCleanup(invalidate_station_index)
+        shared_state.get_redis().delete(TokenBucket()._key(self.officer.email))
+        mail.outbox = []
+        case = Case.objects.create(guardian_name='Guardian', guardian_relationship='Parent', guardian_phone='1',
+                                   guardian_address='Address', missing_name='Person', police_officer=self.officer)
+
+        self._detect(case, '18.5204', '73.8567')
+        self._detect(case, '18.5310', '73.8470')
+        self.assertEqual(DetectionAlert.objects.filter(case=case).count(), 2)
+
+        dispatch_due(OUTBOX_HANDLERS)   # both join the case's open digest
+        digest = AlertDigest.objects.get(case=case)
+        self.assertEqual(len(digest.items), 2)
+
+        flush_alert_digest(digest.pk)
+        dispatch_due(OUTBOX_HANDLERS)
+        self.assertFalse(OutboxMessage.objects.exclude(status=OutboxMessage.Status.SENT).exists())
+        self.assertEqual(len(mail.outbox), 1)
+        email = mail.outbox[0]
+        self.assertEqual(email.to, ['officer@example.com'])
+        self.assertIn('2 detection(s)', email.subject)
+        self.assertIn('18.5204, 73.8567', email.body)
+        self.assertIn('18.5310, 73.8470', email.body)
@@ -20,5 +20,9 @@ urlpatterns = [
     path('  ', views.reset_password, name='reset_password'),
     path('dashboard/', views.dashboard, name='dashboard'),
     path('notifications/action/', views.handle_notification_action, name='notification_action'), # NEW
+    path('api/cases/', views.cases_api, name='cases_api'),
+    path('api/cases/search/', views.case_search_api, name='case_search_api'),
+    path('api/alerts/', views.alerts_api, name='alerts_api'),
+    path('api/alerts/stream/', views.alerts_stream, name='alerts_stream'),
     path('surveillance_match/', views.surveillance_match_api, name='surveillance_match'),
 ] +static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -193,58 +193,157 @@ from cases.models import Case, CasePhoto # Ensure CasePhoto is imported
 from django.utils import timezone
 # Import DetectionAlert model along with the others
 from cases.models import Case, CasePhoto, DetectionAlert 
+from django.db.models import Count, Prefetch, Q
+from django.urls import reverse
+from .pagination import InvalidCursor, keyset_page, page_size
+from .counters import get_counters, mark_dashboard_viewed
+from .live import event_stream, latest_alert_id, serialize_alert
+from cases.thumbnails import photo_fields
+from cases.search import case_filter, search_cases
+from django.http import StreamingHttpResponse
 # Assuming PoliceProfile or equivalent is accessible via request.user.profile
 
 @login_required
 def dashboard(request):
-    # --- 1. Base Case Query (Remains the same) ---
-    all_cases = Case.objects.filter(police_officer=request.user).order_by('-created_at')
-
-    total_cases = all_cases.count()
-    pending_cases = all_cases.filter(status='pending').count()
-    closed_cases = all_cases.filter(status__in=['closed', 'resolved']).count()
-
-    # --- 2. AI NOTIFICATION LOGIC (Using DetectionAlert) ---
-    user_profile = request.user.profile 
-    last_view_time = user_profile.last_dashboard_view
-    
-    # Get the IDs of all cases relevant to this officer
-    relevant_case_ids = all_cases.values_list('id', flat=True)
-    
-    # Base Query for Alerts: Only show non-deleted alerts for this officer's cases
-    base_alerts_query = DetectionAlert.objects.filter(
-        case_id__in=relevant_case_ids,
-        is_deleted_by_officer=False 
-    )
-    
-    # A. Fetch ALL Non-Deleted Alerts (Full list for the modal)
-    # We select related models to access the case and photo details in the template
-    all_alerts_for_officer = base_alerts_query.select_related(
-        'case', 
-        'detection_photo'
-    ).order_by('-alert_sent_at')
+    # --- 1. KPI tiles and alert counts: one row of counters kept current by signals (police/counters.py)
+    counters = get_counters(request.user)
     
-    # B. Count UNREAD Alerts (Filter by uploaded_at > last_view_time)
-    unread_alerts_count = all_alerts_for_officer.filter(
-        alert_sent_at__gt=last_view_time
-    ).count()
+    # --- 2. CLEAR NOTIFICATIONS (Update last view time) ---
+    # Marks the alerts shown as 'seen' for the next visit; written at most once a minute
+    mark_dashboard_viewed(counters)
     
-    # --- 3. CLEAR NOTIFICATIONS (Update last view time) ---
-    # This marks all current notifications as 'read' for the next visit
-    user_profile.last_dashboard_view = timezone.now()
-    user_profile.save(update_fields=['last_dashboard_view'])
     
-    
-    # --- 4. Render Context ---
+    # --- 3. Render Context ---
+    # Case rows and alerts are not rendered here: the page loads them on demand from
+    # cases_api / alerts_api, one keyset page at a time.
     return render(request, 'police/dashboard.html', {
-        'cases': all_cases,
-        'total_cases': total_cases,
-        'pending_cases': pending_cases,
-        'closed_cases': closed_cases,
-        'notifications_count': unread_alerts_count,         # UNREAD count for the KPI tile
-        'all_detections_list': all_alerts_for_officer,      # Full list for the modal (filtered by delete status)
+        'total_cases': counters.total_cases,
+        'pending_cases': counters.pending_cases,
+        'closed_cases': counters.closed_cases,
+        'notifications_count': counters.alerts_since_view,  # UNREAD count for the KPI tile
+        'alerts_total': counters.alerts_total,
+        'alerts_unreviewed': counters.alerts_unreviewed,
+        'latest_alert_id': latest_alert_id(),  # the live stream (alerts_stream) continues from here
     })
 
+
+# --- Paged JSON lists for the dashboard (police/pagination.py) ---
+
+CASE_SORTS = {
+    'date_desc': ['-created_at', '-id'],
+    'date_asc': ['created_at', 'id'],
+    'urgency_desc': ['urgency', '-created_at', '-id'],  # 'high' sorts before 'normal'
+    'name_asc': ['missing_name', 'id'],
+}
+
+ALERT_SORTS = {
+    'date_desc': ['-alert_sent_at', '-id'],
+    'date_asc': ['alert_sent_at', 'id'],
+}
+
+
+def _case_filters(request, prefix='', search=True):
+    """Status / urgency / search-text filters from the query string, as a Q over Case fields."""
+    conditions = Q()
+    status = request.GET.get('status', 'all')
+    if status == 'closed':
+        conditions &= Q(**{f'{prefix}status__in': ['closed', 'resolved']})
+    elif status != 'all':
+        conditions &= Q(**{f'{prefix}status': status})
+
+    urgency = request.GET.get('urgency', 'all')
+    if urgency != 'all':
+        conditions &= Q(**{f'{prefix}urgency': urgency})
+
+    text = request.GET.get('q', '').strip() if search else ''
+    if text:
+        conditions &= case_filter(text, prefix)  # full-text index, not LIKE scans (cases/search.py)
+    return conditions
+
+
+def _paged_response(queryset, ordering, request, serialize):
+    try:
+        rows, next_cursor = keyset_page(queryset, ordering, request.GET.get('cursor'),
+                                        page_size(request.GET.get('limit')))
+    except InvalidCursor:
+        return JsonResponse({'status': 'error', 'message': 'Invalid cursor.'}, status=400)
+    return JsonResponse({'results': [serialize(row) for row in rows], 'next_cursor': next_cursor})
+
+
+def _officer_cases(request):
+    return (Case.objects.filter(police_officer=request.user)
+            # The first enrollment photo of every case on the page in ONE extra query
+            .prefetch_related(Prefetch(
+                'photos',
+                queryset=CasePhoto.objects.filter(is_detection_evidence=False)[:1],  # CasePhoto Meta ordering
+                to_attr='enrollment_photos',
+            )))
+
+
+def _serialize_case(case):
+    photo = case.enrollment_photos[0] if case.enrollment_photos else None
+    return {
+        'id': case.pk,
+        'complaint_id': case.complaint_id,
+        **photo_fields(photo),
+        'missing_name': case.missing_name,
+        'missing_age': case.missing_age,
+        'missing_gender': case.missing_gender,
+        'last_seen_location': case.last_seen_location,
+        'last_seen_date': case.last_seen_date.isoformat() if case.last_seen_date else None,
+        'urgency': case.urgency,
+        'status': case.status,
+        'detail_url': reverse('cases:detail', args=[case.pk]),
+    }
+
+
+@login_required
+def cases_api(request):
+    """GET ?sort=&status=&urgency=&q=&cursor=&limit= -> {"results": [...], "next_cursor"}"""
+    ordering = CASE_SORTS.get(request.GET.get('sort'), CASE_SORTS['date_desc'])
+    cases = _officer_cases(request).filter(_case_filters(request))
+    return _paged_response(cases, ordering, request, _serialize_case)
+
+
+@login_required
+def case_search_api(request):
+    """GET ?q=&status=&urgency=&limit= -> {"results": [...]}, best matches first (word prefixes, bm25)."""
+    cases = _officer_cases(request).filter(_case_filters(request, search=False))
+    results = search_cases(request.GET.get('q', ''), cases, limit=page_size(request.GET.get('limit')))
+    return JsonResponse({'results': [_serialize_case(case) for case in results]})
+
+
+@login_required
+def alerts_api(request):
+    """GET ?sort=&state=all|unread|read&status=&urgency=&q=&cursor=&limit= -> {"results": [...], "next_cursor"}"""
+    ordering = ALERT_SORTS.get(request.GET.get('sort'), ALERT_SORTS['date_desc'])
+    alerts = (DetectionAlert.objects
+              .filter(case__police_officer=request.user, is_deleted_by_officer=False)
+              .filter(_case_filters(request, prefix='case__'))
+              .select_related('case', 'detection_photo'))
+
+    state = request.GET.get('state', 'all')
+    if state in ('unread', 'read'):
+        alerts = alerts.filter(is_reviewed=(state == 'read'))
+
+    return _paged_response(alerts, ordering, request, serialize_alert)
+
+
+@login_required
+async def alerts_stream(request):
+    """
+    Server-sent events: the officer's new alerts as they are created (police/live.py).
+    Resumes after the Last-Event-ID header (sent by a reconnecting EventSource) or ?last_event_id=.
+    """
+    raw_last_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    last_event_id = int(raw_last_id) if raw_last_id and raw_last_id.isdigit() else None
+
+    user = await request.auser()
+    response = StreamingHttpResponse(event_stream(user.pk, last_event_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # don't let a proxy buffer the stream
+    return response
+
 from django.views.decorators.http import require_POST # New import
 from django.views.decorators.csrf import csrf_exempt # New import
 # police/views.py (Inside handle_notification_action)
@@ -423,7 +522,10 @@ import random # Used for testing bounding boxes
 from cases.models import Case, CasePhoto # Ensure Case is imported
 from cases.ai_processor import match_live_face_to_db # AI Matching Function
 # from cases.tasks import send_detection_alert_email
-from cases.tasks import send_detection_alert_email
+from cases.tasks import enqueue_detection_alert
+from django.db import transaction
+from cases.sightings import record_sightings
+from cases.evidence import observe as evidence_observe, CONFIRMED as EVIDENCE_CONFIRMED
 # police/views.py (Final version focused on Evidence Logging)
 
 
@@ -441,8 +543,11 @@ from cases.tasks import send_detection_alert_email
 def surveillance_match_api(request):
     """
     Receives live image frame via POST, runs AI matching.
-    1. Logs CasePhoto evidence for ALL detections (no throttle).
-    2. Triggers Alert/Email only once per minute (throttled).
+    1. Accumulates matches per camera/case; each detection is 'pending' until confirmed
+       over several frames (cases/evidence.py).
+    2. Logs CasePhoto evidence only for confirmed detections.
+    3. Creates a DetectionAlert for every confirmed detection; repeat detections of a case
+       are coalesced into one email by cases/digest.py.
     """
     if request.method == 'POST':
         try:
@@ -460,8 +565,15 @@ def surveillance_match_api(request):
             image_b64_data = image_b64_full.split(',')[1] 
             image_bytes = base64.b64decode(image_b64_data)
             
-            # 2. Run Multi-Face AI Matching
-            match_results_list = match_live_face_to_db(image_bytes)
+            # 2. Run Multi-Face AI Matching (unmatched good-quality faces are kept as sightings)
+            unmatched_faces = []
+            match_results_list = match_live_face_to_db(image_bytes, camera_id=data.get('camera_id'),
+                                                       unmatched=unmatched_faces)
+            if unmatched_faces:
+                record_sightings(unmatched_faces, data.get('camera_id'), latitude, longitude)
+
+            # Browser feeds send no camera_id: each officer session is its own camera
+            camera_key = data.get('camera_id') or f"session:{request.session.session_key or request.META.get('REMOTE_ADDR')}"
             
             # police/views.py (Corrected surveillance_match_api)
 
@@ -469,11 +581,16 @@ def surveillance_match_api(request):
 
             if match_results_list:
                 
-                cooldown_period_alert = timedelta(minutes=2) 
-                
                 for match in match_results_list:
                     case_id_str = match['case_id']
                     similarity = match['similarity']
+
+                    # 0. TEMPORAL CONFIRMATION: nothing is written for a single-frame match
+                    match.update(evidence_observe(camera_key, case_id_str, similarity))
+                    if match['state'] != EVIDENCE_CONFIRMED:
+                        print(f"MATCH PENDING: {case_id_str} {match['hits']}/{match['required']} frames "
+                              f"(mean {match['score']:.3f}).")
+                        continue
                     
                     try:
                         case_obj = Case.objects.get(complaint_id=case_id_str) 
@@ -501,33 +618,26 @@ def surveillance_match_api(request):
                         )
                         print(f"EVIDENCE LOGGED: Photo saved for Case {case_id_str}.")
                         
-                        # A. ALERT THROTTLING CHECK (1 Minute Alert Cooldown)
-                        latest_alert = DetectionAlert.objects.filter(
-                            case=case_obj
-                        ).order_by('-alert_sent_at').first()
-
-                        if latest_alert and (timezone.now() - latest_alert.alert_sent_at) < cooldown_period_alert:
-                            print(f"ALERT SKIPPED: Case {case_id_str} in 1 min alert cooldown.")
-                            continue # Skip alert creation and go to the next match
-
-                        # B. IF COOLDOWN EXPIRED: Create NEW ALERT RECORD & TRIGGER EMAIL
+                        # Every detection gets its alert record; the case's open digest
+                        # (cases/digest.py) decides when the email goes out, so repeat
+                        # detections within ALERT_COALESCE_WINDOW_SECONDS share one email
                         
-                        # Create the new alert record (linked to the photo just saved)
-                        DetectionAlert.objects.create(
-                            case=case_obj,
-                            detection_photo=new_photo, 
-                        )
-
-                        # Trigger Celery Email Task
-                        send_detection_alert_email.delay(
-                            case_obj.pk,
-                            new_photo.pk, 
-                            similarity,
-                            latitude,
-                            longitude 
-                        )
+                        # Create the new alert record (linked to the photo just saved) together with
+                        # its outbox entry, so the alert email exists exactly when the alert does
+                        with transaction.atomic():
+                            DetectionAlert.objects.create(
+                                case=case_obj,
+                                detection_photo=new_photo, 
+                            )
+                            enqueue_detection_alert(
+                                case_obj.pk,
+                                new_photo.pk, 
+                                similarity,
+                                latitude,
+                                longitude 
+                            )
                         
-                        print(f"ALERT DISPATCHED: Full alert sent for Case {case_id_str}.")
+                        print(f"ALERT DISPATCHED: Alert queued in the outbox for Case {case_id_str}.")
                         
                     else:
                         # Alert is blocked, but the evidence logging still happened above.
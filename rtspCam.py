@@ -1,6 +1,8 @@
 import cv2
 import numpy as np
 
+from cases.frame_buffer import FrameRing, letterbox
+
 # RTSP URLs
 rtsp_urls = [
     "rtsp://172.22.215.144:8080/h264_opus.sdp",
@@ -17,32 +19,57 @@ for i, cap in enumerate(caps):
     else:
         print(f"✅ Camera {i+1} opened successfully")
 
-while True:
-    frames = []
+# Shared-memory rings: inference workers attach with FrameRing.attach("reunite-cam-<n>")
+# and read frames in place instead of receiving pickled copies. Each ring is sized from its
+# camera's first frame, so frames are stored at their native resolution and aspect ratio.
+RING_SLOTS = 8
+rings = []
 
-    for cap in caps:
+try:
+    for i, cap in enumerate(caps):
         ret, frame = cap.read()
         if not ret:
-            frame = np.zeros((480, 640, 3), dtype=np.uint8)  # fallback black frame
-        frames.append(frame)
+            print(f"❌ Error: No frame from Camera {i+1}")
+            exit()
+        ring = FrameRing.create(f"reunite-cam-{i+1}", slots=RING_SLOTS, frame_shape=frame.shape)
+        ring.write(frame)
+        rings.append(ring)
+        print(f"✅ Camera {i+1} ring: {frame.shape[1]}x{frame.shape[0]}")
+
+    while True:
+        frames = []
 
-    # Resize frames to same height
-    height = 480
-    resized_frames = [
-        cv2.resize(frame, (int(frame.shape[1] * height / frame.shape[0]), height))
-        for frame in frames
-    ]
+        for cap, ring in zip(caps, rings):
+            ret, frame = cap.read()
+            if not ret:
+                frame = np.zeros((480, 640, 3), dtype=np.uint8)  # fallback black frame
+            else:
+                # A stream that switches resolution is letterboxed into the ring, never stretched
+                ring.write(frame if frame.shape == ring.frame_shape else letterbox(frame, ring.frame_shape))
+            frames.append(frame)
 
-    # Combine side-by-side
-    combined_frame = np.hstack(resized_frames)
+        # Resize frames to same height
+        height = 480
+        resized_frames = [
+            cv2.resize(frame, (int(frame.shape[1] * height / frame.shape[0]), height))
+            for frame in frames
+        ]
 
-    cv2.imshow("RTSP Cameras - Side by Side (Press Q to exit)", combined_frame)
+        # Combine side-by-side
+        combined_frame = np.hstack(resized_frames)
 
-    if cv2.waitKey(1) & 0xFF == ord('q'):
-        break
+        cv2.imshow("RTSP Cameras - Side by Side (Press Q to exit)", combined_frame)
+
+        if cv2.waitKey(1) & 0xFF == ord('q'):
+            break
+
+finally:
+    # Cleanup (also on errors, so no shared-memory block outlives the capture process)
+    for cap in caps:
+        cap.release()
 
-# Cleanup
-for cap in caps:
-    cap.release()
+    for ring in rings:
+        ring.close()
+        ring.unlink()
 
-cv2.destroyAllWindows()
+    cv2.destroyAllWindows()